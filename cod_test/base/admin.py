@@ -1,3 +1,21 @@
-# from django.contrib import admin
+from django.contrib import admin
 
-# Register your models here.
+from . import models
+from .admin_performance import AdminPerformant
+
+
+class EmailSortantAdmin(AdminPerformant):
+
+    list_display = (
+        'id',
+        'sujet',
+        'date_add',
+        'envoye_le',
+        'tentatives',
+        'prochaine_tentative',
+    )
+    search_fields = ('sujet',)
+    readonly_fields = ('sujet', 'corps', 'corps_html', 'expediteur', 'destinataires', 'date_add')
+
+
+admin.site.register(models.EmailSortant, EmailSortantAdmin)
@@ -0,0 +1,68 @@
+"""Réglages communs des listes de l'admin sur les grandes tables.
+
+* ``show_full_result_count = False`` : pas de second ``COUNT(*)`` sur toute la
+  table quand un filtre ou une recherche est actif.
+* ``ComptageEstimePaginator`` : sans filtre, le nombre de lignes d'une table
+  qui dépasse ``SEUIL_ESTIMATION`` est lu dans les statistiques du moteur
+  (``pg_class``, ``information_schema``, ``sqlite_stat1``) au lieu d'un
+  ``COUNT(*)`` complet. Avec un filtre, ou sans statistiques, le compte reste
+  exact.
+
+Les classes d'admin héritent d'``AdminPerformant`` et déclarent en plus
+``list_select_related`` pour chaque clé étrangère affichée, des
+``list_filter`` limités aux booléens, dates et petites tables de référence,
+et ``autocomplete_fields`` pour les clés étrangères vers les grandes tables.
+"""
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+SEUIL_ESTIMATION = 10000
+
+_REQUETES_ESTIMATION = {
+    'postgresql': "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+    'mysql': (
+        "SELECT table_rows FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_name = %s"
+    ),
+    # Rempli par ANALYZE ; la première valeur de « stat » est le nombre de lignes
+    'sqlite': "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1",
+}
+
+
+def estimation_lignes(modele, using='default'):
+    """Nombre de lignes de la table de ``modele`` selon les statistiques, ``None`` si inconnu."""
+    connexion = connections[using]
+    requete = _REQUETES_ESTIMATION.get(connexion.vendor)
+    if requete is None:
+        return None
+    try:
+        with connexion.cursor() as curseur:
+            curseur.execute(requete, [modele._meta.db_table])
+            ligne = curseur.fetchone()
+    except DatabaseError:
+        # sqlite_stat1 n'existe qu'après un premier ANALYZE
+        return None
+    if not ligne or ligne[0] is None:
+        return None
+    estimation = int(str(ligne[0]).split()[0])
+    return estimation if estimation >= 0 else None
+
+
+class ComptageEstimePaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        liste = self.object_list
+        if isinstance(liste, QuerySet) and not liste.query.where:
+            estimation = estimation_lignes(liste.model, liste.db)
+            if estimation is not None and estimation >= SEUIL_ESTIMATION:
+                return estimation
+        return super().count
+
+
+class AdminPerformant(admin.ModelAdmin):
+    show_full_result_count = False
+    paginator = ComptageEstimePaginator
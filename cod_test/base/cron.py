@@ -0,0 +1,32 @@
+from django.conf import settings
+from django_cron import CronJobBase, Schedule
+from base import housekeeping
+from base.outbox import envoyer_emails
+
+class EnvoyerEmailsCronJob(CronJobBase):
+    RUN_EVERY_MINS = 1
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = 'base.envoyer_emails'
+
+    def do(self):
+        stats = envoyer_emails()
+        print(f"{stats['envoyes']} e-mails envoyés, {stats['echecs']} en échec.")
+
+
+class HousekeepingCronJob(CronJobBase):
+    """Applique les politiques de rétention ``politiques`` (toutes par défaut)."""
+    RUN_EVERY_MINS = 60 * 24  # Tous les jours
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = 'base.housekeeping'
+    politiques = None
+
+    def do(self):
+        metriques = housekeeping.nettoyer(
+            self.politiques,
+            pause=getattr(settings, 'HOUSEKEEPING_PAUSE', 0),
+            duree_max=getattr(settings, 'HOUSEKEEPING_DUREE_MAX', None),
+        )
+        for nom, m in metriques.items():
+            print(f"{nom} : {m['supprimes']} supprimés en {m['lots']} lots ({m['debit']:.0f}/s).")
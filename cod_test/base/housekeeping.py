@@ -0,0 +1,113 @@
+"""Suppression par lots des données arrivées en fin de rétention.
+
+Chaque application déclare ses politiques dans un module ``housekeeping.py``,
+chargé automatiquement au démarrage (comme ``admin.py``)::
+
+    @politique('tokens', "Jetons de réinitialisation expirés")
+    def tokens_expires(maintenant):
+        return PasswordResetToken.objects.filter(created_at__lt=maintenant - ...)
+
+Les suppressions se font par lots bornés : on lit les clés primaires des
+``taille_lot`` lignes suivantes, puis on supprime la plage ``[premier, dernier]``
+en réappliquant le filtre. Chaque lot est une transaction courte qui ne
+verrouille jamais toute la table ; ``pause`` laisse respirer la base entre
+deux lots et ``duree_max`` borne la durée d'un passage (la suite est reprise
+au passage suivant).
+"""
+import logging
+import time
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TAILLE_LOT = 500
+
+_politiques = {}
+
+
+class Politique:
+    def __init__(self, nom, description, fonction):
+        self.nom = nom
+        self.description = description
+        self.fonction = fonction
+
+    def queryset(self, maintenant):
+        return self.fonction(maintenant)
+
+
+def politique(nom, description=''):
+    """Enregistre une fonction ``maintenant -> queryset`` des lignes à supprimer."""
+    def decorator(fonction):
+        _politiques[nom] = Politique(nom, description or fonction.__doc__ or '', fonction)
+        return fonction
+    return decorator
+
+
+def politiques():
+    """Politiques dans l'ordre d'enregistrement (ordre de ``INSTALLED_APPS``)."""
+    return list(_politiques.values())
+
+
+def supprimer_par_lots(queryset, taille_lot=TAILLE_LOT, pause=0, dry_run=False, fin=None):
+    """Supprime ``queryset`` lot par lot, retourne les métriques de l'opération.
+
+    ``fin`` est une échéance ``time.monotonic()`` : passé cette heure, on
+    s'arrête après le lot en cours et ``interrompu`` vaut ``True``.
+    """
+    debut = time.perf_counter()
+    supprimes = lots = 0
+    interrompu = False
+    dernier = None
+    while True:
+        if fin is not None and time.monotonic() >= fin:
+            interrompu = True
+            break
+        lot = queryset.order_by('pk')
+        if dernier is not None:
+            lot = lot.filter(pk__gt=dernier)
+        ids = list(lot.values_list('pk', flat=True)[:taille_lot])
+        if not ids:
+            break
+        dernier = ids[-1]
+        lots += 1
+        if dry_run:
+            supprimes += len(ids)
+            continue
+        # delete() compte aussi les lignes supprimées en cascade, on ne garde que la table visée
+        _, par_modele = queryset.filter(pk__gte=ids[0], pk__lte=dernier).delete()
+        supprimes += par_modele.get(queryset.model._meta.label, 0)
+        if pause and len(ids) == taille_lot:
+            time.sleep(pause)
+
+    duree = time.perf_counter() - debut
+    return {
+        'supprimes': supprimes,
+        'lots': lots,
+        'duree': duree,
+        'debit': supprimes / duree if duree else 0,
+        'interrompu': interrompu,
+    }
+
+
+def nettoyer(noms=None, taille_lot=TAILLE_LOT, pause=0, dry_run=False, duree_max=None):
+    """Applique les politiques ``noms`` (toutes par défaut), retourne les métriques par politique."""
+    inconnues = set(noms or ()) - set(_politiques)
+    if inconnues:
+        raise KeyError(f"Politiques inconnues : {', '.join(sorted(inconnues))}")
+
+    maintenant = timezone.now()
+    fin = time.monotonic() + duree_max if duree_max else None
+    metriques = {}
+    for regle in politiques():
+        if noms is not None and regle.nom not in noms:
+            continue
+        metriques[regle.nom] = m = supprimer_par_lots(
+            regle.queryset(maintenant), taille_lot, pause, dry_run, fin
+        )
+        logger.info(
+            "housekeeping politique=%s supprimes=%d lots=%d duree=%.3f debit=%.1f dry_run=%s interrompu=%s",
+            regle.nom, m['supprimes'], m['lots'], m['duree'], m['debit'], dry_run, m['interrompu'],
+            extra={'housekeeping': dict(m, politique=regle.nom, dry_run=dry_run)},
+        )
+    return metriques
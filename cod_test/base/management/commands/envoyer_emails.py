@@ -0,0 +1,32 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from base.outbox import envoyer_emails
+
+
+class Command(BaseCommand):
+    help = "Envoie les e-mails en attente dans la boîte d'envoi."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=100, help="Taille d'un lot")
+        parser.add_argument('--continu', action='store_true', help="Tourne en boucle (worker)")
+        parser.add_argument('--intervalle', type=float, default=2, help="Pause entre deux lots vides")
+
+    def handle(self, *args, **options):
+        # Une seule connexion SMTP pour tous les lots tant qu'il y a des e-mails à envoyer
+        connexion = get_connection(fail_silently=False)
+        try:
+            while True:
+                stats = envoyer_emails(limite=options['limite'], connexion=connexion)
+                if stats['envoyes'] or stats['echecs']:
+                    self.stdout.write(f"{stats['envoyes']} e-mails envoyés, {stats['echecs']} en échec.")
+                if not options['continu']:
+                    return
+                if not (stats['envoyes'] or stats['echecs']):
+                    # File vide : on libère la connexion plutôt que de la laisser expirer
+                    connexion.close()
+                    time.sleep(options['intervalle'])
+        finally:
+            connexion.close()
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from base import housekeeping
+
+
+class Command(BaseCommand):
+    help = "Supprime par lots les données arrivées en fin de rétention (toutes les politiques par défaut)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('politiques', nargs='*', help="Politiques à appliquer")
+        parser.add_argument('--liste', action='store_true', help="Affiche les politiques enregistrées")
+        parser.add_argument('--taille-lot', type=int, default=housekeeping.TAILLE_LOT)
+        parser.add_argument('--pause', type=float, default=0, help="Pause entre deux lots, en secondes")
+        parser.add_argument('--duree-max', type=float, default=None, help="Durée maximale du passage, en secondes")
+        parser.add_argument('--dry-run', action='store_true', help="Compte sans rien supprimer")
+
+    def handle(self, *args, **options):
+        if options['liste']:
+            for regle in housekeeping.politiques():
+                self.stdout.write(f"{regle.nom} : {regle.description}")
+            return
+
+        try:
+            metriques = housekeeping.nettoyer(
+                options['politiques'] or None,
+                taille_lot=options['taille_lot'], pause=options['pause'],
+                dry_run=options['dry_run'], duree_max=options['duree_max'],
+            )
+        except KeyError as exc:
+            raise CommandError(exc.args[0])
+
+        verbe = "à supprimer" if options['dry_run'] else "supprimés"
+        for nom, m in metriques.items():
+            suite = " (interrompu, reprise au prochain passage)" if m['interrompu'] else ""
+            self.stdout.write(
+                f"{nom} : {m['supprimes']} {verbe} en {m['lots']} lots, "
+                f"{m['duree']:.2f}s ({m['debit']:.0f}/s){suite}"
+            )
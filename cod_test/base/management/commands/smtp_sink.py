@@ -0,0 +1,64 @@
+import time
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from base.smtp_sink import SMTPSink
+
+
+class Command(BaseCommand):
+    help = (
+        "Lance un serveur SMTP local qui garde les messages en mémoire. Avec --bench, "
+        "compare l'envoi d'un message par connexion à l'envoi par lots sur une connexion."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=1025)
+        parser.add_argument('--latence', type=float, default=0, help="Coût simulé d'une connexion en secondes")
+        parser.add_argument('--bench', type=int, default=0, help="Nombre d'e-mails à envoyer")
+        parser.add_argument('--lot', type=int, default=100)
+
+    def handle(self, *args, **options):
+        sink = SMTPSink(port=options['port'], latence=options['latence'])
+        if not options['bench']:
+            self.stdout.write(f"Serveur SMTP local sur {sink.host}:{sink.port} (Ctrl+C pour arrêter)")
+            try:
+                sink.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                sink.stop()
+            return
+
+        with sink, override_settings(**sink.settings()):
+            self._bench(sink, options['bench'], options['lot'])
+
+    def _messages(self, total):
+        return [
+            EmailMessage(f'Bench {numero}', 'Corps du message', 'bench@cooldeal.local', ['client@cooldeal.local'])
+            for numero in range(total)
+        ]
+
+    def _mesurer(self, libelle, sink, total, envoyer):
+        connexions, debut = sink.connexions, time.perf_counter()
+        envoyer()
+        duree = time.perf_counter() - debut
+        self.stdout.write(
+            f"{libelle} : {total} e-mails en {duree:.2f}s ({total / duree:.0f}/s), "
+            f"{sink.connexions - connexions} connexion(s)"
+        )
+
+    def _bench(self, sink, total, lot):
+        def une_connexion_par_message():
+            for message in self._messages(total):
+                message.send()
+
+        def connexion_partagee():
+            messages = self._messages(total)
+            with get_connection() as connexion:
+                for debut in range(0, total, lot):
+                    connexion.send_messages(messages[debut:debut + lot])
+
+        self._mesurer("Une connexion par e-mail", sink, total, une_connexion_par_message)
+        self._mesurer(f"Connexion partagée, lots de {lot}", sink, total, connexion_partagee)
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.9 on 2026-10-19 05:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailSortant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sujet', models.CharField(max_length=255)),
+                ('corps', models.TextField()),
+                ('corps_html', models.TextField(blank=True)),
+                ('expediteur', models.CharField(blank=True, max_length=254)),
+                ('destinataires', models.JSONField()),
+                ('date_add', models.DateTimeField(auto_now_add=True)),
+                ('envoye_le', models.DateTimeField(blank=True, null=True)),
+                ('tentatives', models.PositiveIntegerField(default=0)),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now)),
+                ('derniere_erreur', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'E-mail sortant',
+                'verbose_name_plural': 'E-mails sortants',
+                'indexes': [models.Index(fields=['envoye_le', 'prochaine_tentative'], name='email_sortant_a_envoyer')],
+            },
+        ),
+    ]
@@ -1,3 +1,27 @@
-# from django.db import models
+from django.db import models
+from django.utils.timezone import now
 
-# Create your models here.
+
+class EmailSortant(models.Model):
+    """Boîte d'envoi : les vues ajoutent les e-mails, un worker les envoie."""
+
+    sujet = models.CharField(max_length=255)
+    corps = models.TextField()
+    corps_html = models.TextField(blank=True)
+    expediteur = models.CharField(max_length=254, blank=True)
+    destinataires = models.JSONField()
+    date_add = models.DateTimeField(auto_now_add=True)
+    envoye_le = models.DateTimeField(null=True, blank=True)
+    tentatives = models.PositiveIntegerField(default=0)
+    prochaine_tentative = models.DateTimeField(default=now)
+    derniere_erreur = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'E-mail sortant'
+        verbose_name_plural = 'E-mails sortants'
+        indexes = [
+            models.Index(fields=['envoye_le', 'prochaine_tentative'], name='email_sortant_a_envoyer'),
+        ]
+
+    def __str__(self):
+        return self.sujet
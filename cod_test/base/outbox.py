@@ -0,0 +1,150 @@
+"""Boîte d'envoi des e-mails.
+
+Les vues n'envoient plus rien elles-mêmes : ``send_mail`` (même signature que
+celui de Django) ajoute seulement une ligne ``EmailSortant``. Les e-mails sont
+envoyés par ``envoyer_emails`` (commande ``envoyer_emails`` ou tâche cron),
+par lots, sur une seule connexion SMTP ouverte une fois et réutilisée. Un
+e-mail refusé est reprogrammé avec un délai croissant, jusqu'à
+``EMAIL_SORTANT_MAX_TENTATIVES``.
+"""
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EmailSortant
+
+logger = logging.getLogger(__name__)
+
+# Durée pendant laquelle un lot réservé par un worker est invisible aux autres
+BAIL = timedelta(minutes=5)
+
+
+def mettre_en_file(sujet, corps, destinataires, expediteur=None, corps_html=''):
+    return EmailSortant.objects.create(
+        sujet=sujet,
+        corps=corps,
+        corps_html=corps_html or '',
+        expediteur=expediteur or '',
+        destinataires=list(destinataires),
+    )
+
+
+def mettre_en_file_lot(emails, taille_lot=500):
+    """Met en file plusieurs e-mails en un ``INSERT`` par lot.
+
+    ``emails`` : dictionnaires avec les arguments de ``mettre_en_file``.
+    """
+    return EmailSortant.objects.bulk_create(
+        (
+            EmailSortant(
+                sujet=email['sujet'],
+                corps=email['corps'],
+                corps_html=email.get('corps_html') or '',
+                expediteur=email.get('expediteur') or '',
+                destinataires=list(email['destinataires']),
+            )
+            for email in emails
+        ),
+        batch_size=taille_lot,
+    )
+
+
+def send_mail(subject, message, from_email, recipient_list, fail_silently=False, html_message=None):
+    """Remplace ``django.core.mail.send_mail`` : l'e-mail est mis en file, pas envoyé."""
+    mettre_en_file(subject, message, recipient_list, from_email, html_message)
+    return 1
+
+
+def _max_tentatives():
+    return getattr(settings, 'EMAIL_SORTANT_MAX_TENTATIVES', 5)
+
+
+def _delai(tentatives):
+    base = getattr(settings, 'EMAIL_SORTANT_DELAI', 60)
+    return timedelta(seconds=min(base * 2 ** tentatives, 6 * 3600))
+
+
+def _reserver(limite):
+    maintenant = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            EmailSortant.objects.select_for_update(skip_locked=True).filter(
+                envoye_le__isnull=True,
+                prochaine_tentative__lte=maintenant,
+                tentatives__lt=_max_tentatives(),
+            ).order_by('id').values_list('id', flat=True)[:limite]
+        )
+        EmailSortant.objects.filter(id__in=ids).update(prochaine_tentative=maintenant + BAIL)
+    return list(EmailSortant.objects.filter(id__in=ids).order_by('id'))
+
+
+def _message(email, connexion):
+    message = EmailMultiAlternatives(
+        email.sujet, email.corps, email.expediteur or None, email.destinataires,
+        connection=connexion,
+    )
+    if email.corps_html:
+        message.attach_alternative(email.corps_html, 'text/html')
+    return message
+
+
+def _envoyer(connexion, email):
+    message = _message(email, connexion)
+    try:
+        connexion.send_messages([message])
+    except smtplib.SMTPServerDisconnected:
+        # Le serveur a fermé une connexion restée ouverte : une seule reconnexion
+        connexion.close()
+        connexion.open()
+        connexion.send_messages([message])
+
+
+def envoyer_emails(limite=100, connexion=None):
+    """Envoie un lot d'e-mails en attente, retourne les compteurs.
+
+    ``connexion`` permet à un worker de garder la même connexion SMTP d'un lot
+    à l'autre ; sans elle, une connexion est ouverte pour le lot puis fermée.
+    """
+    stats = {'envoyes': 0, 'echecs': 0}
+    emails = _reserver(limite)
+    if not emails:
+        return stats
+
+    locale = connexion is None
+    connexion = connexion or get_connection(fail_silently=False)
+    envoyes = []
+    try:
+        connexion.open()
+        for email in emails:
+            try:
+                _envoyer(connexion, email)
+            except (smtplib.SMTPException, OSError) as exc:
+                logger.warning("E-mail %s non envoyé : %s", email.pk, exc)
+                EmailSortant.objects.filter(pk=email.pk).update(
+                    tentatives=F('tentatives') + 1,
+                    prochaine_tentative=timezone.now() + _delai(email.tentatives + 1),
+                    derniere_erreur=str(exc),
+                )
+                stats['echecs'] += 1
+                if isinstance(exc, (smtplib.SMTPServerDisconnected, OSError)):
+                    connexion.close()
+                    connexion.open()
+            else:
+                envoyes.append(email.pk)
+    except (smtplib.SMTPException, OSError) as exc:
+        # Serveur injoignable : le reste du lot sera repris après l'expiration du bail
+        logger.error("Connexion SMTP impossible : %s", exc)
+    finally:
+        EmailSortant.objects.filter(pk__in=envoyes).update(
+            envoye_le=timezone.now(), derniere_erreur='',
+        )
+        stats['envoyes'] = len(envoyes)
+        if locale:
+            connexion.close()
+    return stats
@@ -0,0 +1,189 @@
+"""Limitation de débit par fenêtre glissante.
+
+Une vue est limitée avec le décorateur ``ratelimit`` ; le contrôle lui-même
+est fait par ``RateLimitMiddleware.process_view``, placé avant
+``CsrfViewMiddleware`` : une requête refusée l'est avant toute lecture du
+corps (ni JSON, ni formulaire, ni jeton CSRF).
+
+Les compteurs sont dans le cache Django (deux fenêtres fixes pondérées, soit
+une fenêtre glissante approchée). Une clé qui dépasse sa limite est aussi
+notée dans un dictionnaire local : tant que le blocage court, les requêtes
+suivantes sont refusées sans aller-retour vers le cache ni verrou.
+"""
+import logging
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+UNITES = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Clé -> instant de fin du blocage. Lectures et écritures simples d'un dict :
+# atomiques sous le GIL, pas de verrou nécessaire.
+_bloques = {}
+_rejets = {}
+_regles = {}
+
+TAILLE_MAX_BLOQUES = 10000
+
+
+def parse_taux(taux):
+    """``'5/m'`` -> ``(5, 60)`` ; ``'100/10m'`` -> ``(100, 600)``."""
+    nombre, periode = taux.split('/')
+    multiple = int(periode[:-1] or 1)
+    return int(nombre), multiple * UNITES[periode[-1]]
+
+
+def _cache():
+    return caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+
+
+def adresse_ip(request):
+    """Adresse du client, en tenant compte des ``RATELIMIT_PROXIES`` proxys de confiance.
+
+    Chaque proxy ajoute à droite de ``X-Forwarded-For`` l'adresse qui s'est
+    connectée à lui : on prend la première adresse non ajoutée par un proxy de
+    confiance en partant de la droite. Ce qui est plus à gauche vient du
+    client et peut être falsifié.
+    """
+    proxies = getattr(settings, 'RATELIMIT_PROXIES', 0)
+    if proxies:
+        adresses = [a.strip() for a in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if a.strip()]
+        if len(adresses) >= proxies:
+            return adresses[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+class Regle:
+    def __init__(self, nom, taux, cles=('ip', 'user'), methodes=('POST',)):
+        self.nom = nom
+        self.limite, self.fenetre = parse_taux(taux)
+        self.cles = cles
+        self.methodes = methodes
+
+    def cles_pour(self, request):
+        cles = []
+        if 'ip' in self.cles:
+            cles.append(f'{self.nom}:ip:{adresse_ip(request)}')
+        if 'user' in self.cles and request.user.is_authenticated:
+            cles.append(f'{self.nom}:user:{request.user.pk}')
+        return cles
+
+    def _estimer(self, cache, cle, maintenant):
+        index = int(maintenant // self.fenetre)
+        courante = f'rl:{cle}:{index}'
+        cache.add(courante, 0, self.fenetre * 2)
+        try:
+            compte = cache.incr(courante)
+        except ValueError:
+            # Expirée entre add() et incr()
+            cache.set(courante, 1, self.fenetre * 2)
+            compte = 1
+        precedente = cache.get(f'rl:{cle}:{index - 1}', 0)
+        poids = 1 - (maintenant % self.fenetre) / self.fenetre
+        return precedente * poids + compte, (index + 1) * self.fenetre
+
+    def verifier(self, request):
+        """Retourne ``None`` si la requête passe, sinon le délai d'attente en secondes."""
+        maintenant = time.time()
+        cles = self.cles_pour(request)
+        for cle in cles:
+            fin = _bloques.get(cle)
+            if fin is not None:
+                if fin > maintenant:
+                    return fin - maintenant
+                _bloques.pop(cle, None)
+
+        cache = _cache()
+        for cle in cles:
+            estimation, fin = self._estimer(cache, cle, maintenant)
+            if estimation > self.limite:
+                if len(_bloques) > TAILLE_MAX_BLOQUES:
+                    _purger(maintenant)
+                _bloques[cle] = fin
+                return fin - maintenant
+        return None
+
+
+def _purger(maintenant):
+    for cle, fin in list(_bloques.items()):
+        if fin <= maintenant:
+            _bloques.pop(cle, None)
+
+
+def ratelimit(taux, cles=('ip', 'user'), methodes=('POST',), nom=None):
+    """Marque une vue comme limitée à ``taux`` requêtes (ex. ``'10/m'``) par clé."""
+    def decorator(view_func):
+        regle = Regle(nom or f'{view_func.__module__}.{view_func.__name__}:{taux}', taux, cles, methodes)
+        _regles[regle.nom] = regle
+
+        @wraps(view_func)
+        def wrapped_view(*args, **kwargs):
+            return view_func(*args, **kwargs)
+        # Les décorateurs s'empilent : '10/m' puis '100/h' sur la même vue
+        wrapped_view.ratelimit = getattr(view_func, 'ratelimit', ()) + (regle,)
+        return wrapped_view
+    return decorator
+
+
+def _enregistrer_rejet(regle):
+    _rejets[regle.nom] = _rejets.get(regle.nom, 0) + 1
+    cache = _cache()
+    cle = f'rl:rejets:{regle.nom}'
+    cache.add(cle, 0, None)
+    try:
+        cache.incr(cle)
+    except ValueError:
+        pass
+
+
+def statistiques():
+    """Nombre de rejets par vue : ce processus et total partagé via le cache."""
+    cache = _cache()
+    return {
+        nom: {
+            'processus': _rejets.get(nom, 0),
+            'total': cache.get(f'rl:rejets:{nom}', 0),
+        }
+        for nom in sorted(_regles)
+    }
+
+
+def reinitialiser():
+    """Vide l'état local du processus (tests). Les compteurs restent dans le cache."""
+    _bloques.clear()
+    _rejets.clear()
+
+
+class RateLimitMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        regles = getattr(view_func, 'ratelimit', ())
+        if not regles or not getattr(settings, 'RATELIMIT_ENABLE', True):
+            return None
+        for regle in regles:
+            if request.method in regle.methodes:
+                attente = regle.verifier(request)
+                if attente is not None:
+                    return self._refuser(request, regle, attente)
+        return None
+
+    def _refuser(self, request, regle, attente):
+        _enregistrer_rejet(regle)
+        logger.warning("Requête limitée sur %s depuis %s", regle.nom, adresse_ip(request))
+        response = JsonResponse({
+            'success': False,
+            'message': "Trop de tentatives, merci de réessayer plus tard",
+        }, status=429)
+        response['Retry-After'] = str(math.ceil(attente))
+        return response
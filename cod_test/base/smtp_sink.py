@@ -0,0 +1,149 @@
+"""Serveur SMTP local qui garde les messages en mémoire.
+
+Pour les tests et les mesures de débit de la boîte d'envoi sans réseau ni
+compte de messagerie::
+
+    with SMTPSink() as sink:
+        with override_settings(**sink.settings()):
+            envoyer_emails()
+    sink.messages, sink.connexions
+
+Il ne gère que le strict nécessaire du protocole (pas de TLS ni
+d'authentification). ``latence`` simule le coût d'ouverture d'une connexion,
+``refus`` le nombre de messages à refuser avec une erreur temporaire 451.
+"""
+import email
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def _repondre(self, *lignes):
+        self.wfile.write(''.join(f'{ligne}\r\n' for ligne in lignes).encode())
+
+    def _lire_donnees(self):
+        lignes = []
+        while True:
+            ligne = self.rfile.readline()
+            if not ligne or ligne == b'.\r\n':
+                return b''.join(lignes)
+            # Points doublés en début de ligne par le client
+            lignes.append(ligne[1:] if ligne.startswith(b'..') else ligne)
+
+    def handle(self):
+        sink = self.server.sink
+        sink.nouvelle_connexion()
+        self._repondre('220 sink ESMTP')
+        expediteur, destinataires = None, []
+        while True:
+            ligne = self.rfile.readline()
+            if not ligne:
+                return
+            commande = ligne.decode('utf-8', 'replace').strip()
+            verbe = commande[:4].upper()
+            if verbe == 'EHLO':
+                self._repondre('250-sink', '250-8BITMIME', '250 SMTPUTF8')
+            elif verbe == 'HELO':
+                self._repondre('250 sink')
+            elif verbe == 'MAIL':
+                expediteur, destinataires = commande.split(':', 1)[1].strip(), []
+                self._repondre('250 OK')
+            elif verbe == 'RCPT':
+                destinataires.append(commande.split(':', 1)[1].strip())
+                self._repondre('250 OK')
+            elif verbe == 'DATA':
+                self._repondre('354 Fin des données par <CRLF>.<CRLF>')
+                donnees = self._lire_donnees()
+                if sink.consommer_refus():
+                    self._repondre('451 Réessayez plus tard')
+                else:
+                    sink.enregistrer(expediteur, destinataires, donnees)
+                    self._repondre('250 OK')
+                expediteur, destinataires = None, []
+            elif verbe == 'RSET':
+                expediteur, destinataires = None, []
+                self._repondre('250 OK')
+            elif verbe == 'NOOP':
+                self._repondre('250 OK')
+            elif verbe == 'QUIT':
+                self._repondre('221 Au revoir')
+                return
+            else:
+                self._repondre('502 Commande non prise en charge')
+
+
+class _Serveur(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """Serveur SMTP multi-thread lancé en arrière-plan sur ``127.0.0.1``."""
+
+    def __init__(self, port=0, latence=0, refus=0):
+        self.latence = latence
+        self.refus = refus
+        self.messages = []
+        self.connexions = 0
+        self._lock = threading.Lock()
+        self._serveur = _Serveur(('127.0.0.1', port), _Handler)
+        self._serveur.sink = self
+        self._thread = None
+
+    @property
+    def host(self):
+        return self._serveur.server_address[0]
+
+    @property
+    def port(self):
+        return self._serveur.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serveur.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._serveur.serve_forever()
+
+    def stop(self):
+        self._serveur.shutdown()
+        self._serveur.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def nouvelle_connexion(self):
+        with self._lock:
+            self.connexions += 1
+        if self.latence:
+            time.sleep(self.latence)
+
+    def consommer_refus(self):
+        with self._lock:
+            if self.refus > 0:
+                self.refus -= 1
+                return True
+            return False
+
+    def enregistrer(self, expediteur, destinataires, donnees):
+        message = email.message_from_bytes(donnees)
+        with self._lock:
+            self.messages.append((expediteur, destinataires, message))
+
+    def settings(self):
+        """Réglages Django pour envoyer vers ce serveur (``override_settings(**sink.settings())``)."""
+        return {
+            'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': self.host,
+            'EMAIL_PORT': self.port,
+            'EMAIL_USE_TLS': False,
+            'EMAIL_USE_SSL': False,
+            'EMAIL_HOST_USER': '',
+            'EMAIL_HOST_PASSWORD': '',
+        }
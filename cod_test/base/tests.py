@@ -1,5 +1,19 @@
-from django.test import TestCase
+import json
+from unittest import mock
+
+from django.test import TestCase, override_settings
 from django.apps import apps
+from django.contrib.auth.models import User
+from django.contrib.admin import site
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from customer import views as customer_views
+from . import admin_performance, housekeeping, outbox, ratelimit
+from .models import EmailSortant
+from .smtp_sink import SMTPSink
 
 
 class BaseAppTests(TestCase):
@@ -7,3 +21,345 @@ class BaseAppTests(TestCase):
         config = apps.get_app_config('base')
         self.assertEqual(config.name, 'base')
 
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        ratelimit.reinitialiser()
+
+    def _newsletter(self, corps=b'{"email": "a@example.com"}', **extra):
+        return self.client.post(
+            reverse('post_newsletter'), data=corps, content_type='application/json', **extra
+        )
+
+    def test_requete_refusee_apres_la_limite(self):
+        for _ in range(5):
+            self.assertEqual(self._newsletter().status_code, 200)
+        response = self._newsletter()
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(response.json()['success'])
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+    def test_corps_non_lu_une_fois_bloque(self):
+        for _ in range(6):
+            self._newsletter()
+        # Un corps invalide ferait échouer la vue : il n'est jamais lu
+        self.assertEqual(self._newsletter(corps=b'pas du json').status_code, 429)
+
+    def test_cle_bloquee_refusee_sans_acces_au_cache(self):
+        for _ in range(6):
+            self._newsletter()
+        with mock.patch.object(ratelimit, '_cache', side_effect=AssertionError("cache consulté")) as cache:
+            regle = ratelimit._regles['contact.views.post_newsletter:5/m']
+            request = mock.Mock(META={'REMOTE_ADDR': '127.0.0.1'})
+            request.user.is_authenticated = False
+            self.assertIsNotNone(regle.verifier(request))
+            cache.assert_not_called()
+
+    def test_limite_par_adresse_ip(self):
+        for _ in range(6):
+            self._newsletter()
+        self.assertEqual(self._newsletter(REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    def test_adresse_derriere_proxy_de_confiance(self):
+        request = mock.Mock(META={'REMOTE_ADDR': '10.1.1.1', 'HTTP_X_FORWARDED_FOR': '6.6.6.6, 41.202.1.7'})
+        self.assertEqual(ratelimit.adresse_ip(request), '10.1.1.1')
+        with override_settings(RATELIMIT_PROXIES=1):
+            # L'adresse ajoutée par le routeur, pas celle fournie par le client
+            self.assertEqual(ratelimit.adresse_ip(request), '41.202.1.7')
+        with override_settings(RATELIMIT_PROXIES=3):
+            self.assertEqual(ratelimit.adresse_ip(request), '10.1.1.1')
+
+    @override_settings(RATELIMIT_PROXIES=1)
+    def test_clients_distincts_derriere_le_routeur(self):
+        for _ in range(6):
+            self._newsletter(REMOTE_ADDR='10.1.1.1', HTTP_X_FORWARDED_FOR='41.202.1.7')
+        self.assertEqual(self._newsletter(REMOTE_ADDR='10.1.1.1', HTTP_X_FORWARDED_FOR='41.202.1.7').status_code, 429)
+        # Même routeur, autre client ; un X-Forwarded-For falsifié ne change pas la clé
+        self.assertEqual(self._newsletter(REMOTE_ADDR='10.1.1.1', HTTP_X_FORWARDED_FOR='41.202.1.8').status_code, 200)
+        self.assertEqual(
+            self._newsletter(REMOTE_ADDR='10.1.1.1', HTTP_X_FORWARDED_FOR='1.2.3.4, 41.202.1.7').status_code, 429
+        )
+
+    def test_essais_de_coupons_limites(self):
+        corps = json.dumps({'panier': 'anonyme', 'coupon': 'INCONNU'})
+        for _ in range(10):
+            response = self.client.post(reverse('add_coupon'), corps, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('add_coupon'), corps, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+
+    def test_vues_panier_limitees(self):
+        for vue in (customer_views.cart_batch, customer_views.update_cart, customer_views.delete_from_cart):
+            self.assertTrue(getattr(vue, 'ratelimit', ()), vue.__name__)
+
+    def test_get_non_limite(self):
+        for _ in range(7):
+            response = self.client.get(reverse('request_reset_password'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_taux_empiles(self):
+        self.assertEqual(
+            [regle.nom for regle in customer_views.islogin.ratelimit],
+            ['customer.views.islogin:10/m', 'customer.views.islogin:100/h'],
+        )
+
+    def test_statistiques_des_rejets(self):
+        for _ in range(8):
+            self._newsletter()
+        User.objects.create_user('admin', password='x', is_staff=True)
+        self.client.force_login(User.objects.get(username='admin'))
+        rejets = self.client.get(reverse('ratelimit_stats')).json()['rejets']
+        self.assertEqual(rejets['contact.views.post_newsletter:5/m']['total'], 3)
+
+    def test_parse_taux(self):
+        self.assertEqual(ratelimit.parse_taux('5/m'), (5, 60))
+        self.assertEqual(ratelimit.parse_taux('100/10m'), (100, 600))
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.sink = SMTPSink().start()
+        self.addCleanup(self.sink.stop)
+        reglages = override_settings(**self.sink.settings())
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def _file(self, nombre):
+        for numero in range(nombre):
+            outbox.send_mail(f'Sujet {numero}', 'Corps', 'shop@cooldeal.local', [f'c{numero}@example.com'])
+
+    def test_la_vue_met_en_file_sans_envoyer(self):
+        user = User.objects.create_user('client', email='client@example.com', password='x')
+        response = self.client.post(reverse('request_reset_password'), {'email': user.email})
+        self.assertEqual(response.status_code, 302)
+        email = EmailSortant.objects.get()
+        self.assertEqual(email.destinataires, ['client@example.com'])
+        self.assertIsNone(email.envoye_le)
+        self.assertEqual(self.sink.connexions, 0)
+
+    def test_lots_envoyes_sur_une_seule_connexion(self):
+        self._file(25)
+        connexion = outbox.get_connection()
+        try:
+            self.assertEqual(outbox.envoyer_emails(limite=10, connexion=connexion)['envoyes'], 10)
+            self.assertEqual(outbox.envoyer_emails(limite=10, connexion=connexion)['envoyes'], 10)
+            self.assertEqual(outbox.envoyer_emails(limite=10, connexion=connexion)['envoyes'], 5)
+        finally:
+            connexion.close()
+        self.assertEqual(self.sink.connexions, 1)
+        self.assertEqual(len(self.sink.messages), 25)
+        self.assertFalse(EmailSortant.objects.filter(envoye_le__isnull=True).exists())
+
+    def test_corps_html_en_alternative(self):
+        outbox.send_mail('Sujet', 'Texte', None, ['a@example.com'], html_message='<p>Texte</p>')
+        outbox.envoyer_emails()
+        _, destinataires, message = self.sink.messages[0]
+        self.assertEqual(destinataires, ['<a@example.com>'])
+        self.assertEqual(message.get_content_type(), 'multipart/alternative')
+
+    def test_echec_temporaire_reprogramme(self):
+        self._file(3)
+        self.sink.refus = 1
+        stats = outbox.envoyer_emails()
+        self.assertEqual(stats, {'envoyes': 2, 'echecs': 1})
+        echec = EmailSortant.objects.get(envoye_le__isnull=True)
+        self.assertEqual(echec.tentatives, 1)
+        self.assertIn('451', echec.derniere_erreur)
+        self.assertGreater(echec.prochaine_tentative, echec.date_add)
+
+        # Rien à renvoyer avant l'échéance, puis envoi une fois le délai passé
+        self.assertEqual(outbox.envoyer_emails(), {'envoyes': 0, 'echecs': 0})
+        EmailSortant.objects.filter(pk=echec.pk).update(prochaine_tentative=echec.date_add)
+        self.assertEqual(outbox.envoyer_emails()['envoyes'], 1)
+
+    @override_settings(EMAIL_SORTANT_MAX_TENTATIVES=1)
+    def test_abandon_apres_max_tentatives(self):
+        self._file(1)
+        self.sink.refus = 1
+        outbox.envoyer_emails()
+        EmailSortant.objects.update(prochaine_tentative=EmailSortant.objects.get().date_add)
+        self.assertEqual(outbox.envoyer_emails(), {'envoyes': 0, 'echecs': 0})
+
+    def test_serveur_injoignable(self):
+        self._file(2)
+        self.sink.stop()
+        self.assertEqual(outbox.envoyer_emails(), {'envoyes': 0, 'echecs': 0})
+        self.assertEqual(EmailSortant.objects.filter(envoye_le__isnull=True).count(), 2)
+
+
+class HousekeepingFrameworkTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from contact.models import Contact
+        from customer.models import PasswordResetToken
+
+        ancien = timezone.now() - timedelta(days=400)
+        for numero in range(5):
+            user = User.objects.create_user(f'menage{numero}')
+            PasswordResetToken.objects.create(user=user, token=f'jeton{numero}')
+        PasswordResetToken.objects.exclude(token='jeton4').update(created_at=ancien)
+        Contact.objects.bulk_create(
+            [Contact(nom='Nom', sujet='Sujet', email='a@example.com', message='Message') for _ in range(3)]
+        )
+        Contact.objects.filter(pk__in=Contact.objects.order_by('pk').values('pk')[:2]).update(date_add=ancien)
+
+    def test_politiques_des_applications_enregistrees(self):
+        noms = [regle.nom for regle in housekeeping.politiques()]
+        self.assertLess(noms.index('paniers'), noms.index('sessions'))
+        self.assertTrue({'tokens', 'contacts'} <= set(noms))
+
+    def test_cron_des_tokens_ne_supprime_que_les_expires(self):
+        from customer.cron import CleanExpiredTokensCronJob
+        from customer.models import PasswordResetToken
+
+        CleanExpiredTokensCronJob().do()
+        self.assertEqual(list(PasswordResetToken.objects.values_list('token', flat=True)), ['jeton4'])
+
+    def test_retention_des_contacts(self):
+        from contact.models import Contact
+
+        metriques = housekeeping.nettoyer(['contacts'])
+        self.assertEqual(metriques['contacts']['supprimes'], 2)
+        self.assertEqual(Contact.objects.count(), 1)
+
+    def test_pause_entre_lots_complets(self):
+        with mock.patch.object(housekeeping.time, 'sleep') as sleep:
+            metriques = housekeeping.nettoyer(['tokens'], taille_lot=2, pause=0.5)
+        self.assertEqual((metriques['tokens']['supprimes'], metriques['tokens']['lots']), (4, 2))
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_duree_max_interrompt_et_reprend(self):
+        from customer.models import PasswordResetToken
+
+        # Chaque appel à monotonic() avance d'une seconde : un seul lot tient dans le budget
+        horloge = iter(range(100))
+        with mock.patch.object(housekeeping.time, 'monotonic', side_effect=lambda: next(horloge)):
+            metriques = housekeeping.nettoyer(['tokens'], taille_lot=2, duree_max=1.5)
+        self.assertTrue(metriques['tokens']['interrompu'])
+        self.assertEqual(metriques['tokens']['supprimes'], 2)
+        self.assertEqual(PasswordResetToken.objects.count(), 3)
+
+        housekeeping.nettoyer(['tokens'], taille_lot=2)
+        self.assertEqual(PasswordResetToken.objects.count(), 1)
+
+    def test_metriques_journalisees(self):
+        with self.assertLogs('base.housekeeping', level='INFO') as logs:
+            housekeeping.nettoyer(['tokens'], dry_run=True)
+        self.assertIn('politique=tokens supprimes=4', logs.output[0])
+        self.assertEqual(logs.records[0].housekeeping['politique'], 'tokens')
+        self.assertIn('debit', logs.records[0].housekeeping)
+
+    def test_politique_inconnue(self):
+        with self.assertRaises(KeyError):
+            housekeeping.nettoyer(['inconnue'])
+
+
+
+class AdminPerformanceTests(TestCase):
+    APPS = ('shop', 'customer', 'website', 'contact', 'base')
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('superadmin', 'admin@example.com', 'x')
+        self.client.force_login(self.admin)
+        self.rang = 0
+
+    def _peupler(self, nombre):
+        """``nombre`` marchands, chacun avec produit, client, commande, panier et favori."""
+        from customer.models import CodePromotionnel, Commande, Customer, Panier, PasswordResetToken, ProduitPanier
+        from shop.models import CategorieEtablissement, CategorieProduit, Etablissement, Favorite, Produit
+
+        for _ in range(nombre):
+            self.rang += 1
+            n = self.rang
+            cat_etab = CategorieEtablissement.objects.create(nom=f"Cat {n}", description="Cat")
+            cat_prod = CategorieProduit.objects.create(nom=f"Plats {n}", description="Plats", categorie=cat_etab)
+            etab = Etablissement.objects.create(
+                user=User.objects.create_user(f'marchand{n}', password='x'), nom=f"Etab {n}", description="D",
+                categorie=cat_etab, adresse="Cocody", pays="CI", contact_1="01", email=f"etab{n}@example.com",
+                logo="logo.png", couverture="cover.png", nom_du_responsable="Doe", prenoms_duresponsable="John",
+            )
+            produit = Produit.objects.create(
+                nom=f"Produit {n}", description="D", description_deal="P", prix=1000,
+                categorie=cat_prod, etablissement=etab,
+            )
+            user = User.objects.create_user(f'client{n}', password='x')
+            customer = Customer.objects.create(user=user, adresse="Ad", contact_1="01")
+            coupon = CodePromotionnel.objects.create(
+                libelle=f"Coupon {n}", code_promo=f"CODE{n}", reduction=0.1, date_fin="2030-01-01", etat=True,
+            )
+            panier = Panier.objects.create(customer=customer, coupon=coupon)
+            commande = Commande.objects.create(customer=customer, transaction_id=f"TX{n}", prix_total=1000)
+            ProduitPanier.objects.create(panier=panier, produit=produit, quantite=1)
+            ProduitPanier.objects.create(commande=commande, produit=produit, quantite=1)
+            Favorite.objects.create(user=user, produit=produit)
+            PasswordResetToken.objects.create(user=user, token=f'jeton{n}')
+
+    def _changelists(self):
+        return [
+            reverse(f'admin:{modele._meta.app_label}_{modele._meta.model_name}_changelist')
+            for modele in site._registry
+            if modele._meta.app_label in self.APPS
+        ]
+
+    def _requetes(self):
+        comptes = {}
+        for url in self._changelists():
+            with CaptureQueriesContext(connection) as requetes:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            comptes[url] = len(requetes)
+        return comptes
+
+    def test_nombre_de_requetes_independant_du_nombre_de_lignes(self):
+        self._peupler(2)
+        avant = self._requetes()
+        self._peupler(8)
+        self.assertEqual(self._requetes(), avant)
+        for url, nombre in avant.items():
+            # Le processeur ``cart`` est rejoué pour chaque filtre de la liste
+            self.assertLessEqual(nombre, 25, url)
+
+    def test_infos_du_site_lues_une_fois(self):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('admin:shop_produit_changelist'))
+        self.assertEqual(response.status_code, 200)
+        lectures = [q['sql'] for q in requetes if 'website_siteinfo' in q['sql']]
+        self.assertEqual(len(lectures), 1)
+
+    def test_recherche_sans_comptage_complet(self):
+        self._peupler(3)
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('admin:shop_produit_changelist'), {'q': 'Produit 2'})
+        self.assertEqual(response.status_code, 200)
+        comptages = [q['sql'] for q in requetes if 'COUNT(*)' in q['sql'] and 'shop_produit' in q['sql']]
+        # Seul le comptage filtré est exécuté
+        self.assertEqual(len(comptages), 1)
+        self.assertIn('WHERE', comptages[0])
+
+    def test_comptage_estime_sans_filtre(self):
+        from shop.models import Produit
+
+        self._peupler(2)
+        with mock.patch.object(admin_performance, 'estimation_lignes', return_value=1_000_000):
+            self.assertEqual(admin_performance.ComptageEstimePaginator(Produit.objects.all(), 100).count, 1_000_000)
+            self.assertEqual(
+                admin_performance.ComptageEstimePaginator(Produit.objects.filter(status=True), 100).count, 2
+            )
+            response = self.client.get(reverse('admin:shop_produit_changelist'))
+        self.assertContains(response, '1000000')
+
+    def test_comptage_exact_sous_le_seuil(self):
+        from shop.models import Produit
+
+        self._peupler(2)
+        with mock.patch.object(admin_performance, 'estimation_lignes', return_value=50):
+            self.assertEqual(admin_performance.ComptageEstimePaginator(Produit.objects.all(), 100).count, 2)
+
+    def test_estimation_sqlite_sans_statistiques(self):
+        from shop.models import Produit
+
+        # Sans ANALYZE préalable, sqlite_stat1 n'a pas de ligne pour la table
+        self.assertIsNone(admin_performance.estimation_lignes(Produit))
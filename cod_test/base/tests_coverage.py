@@ -588,13 +588,15 @@ class TestWebsiteCoverage(TestCase):
         session.save()
         request.session = session
         
-        # 1. Anonymous new cart
+        # 1. Anonymous cart lives outside the database
+        from customer.cart_storage import PanierAnonyme
         ctx = context_processors.cart(request)
         self.assertIsNotNone(ctx['cart'])
-        self.assertTrue(isinstance(ctx['cart'], Panier))
+        self.assertTrue(isinstance(ctx['cart'], PanierAnonyme))
+        self.assertFalse(Panier.objects.exists())
         
         # 2. Anonymous existing cart
-        # Calling again should retrieve the same cart associated with session
+        # Calling again should retrieve the same cart attached to the request
         panier_id = ctx['cart'].id
         ctx2 = context_processors.cart(request)
         self.assertEqual(ctx2['cart'].id, panier_id)
@@ -945,7 +947,7 @@ class TestClientCoverage(TestCase):
                 return self
             def __exit__(self, exc_type, exc, tb): 
                 return False
-        with patch('client.views.sync_playwright', return_value=DummyPlaywright()):
+        with patch('client.pdf_service.sync_playwright', return_value=DummyPlaywright()):
             resp = self.client.get(reverse('invoice_pdf', args=[self.commande.id]))
             self.assertEqual(resp.status_code, 200)
     
@@ -1476,6 +1478,8 @@ class TestShopEvenMoreCoverage(TestCase):
             def filter(self, *a, **kw): return self
             def order_by(self, *a, **kw): return self
             def distinct(self): return self
+            def select_related(self, *a): return self
+            def annotate(self, *a, **kw): return self
             def __len__(self): return 0
             def __iter__(self): return iter(())
             def __getitem__(self, k): return []
@@ -1513,6 +1517,7 @@ class TestClientMoreCoverage(TestCase):
             def order_by(self, *a, **kw): return self
             def distinct(self): return self
             def filter(self, *a, **kw): return self
+            def prefetch_related(self, *a, **kw): return self
             def __len__(self): return 0
             def __iter__(self): return iter(())
             def __getitem__(self, k): return []
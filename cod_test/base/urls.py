@@ -1,7 +1,7 @@
-# from django.urls import path
-# from . import views
+from django.urls import path
+from . import views
 
 
 urlpatterns = [
-    # path('', views.home, name='home'),
+    path('ratelimit/stats', views.ratelimit_stats, name='ratelimit_stats'),
 ]
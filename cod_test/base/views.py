@@ -1,3 +1,9 @@
-# from django.shortcuts import render
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 
-# Create your views here.
+from . import ratelimit
+
+
+@staff_member_required
+def ratelimit_stats(request):
+    return JsonResponse({'success': True, 'rejets': ratelimit.statistiques()})
@@ -0,0 +1,201 @@
+"""Export groupé des reçus PDF en une archive ZIP diffusée au fil de l'eau.
+
+Les reçus sont lus depuis le stockage, ou rendus s'ils n'existent pas encore,
+par un pool de threads ; l'archive est écrite dans l'ordre des commandes et
+chaque entrée est envoyée au client dès qu'elle est prête. Au plus
+``2 × workers`` reçus sont en mémoire à la fois, quelle que soit la taille de
+l'export. Les PDF étant déjà compressés, les entrées sont stockées sans
+compression.
+
+L'avancement est publié dans le cache sous la clé de suivi de l'export,
+relue par la vue de progression. Sous ASGI, le générateur est parcouru par
+``recus.flux_asynchrone`` pour que l'archive reste diffusée au fil de l'eau.
+"""
+import datetime
+import io
+import logging
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from customer.models import Commande
+from . import recus
+
+logger = logging.getLogger(__name__)
+
+DUREE_SUIVI = 3600
+JOURNAL_TOUS_LES = 50
+
+
+class ExportError(Exception):
+    pass
+
+
+def _workers():
+    return getattr(settings, 'EXPORT_RECUS_WORKERS', 4)
+
+
+def _maximum():
+    return getattr(settings, 'EXPORT_RECUS_MAX', 500)
+
+
+def _debut_du_jour(valeur, nom):
+    jour = parse_date(valeur)
+    if jour is None:
+        raise ExportError(f"Date invalide pour {nom} : {valeur}")
+    return timezone.make_aware(datetime.datetime.combine(jour, datetime.time.min))
+
+
+def selection(commandes, params):
+    """Restreint ``commandes`` aux reçus demandés : période et/ou commandes cochées.
+
+    ``date_min`` et ``date_max`` (``AAAA-MM-JJ``) sont inclusives ; ``commande``
+    peut être répété. Retourne la liste des identifiants, du plus récent au
+    plus ancien.
+    """
+    commandes = commandes.filter(status=True)
+    if params.get('date_min'):
+        commandes = commandes.filter(date_add__gte=_debut_du_jour(params['date_min'], 'date_min'))
+    if params.get('date_max'):
+        lendemain = _debut_du_jour(params['date_max'], 'date_max') + datetime.timedelta(days=1)
+        commandes = commandes.filter(date_add__lt=lendemain)
+    ids = params.getlist('commande')
+    if ids:
+        try:
+            commandes = commandes.filter(pk__in=[int(pk) for pk in ids])
+        except ValueError:
+            raise ExportError("Sélection de commandes invalide")
+
+    ids = list(commandes.order_by('-date_add', '-pk').values_list('pk', flat=True).distinct()[:_maximum() + 1])
+    if not ids:
+        raise ExportError("Aucun reçu à exporter")
+    if len(ids) > _maximum():
+        raise ExportError(f"Export limité à {_maximum()} reçus, réduisez la période")
+    return ids
+
+
+def cle_suivi(user, jeton):
+    return f'export-recus:{user.pk}:{jeton}'
+
+
+def progression(user, jeton):
+    return cache.get(cle_suivi(user, jeton))
+
+
+def _lire_recu(commande_id, request):
+    try:
+        commande = Commande.objects.get(pk=commande_id)
+        recus.generer_recu(commande, request)
+        with commande.recu_paiement.open('rb') as fichier:
+            return commande, fichier.read()
+    finally:
+        # Chaque thread a sa propre connexion à la base
+        connection.close()
+
+
+class _Flux(io.RawIOBase):
+    """Sortie non positionnable de l'archive : ce qui est écrit part au prochain ``vider()``."""
+
+    def __init__(self):
+        self._morceaux = []
+
+    def writable(self):
+        return True
+
+    def write(self, donnees):
+        self._morceaux.append(bytes(donnees))
+        return len(donnees)
+
+    def vider(self):
+        donnees = b''.join(self._morceaux)
+        self._morceaux = []
+        return donnees
+
+
+def flux_zip(ids, request=None, suivi=None, workers=None):
+    """Générateur des octets de l'archive des reçus ``ids``, pour une ``StreamingHttpResponse``."""
+    workers = workers or _workers()
+    etat = {'total': len(ids), 'faits': 0, 'echecs': 0, 'termine': False}
+    if suivi:
+        cache.set(suivi, etat, DUREE_SUIVI)
+
+    flux = _Flux()
+    archive = zipfile.ZipFile(flux, 'w', zipfile.ZIP_STORED)
+    executeur = ThreadPoolExecutor(max_workers=workers)
+    restants = iter(ids)
+    en_cours = deque()
+    erreurs = []
+
+    def soumettre():
+        pk = next(restants, None)
+        if pk is not None:
+            en_cours.append((pk, executeur.submit(_lire_recu, pk, request)))
+
+    try:
+        for _ in range(2 * workers):
+            soumettre()
+        while en_cours:
+            pk, futur = en_cours.popleft()
+            soumettre()
+            try:
+                commande, contenu = futur.result()
+            except Exception as exc:
+                logger.warning("Reçu de la commande %s absent de l'export : %s", pk, exc)
+                erreurs.append(f"Commande {pk} : {exc}")
+                etat['echecs'] += 1
+            else:
+                entree = zipfile.ZipInfo(
+                    f"Recu_{commande.transaction_id}.pdf",
+                    date_time=timezone.localtime(commande.date_add).timetuple()[:6],
+                )
+                archive.writestr(entree, contenu)
+            etat['faits'] += 1
+            if suivi:
+                cache.set(suivi, etat, DUREE_SUIVI)
+            if etat['faits'] % JOURNAL_TOUS_LES == 0:
+                logger.info("export reçus %s/%s", etat['faits'], etat['total'])
+            yield flux.vider()
+
+        if erreurs:
+            archive.writestr("ERREURS.txt", "\n".join(erreurs) + "\n")
+        archive.close()
+        etat['termine'] = True
+        if suivi:
+            cache.set(suivi, etat, DUREE_SUIVI)
+        yield flux.vider()
+    finally:
+        # Client déconnecté : les reçus pas encore commencés sont abandonnés
+        executeur.shutdown(wait=True, cancel_futures=True)
+
+
+def reponse_zip(request, commandes, retour):
+    """Réponse diffusée de l'archive des reçus de ``commandes`` retenus par ``request.GET``.
+
+    Le paramètre ``export`` (jeton choisi par la page) active le suivi de
+    l'avancement, relu par ``progression``. Une sélection refusée renvoie
+    vers la page ``retour`` avec un message d'erreur.
+    """
+    try:
+        ids = selection(commandes, request.GET)
+    except ExportError as exc:
+        messages.error(request, str(exc))
+        return redirect(retour)
+
+    jeton = request.GET.get('export')
+    suivi = cle_suivi(request.user, jeton) if jeton else None
+    flux = flux_zip(ids, request, suivi)
+    if isinstance(request, ASGIRequest):
+        flux = recus.flux_asynchrone(flux)
+    response = StreamingHttpResponse(flux, content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="Recus_{timezone.localdate():%Y%m%d}.zip"'
+    return response
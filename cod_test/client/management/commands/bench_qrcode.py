@@ -0,0 +1,51 @@
+import base64
+import statistics
+import time
+from io import BytesIO
+
+import qrcode
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+from client import qrcodes
+
+
+def _ancien(data):
+    # Rendu d'avant le cache : PNG 10 px par module, ré-encodé à chaque reçu
+    buf = BytesIO()
+    qrcode.make(data).save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("utf-8")
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark des QR codes de reçus : temps d'encodage, taille, gain du cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nombre', type=int, default=200, help="Nombre d'adresses distinctes")
+
+    def handle(self, *args, **options):
+        adresses = [
+            f"{settings.SITE_URL.rstrip('/')}/client/commande/{i}/recu/"
+            for i in range(100000, 100000 + options['nombre'])
+        ]
+        caches[getattr(settings, 'QRCODE_CACHE', 'default')].delete_many(
+            [qrcodes.cle(a, f) for a in adresses for f in qrcodes.FORMATS]
+        )
+
+        self._mesurer("ancien png+base64", adresses, _ancien)
+        for format in qrcodes.FORMATS:
+            self._mesurer(f"{format} (calcul)", adresses, lambda a: qrcodes.data_uri(a, format))
+            self._mesurer(f"{format} (cache)", adresses, lambda a: qrcodes.data_uri(a, format))
+
+    def _mesurer(self, libelle, adresses, fonction):
+        durees, tailles = [], []
+        for adresse in adresses:
+            t0 = time.perf_counter()
+            resultat = fonction(adresse)
+            durees.append(time.perf_counter() - t0)
+            tailles.append(len(resultat))
+        self.stdout.write(
+            f"{libelle:<20} médiane {statistics.median(durees) * 1e6:>8.0f} µs, "
+            f"total {sum(durees) * 1000:>7.1f} ms, {statistics.mean(tailles):>6.0f} octets dans le HTML"
+        )
@@ -0,0 +1,63 @@
+import resource
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from client.pdf_backends import BACKENDS, get_backend
+from customer.models import Commande
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare les moteurs de reçus PDF (débit, latence, mémoire) sur les mêmes commandes. "
+        "Rien n'est enregistré."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--commandes', type=int, default=20, help="Nombre de commandes payées à rendre")
+        parser.add_argument('--backends', default=','.join(BACKENDS), help="Moteurs séparés par des virgules")
+        parser.add_argument('--repetitions', type=int, default=1)
+
+    def handle(self, *args, **options):
+        commandes = list(Commande.objects.filter(status=True).order_by('-pk')[:options['commandes']])
+        if not commandes:
+            raise CommandError("Aucune commande payée à rendre")
+        commandes *= options['repetitions']
+
+        for nom in options['backends'].split(','):
+            try:
+                self._mesurer(nom.strip(), commandes)
+            except Exception as exc:
+                self.stdout.write(f"{nom} : indisponible ({exc.__class__.__name__}: {exc})")
+
+    def _mesurer(self, nom, commandes):
+        backend = get_backend(nom)
+        # Premier rendu hors mesure : imports, polices, démarrage éventuel du navigateur
+        backend.rendre(commandes[0])
+
+        durees, tailles = [], []
+        debut = time.perf_counter()
+        for commande in commandes:
+            t0 = time.perf_counter()
+            tailles.append(len(backend.rendre(commande)))
+            durees.append(time.perf_counter() - t0)
+        total = time.perf_counter() - debut
+
+        # Mémoire mesurée à part : tracemalloc ralentit fortement les rendus
+        tracemalloc.start()
+        backend.rendre(commandes[0])
+        _, pic = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # Chromium tourne dans des processus fils, invisibles pour tracemalloc
+        enfants = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+        durees.sort()
+        centiles = statistics.quantiles(durees, n=100) if len(durees) > 1 else durees * 99
+        self.stdout.write(
+            f"{nom} : {len(commandes)} reçus en {total:.2f}s ({len(commandes) / total:.1f}/s), "
+            f"p50={centiles[49] * 1000:.0f}ms p99={centiles[98] * 1000:.0f}ms, "
+            f"{statistics.mean(tailles) / 1024:.0f} Ko/reçu, pic Python {pic / 1024 / 1024:.1f} Mo, "
+            f"RSS max des processus fils {enfants / 1024:.0f} Mo"
+        )
@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.db import connection
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from client import recus
+from customer.models import Commande
+
+
+def _generer(commande_id, force):
+    try:
+        commande = Commande.objects.get(pk=commande_id)
+        recus.generer_recu(commande, force=force)
+    finally:
+        # Chaque thread a sa propre connexion à la base
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Génère en parallèle les reçus PDF des commandes payées qui n'en ont pas encore."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Reçus rendus en parallèle")
+        parser.add_argument('--limite', type=int, default=None, help="Nombre maximal de reçus")
+        parser.add_argument('--force', action='store_true', help="Régénère aussi les reçus existants")
+
+    def handle(self, *args, **options):
+        commandes = Commande.objects.filter(status=True).order_by('pk')
+        if not options['force']:
+            commandes = commandes.filter(Q(recu_paiement__isnull=True) | Q(recu_paiement=''))
+        ids = list(commandes.values_list('pk', flat=True)[:options['limite']])
+
+        generes = echecs = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executeur:
+            futurs = {executeur.submit(_generer, pk, options['force']): pk for pk in ids}
+            for futur in as_completed(futurs):
+                try:
+                    futur.result()
+                    generes += 1
+                except Exception as exc:
+                    echecs += 1
+                    self.stderr.write(f"Commande {futurs[futur]} : {exc}")
+        self.stdout.write(f"{generes} reçus générés, {echecs} en échec.")
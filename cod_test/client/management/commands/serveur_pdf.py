@@ -0,0 +1,80 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from client.pdf_service import PoolNavigateur, ServeurPDF, rendre_pdf, rendre_pdf_local
+
+HTML_BENCH = """<!DOCTYPE html><html><body>
+<h1>Reçu de paiement</h1>
+<table>{lignes}</table>
+</body></html>""".format(lignes=''.join(f'<tr><td>Produit {i}</td><td>{i * 1000} F</td></tr>' for i in range(20)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Lance le service de rendu PDF (Chromium chaud, pool de pages). Avec --bench, "
+        "compare la latence p50/p99 du service à celle d'un Chromium lancé par reçu."
+    )
+
+    def add_arguments(self, parser):
+        config = getattr(settings, 'PDF_SERVICE', {})
+        parser.add_argument('--adresse', default=config.get('ADRESSE') or '127.0.0.1:8790')
+        parser.add_argument('--pages', type=int, default=config.get('PAGES', 4), help="Rendus simultanés")
+        parser.add_argument('--recyclage', type=int, default=config.get('RECYCLAGE', 100),
+                            help="Rendus par page avant d'en recréer le contexte")
+        parser.add_argument('--bench', type=int, default=0, help="Nombre de reçus à rendre")
+        parser.add_argument('--concurrence', type=int, default=4)
+
+    def handle(self, *args, **options):
+        pool = PoolNavigateur(options['pages'], options['recyclage'])
+        if not options['bench']:
+            asyncio.run(self._servir(ServeurPDF(pool, options['adresse'])))
+            return
+        self._bench(pool, options['bench'], options['concurrence'])
+
+    async def _servir(self, serveur):
+        await serveur.demarrer()
+        self.stdout.write(f"Service PDF sur {serveur.adresse} (Ctrl+C pour arrêter)")
+        try:
+            await serveur.servir()
+        finally:
+            await serveur.arreter()
+
+    def _mesurer(self, libelle, total, concurrence, rendre):
+        def chronometrer(_):
+            debut = time.perf_counter()
+            rendre(HTML_BENCH)
+            return time.perf_counter() - debut
+
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrence) as executeur:
+            durees = sorted(executeur.map(chronometrer, range(total)))
+        duree = time.perf_counter() - debut
+        centiles = statistics.quantiles(durees, n=100) if len(durees) > 1 else durees * 99
+        self.stdout.write(
+            f"{libelle} : {total} reçus en {duree:.2f}s ({total / duree:.1f}/s), "
+            f"p50={centiles[49] * 1000:.0f}ms p99={centiles[98] * 1000:.0f}ms"
+        )
+
+    def _bench(self, pool, total, concurrence):
+        # Le service tourne dans un thread avec sa propre boucle, sur un port libre
+        boucle = asyncio.new_event_loop()
+        serveur = ServeurPDF(pool, '127.0.0.1:0')
+        boucle.run_until_complete(serveur.demarrer())
+        thread = threading.Thread(target=boucle.run_forever, daemon=True)
+        thread.start()
+        try:
+            self._mesurer("Chromium lancé par reçu", total, concurrence, rendre_pdf_local)
+            self._mesurer(
+                f"Service PDF ({pool.taille} pages)", total, concurrence,
+                lambda html: rendre_pdf(html, adresse=serveur.adresse),
+            )
+        finally:
+            asyncio.run_coroutine_threadsafe(serveur.arreter(), boucle).result()
+            boucle.call_soon_threadsafe(boucle.stop)
+            thread.join()
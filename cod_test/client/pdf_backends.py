@@ -0,0 +1,163 @@
+"""Moteurs de rendu des reçus PDF, choisis par le réglage ``RECU_PDF_BACKEND``.
+
+* ``playwright`` : ``receipt.html`` imprimé par Chromium (service PDF s'il est
+  configuré, sinon un navigateur lancé pour le reçu). Rendu le plus fidèle.
+* ``xhtml2pdf`` : ``receipt_pdf.html``, un gabarit simplifié, converti en
+  Python par ``client.utils.html_to_pdf``. Pas de navigateur.
+* ``reportlab`` : reçu composé directement avec ReportLab (platypus, qui
+  paginera les longues commandes). Le plus rapide et le plus léger ; ni
+  gabarit ni navigateur.
+
+Chaque moteur expose ``rendre(commande, request=None) -> bytes``. Le réglage
+accepte un de ces noms ou le chemin pointé d'une classe.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.formats import date_format
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from website.models import SiteInfo
+from . import pdf_service
+from .utils import html_to_pdf
+
+
+class RecuBackendError(Exception):
+    pass
+
+
+def url_absolue(chemin, request=None):
+    if request is not None:
+        return request.build_absolute_uri(chemin)
+    # Hors requête (worker, commande) : l'adresse publique du site
+    return settings.SITE_URL.rstrip('/') + chemin
+
+
+def _logo():
+    site = SiteInfo.objects.only('logo').latest('date_add')
+    try:
+        chemin = site.logo.path
+    except (NotImplementedError, ValueError):
+        chemin = None
+    return site.logo.url, (chemin if chemin and os.path.exists(chemin) else None)
+
+
+def donnees_recu(commande, request=None):
+    """Données communes aux moteurs ; les lignes sont lues une seule fois."""
+    logo_url, logo_chemin = _logo()
+    return {
+        "order_id": commande,
+        "produits_commande": list(commande.produit_commande.select_related("produit")),
+        "detail_url": url_absolue(reverse("commande-reçu-detail", args=[commande.id]), request),
+        "logo": url_absolue(logo_url, request),
+        "logo_chemin": logo_chemin,
+    }
+
+
+class PlaywrightBackend:
+    template = "receipt.html"
+
+    def html(self, commande, request=None):
+        return render_to_string(self.template, donnees_recu(commande, request), request=request)
+
+    def rendre(self, commande, request=None):
+        return pdf_service.generer_pdf(self.html(commande, request))
+
+
+class Xhtml2pdfBackend(PlaywrightBackend):
+    template = "receipt_pdf.html"
+
+    def rendre(self, commande, request=None):
+        contenu = html_to_pdf(self.html(commande, request))
+        if contenu is None:
+            raise RecuBackendError("xhtml2pdf n'a pas pu rendre le reçu")
+        return contenu
+
+
+class ReportLabBackend:
+    BLEU = colors.HexColor('#007BFF')
+
+    def _styles(self):
+        styles = getSampleStyleSheet()
+        return styles['Title'], styles['Normal']
+
+    def _qr(self, url, taille=45 * mm):
+        qr = QrCodeWidget(url)
+        x1, y1, x2, y2 = qr.getBounds()
+        dessin = Drawing(taille, taille, transform=[taille / (x2 - x1), 0, 0, taille / (y2 - y1), 0, 0])
+        dessin.add(qr)
+        return dessin
+
+    def rendre(self, commande, request=None):
+        donnees = donnees_recu(commande, request)
+        titre, normal = self._styles()
+        tampon = io.BytesIO()
+        document = SimpleDocTemplate(
+            tampon, pagesize=A4, title=f"Reçu {commande.transaction_id}",
+            leftMargin=10 * mm, rightMargin=10 * mm, topMargin=10 * mm, bottomMargin=10 * mm,
+        )
+
+        contenu = []
+        if donnees["logo_chemin"]:
+            contenu.append(Image(donnees["logo_chemin"], width=40 * mm, height=20 * mm, kind='proportional'))
+        contenu.append(Paragraph("Reçu de Commande", titre))
+        for libelle, valeur in (
+            ("ID Opération", commande.id_paiment or ''),
+            ("ID Transaction", commande.transaction_id or ''),
+            ("Date de Paiement", date_format(commande.date_add, "d/m/Y H:i")),
+            ("Total Payé", f"{commande.prix_total:.0f} F CFA"),
+        ):
+            contenu.append(Paragraph(f"<b>{libelle} :</b> {escape(str(valeur))}", normal))
+        contenu.append(Spacer(1, 8 * mm))
+
+        lignes = [["Produit", "Quantité", "Prix Unitaire", "Total"]] + [
+            [
+                Paragraph(escape(ligne.produit.nom), normal),
+                str(ligne.quantite),
+                f"{ligne.prix_unitaire or 0:.0f} F CFA" + (" (promo)" if ligne.en_promotion else ""),
+                f"{ligne.total:.0f} F CFA",
+            ]
+            for ligne in donnees["produits_commande"]
+        ]
+        utile = A4[0] - 20 * mm
+        tableau = Table(lignes, colWidths=[utile * 0.4, utile * 0.2, utile * 0.2, utile * 0.2], repeatRows=1)
+        tableau.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), self.BLEU),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LINEBELOW', (0, 1), (-1, -1), 0.25, colors.lightgrey),
+        ]))
+        contenu += [
+            tableau,
+            Spacer(1, 10 * mm),
+            Paragraph("Scannez pour vérifier :", normal),
+            self._qr(donnees["detail_url"]),
+        ]
+        document.build(contenu)
+        return tampon.getvalue()
+
+
+BACKENDS = {
+    'playwright': PlaywrightBackend,
+    'xhtml2pdf': Xhtml2pdfBackend,
+    'reportlab': ReportLabBackend,
+}
+
+
+def get_backend(nom=None):
+    nom = nom or getattr(settings, 'RECU_PDF_BACKEND', 'playwright')
+    classe = BACKENDS.get(nom) or import_string(nom)
+    return classe()
@@ -0,0 +1,262 @@
+"""Service de rendu PDF : un Chromium chaud dans un processus à part.
+
+Lancer Chromium coûte plusieurs centaines de millisecondes et plus de 100 Mo ;
+les workers web ne le font donc plus. Le processus ``serveur_pdf`` (commande
+du même nom) garde un navigateur ouvert et un pool de pages prêtes, et les
+vues lui envoient leur HTML par une socket locale.
+
+Sur Heroku chaque type de processus a ses propres dynos : le service est donc
+lancé à côté de gunicorn par la commande ``web`` du Procfile, dans chaque dyno
+web, sur ``PDF_SERVICE_ADRESSE`` (``127.0.0.1:8790``). Les autres dynos n'ont
+pas de service et rendent les reçus avec un Chromium local, comme les
+workers web si leur service s'est arrêté (``generer_pdf``).
+
+Protocole, une requête par connexion :
+
+* requête : longueur du HTML sur 4 octets (big-endian) puis le HTML en UTF-8 ;
+* réponse : un octet de statut (``0`` succès, ``1`` erreur), la longueur du
+  contenu sur 4 octets puis le contenu (le PDF, ou le message d'erreur).
+
+Le pool borne le nombre de rendus simultanés à son nombre de pages ; une page
+est remplacée (nouveau contexte) après ``recyclage`` rendus ou une erreur.
+"""
+import asyncio
+import logging
+import socket
+import struct
+
+from django.conf import settings
+from playwright.sync_api import sync_playwright
+
+logger = logging.getLogger(__name__)
+
+ENTETE = struct.Struct('>I')
+STATUT_OK = b'0'
+STATUT_ERREUR = b'1'
+TAILLE_MAX_HTML = 16 * 1024 * 1024
+TAILLE_BLOC = 64 * 1024
+
+OPTIONS_PDF = {
+    'format': 'A4',
+    'print_background': True,
+    'margin': {'top': '10mm', 'right': '10mm', 'bottom': '10mm', 'left': '10mm'},
+}
+
+
+class PDFServiceError(Exception):
+    pass
+
+
+def _config():
+    return getattr(settings, 'PDF_SERVICE', {})
+
+
+def parse_adresse(adresse):
+    """``'127.0.0.1:8790'`` -> ``('127.0.0.1', 8790)``."""
+    hote, _, port = adresse.rpartition(':')
+    return hote or '127.0.0.1', int(port)
+
+
+def est_configure():
+    return bool(_config().get('ADRESSE'))
+
+
+# --- Client (workers web) -----------------------------------------------------
+
+def _lire_exactement(sock, taille):
+    morceaux = []
+    while taille:
+        morceau = sock.recv(min(taille, TAILLE_BLOC))
+        if not morceau:
+            raise PDFServiceError("Connexion fermée par le service PDF")
+        morceaux.append(morceau)
+        taille -= len(morceau)
+    return b''.join(morceaux)
+
+
+def flux_pdf(html, adresse=None, timeout=None):
+    """Envoie ``html`` au service, retourne ``(taille, blocs)`` du PDF.
+
+    Le statut et la taille sont lus avant de rendre la main : une erreur de
+    rendu lève ``PDFServiceError`` ici, jamais au milieu du flux.
+    """
+    config = _config()
+    adresse = parse_adresse(adresse or config['ADRESSE'])
+    corps = html.encode('utf-8')
+    try:
+        sock = socket.create_connection(adresse, timeout=timeout or config.get('TIMEOUT', 30))
+    except OSError as exc:
+        raise PDFServiceError(f"Service PDF injoignable : {exc}") from exc
+    try:
+        sock.sendall(ENTETE.pack(len(corps)) + corps)
+        statut = _lire_exactement(sock, 1)
+        (taille,) = ENTETE.unpack(_lire_exactement(sock, ENTETE.size))
+        if statut != STATUT_OK:
+            raise PDFServiceError(_lire_exactement(sock, taille).decode('utf-8', 'replace'))
+    except OSError as exc:
+        sock.close()
+        raise PDFServiceError(f"Service PDF : {exc}") from exc
+    except PDFServiceError:
+        sock.close()
+        raise
+
+    def blocs():
+        try:
+            reste = taille
+            while reste:
+                morceau = sock.recv(min(reste, TAILLE_BLOC))
+                if not morceau:
+                    raise PDFServiceError("PDF tronqué")
+                reste -= len(morceau)
+                yield morceau
+        finally:
+            sock.close()
+
+    return taille, blocs()
+
+
+def rendre_pdf(html, adresse=None, timeout=None):
+    _, blocs = flux_pdf(html, adresse, timeout)
+    return b''.join(blocs)
+
+
+def rendre_pdf_local(html):
+    """Rendu sans le service PDF : lance un Chromium pour ce seul document."""
+    with sync_playwright() as p:
+        browser = p.chromium.launch()
+        page = browser.new_page()
+        page.set_content(html, wait_until="load")  # on imprime directement le HTML rendu
+        pdf_bytes = page.pdf(**OPTIONS_PDF)
+        browser.close()
+    return pdf_bytes
+
+
+def generer_pdf(html):
+    """PDF de ``html`` par le service s'il est configuré, sinon par un Chromium local.
+
+    Le service tourne à côté de gunicorn sans superviseur : s'il ne répond
+    plus, le reçu est rendu localement plutôt que refusé jusqu'au
+    redémarrage du dyno.
+    """
+    if not est_configure():
+        return rendre_pdf_local(html)
+    try:
+        return rendre_pdf(html)
+    except PDFServiceError as exc:
+        logger.warning("Service PDF indisponible, rendu local : %s", exc)
+        try:
+            return rendre_pdf_local(html)
+        except Exception as local:
+            raise PDFServiceError(f"{exc} ; rendu local impossible : {local}") from local
+
+
+# --- Serveur (processus serveur_pdf) ------------------------------------------
+
+class PoolNavigateur:
+    """Un Chromium et ``taille`` pages chaudes, chacune dans son propre contexte."""
+
+    def __init__(self, taille=4, recyclage=100):
+        self.taille = taille
+        self.recyclage = recyclage
+        self._playwright = None
+        self._navigateur = None
+        self._libres = None
+
+    async def demarrer(self):
+        from playwright.async_api import async_playwright
+
+        self._playwright = await async_playwright().start()
+        self._navigateur = await self._playwright.chromium.launch()
+        self._libres = asyncio.Queue()
+        for _ in range(self.taille):
+            await self._libres.put(await self._nouvelle_page())
+
+    async def _nouvelle_page(self):
+        if not self._navigateur.is_connected():
+            logger.warning("Chromium arrêté, relance")
+            self._navigateur = await self._playwright.chromium.launch()
+        contexte = await self._navigateur.new_context()
+        return [await contexte.new_page(), 0]
+
+    async def _recycler(self, entree):
+        try:
+            await entree[0].context.close()
+        except Exception:
+            pass
+        return await self._nouvelle_page()
+
+    async def rendre(self, html):
+        # La file vide fait attendre : jamais plus de ``taille`` rendus à la fois
+        entree = await self._libres.get()
+        try:
+            page = entree[0]
+            await page.set_content(html, wait_until='load')
+            pdf = await page.pdf(**OPTIONS_PDF)
+            entree[1] += 1
+            if entree[1] >= self.recyclage:
+                entree = await self._recycler(entree)
+            return pdf
+        except Exception:
+            entree = await self._recycler(entree)
+            raise
+        finally:
+            await self._libres.put(entree)
+
+    async def arreter(self):
+        if self._navigateur is not None:
+            await self._navigateur.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+
+class ServeurPDF:
+    def __init__(self, pool, adresse='127.0.0.1:8790'):
+        self.pool = pool
+        self.hote, self.port = parse_adresse(adresse)
+        self._serveur = None
+
+    @property
+    def adresse(self):
+        hote, port = self._serveur.sockets[0].getsockname()[:2]
+        return f'{hote}:{port}'
+
+    async def _repondre(self, writer, statut, contenu):
+        writer.write(statut + ENTETE.pack(len(contenu)))
+        for debut in range(0, len(contenu), TAILLE_BLOC):
+            writer.write(contenu[debut:debut + TAILLE_BLOC])
+            await writer.drain()
+        await writer.drain()
+
+    async def _traiter(self, reader, writer):
+        try:
+            (taille,) = ENTETE.unpack(await reader.readexactly(ENTETE.size))
+            if taille > TAILLE_MAX_HTML:
+                await self._repondre(writer, STATUT_ERREUR, b'HTML trop volumineux')
+                return
+            html = (await reader.readexactly(taille)).decode('utf-8')
+            try:
+                pdf = await self.pool.rendre(html)
+            except Exception as exc:
+                logger.exception("Échec du rendu PDF")
+                await self._repondre(writer, STATUT_ERREUR, str(exc).encode('utf-8'))
+            else:
+                await self._repondre(writer, STATUT_OK, pdf)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def demarrer(self):
+        await self.pool.demarrer()
+        self._serveur = await asyncio.start_server(self._traiter, self.hote, self.port)
+        return self
+
+    async def servir(self):
+        async with self._serveur:
+            await self._serveur.serve_forever()
+
+    async def arreter(self):
+        if self._serveur is not None:
+            self._serveur.close()
+            await self._serveur.wait_closed()
+        await self.pool.arreter()
@@ -0,0 +1,92 @@
+"""QR codes des reçus, en SVG ou en PNG, mémorisés par empreinte du contenu.
+
+L'adresse encodée pour une commande ne change jamais : l'image est calculée
+une seule fois puis relue depuis le cache ``QRCODE_CACHE``, sous la clé
+``qrcode:<format>:<sha256 du contenu>``.
+
+* ``svg`` : un chemin par suite de modules noirs d'une même ligne, sans
+  dimensions fixes. Vectoriel, net à toutes les tailles (Chromium).
+* ``png`` : image 1 bit, 6 px par module. Pour xhtml2pdf, qui ne lit pas le
+  SVG en ``data:``.
+"""
+import base64
+import hashlib
+from io import BytesIO
+
+import qrcode
+from django.conf import settings
+from django.core.cache import caches
+
+FORMATS = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+}
+BORDURE = 2
+PIXELS_PAR_MODULE = 6
+DUREE_CACHE = 30 * 24 * 3600
+
+
+def _cache():
+    return caches[getattr(settings, 'QRCODE_CACHE', 'default')]
+
+
+def _matrice(data):
+    qr = qrcode.QRCode(border=BORDURE, box_size=PIXELS_PAR_MODULE)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def _svg(qr):
+    matrice = qr.get_matrix()
+    cote = len(matrice)
+    chemin = []
+    for y, ligne in enumerate(matrice):
+        x = 0
+        while x < cote:
+            if not ligne[x]:
+                x += 1
+                continue
+            debut = x
+            while x < cote and ligne[x]:
+                x += 1
+            chemin.append(f'M{debut} {y}h{x - debut}v1h-{x - debut}z')
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {cote} {cote}" shape-rendering="crispEdges">'
+        f'<path fill="#fff" d="M0 0h{cote}v{cote}H0z"/><path d="{"".join(chemin)}"/></svg>'
+    ).encode()
+
+
+def _png(qr):
+    tampon = BytesIO()
+    qr.make_image().get_image().save(tampon, format='PNG', optimize=True)
+    return tampon.getvalue()
+
+
+def encoder(data, format='svg'):
+    """Calcule l'image sans passer par le cache."""
+    if format not in FORMATS:
+        raise ValueError(f"Format de QR code inconnu : {format}")
+    qr = _matrice(data)
+    return _svg(qr) if format == 'svg' else _png(qr)
+
+
+def cle(data, format='svg'):
+    return f'qrcode:{format}:{hashlib.sha256(data.encode()).hexdigest()}'
+
+
+def qr_code(data, format='svg'):
+    """Image du QR code de ``data`` (octets), calculée au premier appel seulement."""
+    cache = _cache()
+    cle_cache = cle(data, format)
+    contenu = cache.get(cle_cache)
+    if contenu is None:
+        contenu = encoder(data, format)
+        cache.set(cle_cache, contenu, DUREE_CACHE)
+    return contenu
+
+
+def data_uri(data, format='svg'):
+    """``data:`` prête pour l'attribut ``src`` d'une balise ``<img>``."""
+    contenu = qr_code(data, format)
+    return f"data:{FORMATS[format]};base64,{base64.b64encode(contenu).decode()}"
@@ -0,0 +1,126 @@
+"""Reçus de paiement PDF, générés une seule fois puis servis depuis le stockage.
+
+Le reçu d'une commande est rendu par le moteur choisi (``RECU_PDF_BACKEND``,
+voir ``client.pdf_backends``) à sa confirmation (réconciliation du
+paiement), par la commande ``generer_recus`` pour l'historique, ou au premier
+téléchargement à défaut. Le fichier est rangé sous l'empreinte SHA-256 de son
+contenu (``fichiers/paiements/ab/abcdef….pdf``) : l'empreinte sert d'ETag et
+un fichier déjà présent n'est jamais réécrit.
+"""
+import hashlib
+import logging
+import posixpath
+
+from asgiref.sync import sync_to_async
+from django.core.files.base import ContentFile
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from customer.models import Commande
+from . import pdf_service
+from .pdf_backends import RecuBackendError, get_backend
+
+logger = logging.getLogger(__name__)
+
+DOSSIER = 'fichiers/paiements'
+
+
+class RecuError(Exception):
+    pass
+
+
+def _stockage():
+    return Commande._meta.get_field('recu_paiement').storage
+
+
+def chemin_recu(contenu):
+    empreinte = hashlib.sha256(contenu).hexdigest()
+    return posixpath.join(DOSSIER, empreinte[:2], f'{empreinte}.pdf')
+
+
+def enregistrer_recu(commande, contenu):
+    """Range ``contenu`` sous son empreinte et le rattache à la commande."""
+    chemin = chemin_recu(contenu)
+    stockage = _stockage()
+    if not stockage.exists(chemin):
+        chemin = stockage.save(chemin, ContentFile(contenu))
+    # update() : ne touche ni date_update ni les autres colonnes de la commande
+    Commande.objects.filter(pk=commande.pk).update(recu_paiement=chemin)
+    commande.recu_paiement.name = chemin
+    return chemin
+
+
+def generer_recu(commande, request=None, force=False):
+    """Rend et enregistre le reçu s'il n'existe pas encore, retourne son chemin."""
+    if commande.recu_paiement and not force:
+        return commande.recu_paiement.name
+    try:
+        contenu = get_backend().rendre(commande, request)
+    except (pdf_service.PDFServiceError, RecuBackendError) as exc:
+        raise RecuError(str(exc)) from exc
+    return enregistrer_recu(commande, contenu)
+
+
+def generer_apres_confirmation(commande_id):
+    """Pour ``transaction.on_commit`` : un échec est journalisé, le reçu sera rendu au premier téléchargement."""
+    try:
+        commande = Commande.objects.get(pk=commande_id)
+        generer_recu(commande)
+    except Exception:
+        logger.exception("Reçu de la commande %s non généré", commande_id)
+
+
+def etag(commande):
+    empreinte = posixpath.splitext(posixpath.basename(commande.recu_paiement.name))[0]
+    return f'"{empreinte}"'
+
+
+_FIN = object()
+
+
+async def flux_asynchrone(iterateur):
+    """Itérateur asynchrone sur ``iterateur``, pour les réponses diffusées sous ASGI.
+
+    Sous ASGI, Django 4.2 lit un itérateur synchrone avec
+    ``sync_to_async(list)`` : toute la réponse serait construite en mémoire
+    avant le premier octet. Ici chaque bloc est produit dans un thread, à la
+    demande.
+    """
+    iterateur = iter(iterateur)
+    suivant = sync_to_async(next)
+    try:
+        while True:
+            bloc = await suivant(iterateur, _FIN)
+            if bloc is _FIN:
+                return
+            yield bloc
+    finally:
+        fermer = getattr(iterateur, 'close', None)
+        if fermer is not None:
+            await sync_to_async(fermer)()
+
+
+def _blocs(fichier):
+    with fichier.open('rb') as ouvert:
+        yield from ouvert.chunks()
+
+
+def servir_recu(request, commande):
+    """Réponse de téléchargement du reçu stocké, ``304`` si le client l'a déjà."""
+    valeur = etag(commande)
+    if valeur in [v.strip() for v in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        fichier = commande.recu_paiement
+        nom = f"Recu_{commande.transaction_id}.pdf"
+        if isinstance(request, ASGIRequest):
+            response = StreamingHttpResponse(flux_asynchrone(_blocs(fichier)), content_type="application/pdf")
+            response["Content-Disposition"] = content_disposition_header(True, nom)
+        else:
+            response = FileResponse(fichier.open('rb'), content_type="application/pdf", as_attachment=True, filename=nom)
+        response["Content-Length"] = str(fichier.size)
+    response["ETag"] = valeur
+    # Le contenu derrière une empreinte ne change jamais
+    response["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
@@ -0,0 +1,11 @@
+from django import template
+
+from client.qrcodes import data_uri
+
+register = template.Library()
+
+
+@register.simple_tag
+def qr_code_uri(data, format='svg'):
+    """``<img src="{% qr_code_uri url 'png' %}">`` : QR code mémorisé, en ``data:``."""
+    return data_uri(data, format)
@@ -1,4 +1,5 @@
 import django.template.context
+import pytest
 # import copy
 
 
@@ -23,3 +24,30 @@ def fixed_copy(self):
 
 # Apply the patch
 django.template.context.BaseContext.__copy__ = fixed_copy
+
+
+# Établissements et produits des tests : catégories « Resto » / « Plats » partagées
+
+@pytest.fixture
+def creer_etablissement(db):
+    from django.contrib.auth.models import User
+    from shop.models import CategorieEtablissement, Etablissement
+
+    def creer(nom="Resto1"):
+        categorie, _ = CategorieEtablissement.objects.get_or_create(nom="Resto")
+        return Etablissement.objects.create(
+            user=User.objects.create_user(f'owner_{nom}', 'pass'), nom=nom, categorie=categorie,
+            contact_1="01", email="e@e.com", logo="l.png", couverture="c.png",
+            nom_du_responsable="Responsable", prenoms_duresponsable="Prenom",
+        )
+    return creer
+
+
+@pytest.fixture
+def creer_produit(db):
+    from shop.models import CategorieProduit, Produit
+
+    def creer(etablissement, nom, prix=1000):
+        categorie, _ = CategorieProduit.objects.get_or_create(nom="Plats", categorie=etablissement.categorie)
+        return Produit.objects.create(nom=nom, prix=prix, categorie=categorie, etablissement=etablissement)
+    return creer
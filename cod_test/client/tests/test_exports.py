@@ -0,0 +1,171 @@
+import datetime
+import hashlib
+import io
+import zipfile
+from unittest.mock import patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import AsyncClient
+from django.urls import reverse
+from django.utils import timezone
+
+from client import exports, recus
+from customer.models import Commande, Customer, ProduitPanier
+from website.models import SiteInfo
+
+# Les reçus sont lus par des threads, chacun avec sa connexion : données commitées
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(autouse=True)
+def stockage(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+def _rendu(html):
+    return b'%PDF-' + hashlib.md5(html.encode()).hexdigest().encode()
+
+
+def _archive(response):
+    assert response['Content-Type'] == 'application/zip'
+    return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+
+@pytest.fixture
+def customer():
+    SiteInfo.objects.create(email="site@test.com", logo="logo.png")
+    user = User.objects.create_user(username='client_export', password='password')
+    return Customer.objects.create(user=user, adresse="Abidjan", contact_1="01", photo="p.jpg")
+
+
+def _commande(customer, transaction_id, jour=None, **kwargs):
+    commande = Commande.objects.create(customer=customer, transaction_id=transaction_id, prix_total=1000, **kwargs)
+    if jour:
+        Commande.objects.filter(pk=commande.pk).update(
+            date_add=timezone.make_aware(datetime.datetime.combine(jour, datetime.time(23, 30)))
+        )
+    return commande
+
+
+def test_export_client_reutilise_et_genere(client, customer, stockage):
+    existante = _commande(customer, "TEXP1")
+    with patch('client.pdf_service.generer_pdf', return_value=b'%PDF-existant'):
+        recus.generer_recu(existante)
+    _commande(customer, "TEXP2")
+    _commande(customer, "TEXP3")
+    _commande(customer, "TNONPAYEE", status=False)
+    autre = Customer.objects.create(
+        user=User.objects.create_user(username='autre_export', password='password'),
+        adresse="Abidjan", contact_1="02", photo="p.jpg",
+    )
+    _commande(autre, "TAUTRE")
+
+    client.force_login(customer.user)
+    with patch('client.pdf_service.generer_pdf', side_effect=_rendu) as rendu:
+        response = client.get(reverse('export_recus'), {'export': 'abc'})
+        archive = _archive(response)
+    assert rendu.call_count == 2
+
+    assert sorted(archive.namelist()) == ['Recu_TEXP1.pdf', 'Recu_TEXP2.pdf', 'Recu_TEXP3.pdf']
+    assert archive.read('Recu_TEXP1.pdf') == b'%PDF-existant'
+    assert all(info.compress_type == zipfile.ZIP_STORED for info in archive.infolist())
+    # Les reçus rendus pour l'export sont enregistrés pour les prochains téléchargements
+    assert Commande.objects.filter(transaction_id__startswith='TEXP', recu_paiement__startswith='fichiers/').count() == 3
+
+    etat = client.get(reverse('export_recus_progression', args=['abc'])).json()
+    assert etat == {'success': True, 'total': 3, 'faits': 3, 'echecs': 0, 'termine': True}
+
+
+def test_periode_inclusive_et_selection(client, customer):
+    _commande(customer, "TAVANT", jour=datetime.date(2025, 1, 31))
+    _commande(customer, "TDEBUT", jour=datetime.date(2025, 2, 1))
+    fin = _commande(customer, "TFIN", jour=datetime.date(2025, 2, 28))
+    _commande(customer, "TAPRES", jour=datetime.date(2025, 3, 1))
+
+    client.force_login(customer.user)
+    with patch('client.pdf_service.generer_pdf', side_effect=_rendu):
+        periode = _archive(client.get(reverse('export_recus'), {'date_min': '2025-02-01', 'date_max': '2025-02-28'}))
+        cochee = _archive(client.get(reverse('export_recus'), {'commande': [fin.pk]}))
+    assert periode.namelist() == ['Recu_TFIN.pdf', 'Recu_TDEBUT.pdf']
+    assert cochee.namelist() == ['Recu_TFIN.pdf']
+
+
+def _erreur(client, url, params=None):
+    response = client.get(url, params or {}, follow=True)
+    assert response.redirect_chain[0][1] == 302
+    return [str(message) for message in response.context['messages']]
+
+
+def test_selection_vide_ou_invalide(client, customer):
+    client.force_login(customer.user)
+    response = client.get(reverse('export_recus'), follow=True)
+    assert response.redirect_chain == [(reverse('commande'), 302)]
+    assert "Aucun reçu à exporter" in response.content.decode()
+    assert _erreur(client, reverse('export_recus'), {'date_min': '31/01/2025'}) == [
+        "Date invalide pour date_min : 31/01/2025"
+    ]
+
+
+def test_export_limite(client, customer, settings):
+    settings.EXPORT_RECUS_MAX = 1
+    _commande(customer, "TLIM1")
+    _commande(customer, "TLIM2")
+    client.force_login(customer.user)
+    assert _erreur(client, reverse('export_recus')) == ["Export limité à 1 reçus, réduisez la période"]
+
+
+def test_export_diffuse_sous_asgi(customer):
+    _commande(customer, "TASGI1")
+    _commande(customer, "TASGI2")
+    client = AsyncClient()
+    client.force_login(customer.user)
+
+    async def scenario():
+        response = await client.get(reverse('export_recus'))
+        # Itérateur asynchrone : Django ne charge pas toute l'archive avec sync_to_async(list)
+        assert response.is_async
+        return response, b''.join([bloc async for bloc in response.streaming_content])
+
+    with patch('client.pdf_service.generer_pdf', side_effect=_rendu):
+        response, contenu = async_to_sync(scenario)()
+    assert response['Content-Type'] == 'application/zip'
+    assert sorted(zipfile.ZipFile(io.BytesIO(contenu)).namelist()) == ['Recu_TASGI1.pdf', 'Recu_TASGI2.pdf']
+
+
+def test_export_commercant(client, customer, creer_etablissement, creer_produit):
+    etabs = [creer_etablissement(nom) for nom in ("Resto1", "Resto2")]
+    for i, etab in enumerate(etabs):
+        produit = creer_produit(etab, f"Plat {i}")
+        commande = _commande(customer, f"TETAB{i}")
+        # Deux lignes du même établissement : la commande n'apparaît qu'une fois
+        for _ in range(2):
+            ProduitPanier.objects.create(commande=commande, produit=produit, prix_unitaire=1000, total_ligne=1000)
+
+    client.force_login(etabs[0].user)
+    with patch('client.pdf_service.generer_pdf', side_effect=_rendu):
+        archive = _archive(client.get(reverse('commande-reçu-export')))
+    assert archive.namelist() == ['Recu_TETAB0.pdf']
+    response = client.get(reverse('commande-reçu-export'), {'date_min': 'hier'})
+    assert response['Location'] == reverse('commande-reçu')
+
+
+def test_echec_de_rendu_signale_dans_l_archive(customer):
+    ok = _commande(customer, "TOK")
+    ko = _commande(customer, "TKO")
+
+    def rendu(html):
+        if 'TKO' in html:
+            raise recus.pdf_service.PDFServiceError("service indisponible")
+        return _rendu(html)
+
+    with patch('client.pdf_service.generer_pdf', side_effect=rendu):
+        morceaux = list(exports.flux_zip([ok.pk, ko.pk], workers=2, suivi='export-test'))
+    # Un morceau par reçu puis la fin de l'archive
+    assert len(morceaux) == 3
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(morceaux)))
+    assert archive.namelist() == ['Recu_TOK.pdf', 'ERREURS.txt']
+    assert f"Commande {ko.pk} : service indisponible" in archive.read('ERREURS.txt').decode()
+    assert exports.cache.get('export-test')['echecs'] == 1
@@ -143,7 +143,7 @@ def test_invoice_pdf_view(client):
     url = reverse('invoice_pdf', args=[cmd.id])
     
     # Mock playwright
-    with patch('client.views.sync_playwright') as mock_playwright:
+    with patch('client.pdf_service.sync_playwright') as mock_playwright:
         mock_browser = mock_playwright.return_value.__enter__.return_value.chromium.launch.return_value
         mock_page = mock_browser.new_page.return_value
         mock_page.pdf.return_value = b'%PDF-1.4...'
@@ -151,3 +151,62 @@ def test_invoice_pdf_view(client):
         response = client.get(url)
         assert response.status_code == 200
         assert response['Content-Type'] == 'application/pdf'
+
+
+@pytest.mark.django_db
+def test_commande_view_requetes_constantes(client, django_assert_num_queries, creer_etablissement, creer_produit):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    user = User.objects.create_user(username='testuser_hist', password='password')
+    customer = Customer.objects.create(user=user, adresse="Abidjan", contact_1="01", photo="p.jpg")
+    etab = creer_etablissement()
+    produits = [creer_produit(etab, f"Plat {i}") for i in range(3)]
+
+    def ajouter_commandes(nombre):
+        for _ in range(nombre):
+            commande = Commande.objects.create(
+                customer=customer, transaction_id=f"THIST{Commande.objects.count()}", prix_total=3000
+            )
+            for produit in produits:
+                ProduitPanier.objects.create(commande=commande, produit=produit, total_ligne=1000)
+
+    client.force_login(user)
+    url = reverse('commande')
+
+    ajouter_commandes(1)
+    # Premier affichage hors mesure : caches des processeurs de contexte
+    client.get(url)
+    with CaptureQueriesContext(connection) as une_commande:
+        assert client.get(url).status_code == 200
+    ajouter_commandes(9)
+    with django_assert_num_queries(len(une_commande)):
+        response = client.get(url)
+    assert len(response.context['commandes_data']) == 10
+    assert response.content.decode().count('Plat 2') == 10
+
+
+@pytest.mark.django_db
+def test_commande_view_recherche_par_date(client):
+    import datetime
+    from django.utils import timezone
+
+    user = User.objects.create_user(username='testuser_date', password='password')
+    customer = Customer.objects.create(user=user, adresse="Abidjan", contact_1="01", photo="p.jpg")
+    for transaction_id, jour in (("TJANV", datetime.date(2025, 1, 31)), ("TFEV", datetime.date(2025, 2, 1))):
+        commande = Commande.objects.create(customer=customer, transaction_id=transaction_id, prix_total=1000)
+        Commande.objects.filter(pk=commande.pk).update(
+            date_add=timezone.make_aware(datetime.datetime.combine(jour, datetime.time(23, 59)))
+        )
+
+    client.force_login(user)
+    url = reverse('commande')
+
+    def trouvees(q):
+        return [d['commande'].transaction_id for d in client.get(url, {'q': q}).context['commandes_data']]
+
+    assert trouvees('31/01/2025') == ['TJANV']
+    assert trouvees('2025-02-01') == ['TFEV']
+    assert trouvees('02/2025') == ['TFEV']
+    assert trouvees('2025') == ['TFEV', 'TJANV']
+    assert trouvees('TFE') == ['TFEV']
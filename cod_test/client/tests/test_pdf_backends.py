@@ -0,0 +1,70 @@
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth.models import User
+
+from client import pdf_backends, recus
+from customer.models import Commande, Customer, ProduitPanier
+from website.models import SiteInfo
+
+
+@pytest.fixture
+def commande(db, settings, tmp_path, creer_etablissement, creer_produit):
+    settings.MEDIA_ROOT = tmp_path
+    user = User.objects.create_user(username='client_backend', password='password')
+    customer = Customer.objects.create(user=user, adresse="Abidjan", contact_1="01", photo="p.jpg")
+    SiteInfo.objects.create(email="site@test.com", logo="logo.png")
+    etab = creer_etablissement()
+    commande = Commande.objects.create(customer=customer, transaction_id="TBACK", prix_total=4500)
+    for i, prix in enumerate((1000, 2500)):
+        produit = creer_produit(etab, f"Plat <{i}> & co", prix)
+        ProduitPanier.objects.create(
+            commande=commande, produit=produit, quantite=i + 1,
+            prix_unitaire=prix, total_ligne=prix * (i + 1), en_promotion=bool(i),
+        )
+    return commande
+
+
+@pytest.mark.parametrize('nom', ['xhtml2pdf', 'reportlab'])
+def test_moteurs_sans_navigateur(commande, nom, django_assert_max_num_queries):
+    with django_assert_max_num_queries(2):
+        contenu = pdf_backends.get_backend(nom).rendre(commande)
+    assert contenu.startswith(b'%PDF-')
+    assert len(contenu) > 1000
+
+
+def test_gabarit_xhtml2pdf(commande):
+    html = pdf_backends.Xhtml2pdfBackend().html(commande)
+    assert 'TBACK' in html
+    assert 'Plat &lt;1&gt; &amp; co' in html
+    assert '5000 F CFA' in html
+    assert 'data:image/png;base64,' in html
+
+
+def test_playwright_passe_par_le_service_pdf(commande):
+    with patch('client.pdf_service.generer_pdf', return_value=b'%PDF-chromium') as generer:
+        assert pdf_backends.get_backend('playwright').rendre(commande) == b'%PDF-chromium'
+    assert 'Reçu de Commande' in generer.call_args[0][0]
+
+
+def test_moteur_par_chemin_pointe():
+    assert isinstance(pdf_backends.get_backend('client.pdf_backends.ReportLabBackend'), pdf_backends.ReportLabBackend)
+
+
+def test_reglage_choisit_le_moteur_du_recu(commande, settings):
+    settings.RECU_PDF_BACKEND = 'reportlab'
+    with patch('client.pdf_service.generer_pdf') as generer:
+        chemin = recus.generer_recu(commande)
+    generer.assert_not_called()
+    commande.refresh_from_db()
+    assert commande.recu_paiement.name == chemin
+    assert commande.recu_paiement.read().startswith(b'%PDF-')
+
+
+def test_echec_xhtml2pdf_remonte(commande, settings):
+    settings.RECU_PDF_BACKEND = 'xhtml2pdf'
+    with patch('client.pdf_backends.html_to_pdf', return_value=None):
+        with pytest.raises(recus.RecuError):
+            recus.generer_recu(commande)
+    commande.refresh_from_db()
+    assert not commande.recu_paiement
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+from unittest.mock import patch
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from client import pdf_service
+from customer.models import Customer
+
+
+class PageFactice:
+    def __init__(self, pool):
+        self.pool = pool
+        self.context = self
+        self.html = None
+
+    async def set_content(self, html, wait_until=None):
+        if html == 'erreur':
+            raise RuntimeError("page plantée")
+        self.html = html
+
+    async def pdf(self, **options):
+        self.pool.en_cours += 1
+        self.pool.max_en_cours = max(self.pool.max_en_cours, self.pool.en_cours)
+        await asyncio.sleep(0.02)
+        self.pool.en_cours -= 1
+        return b'%PDF-' + self.html.encode()
+
+    async def close(self):
+        self.pool.fermees += 1
+
+
+class PoolFactice(pdf_service.PoolNavigateur):
+    """Pool réel, pages factices : pas besoin de Chromium."""
+
+    def __init__(self, taille=2, recyclage=3):
+        super().__init__(taille, recyclage)
+        self.en_cours = self.max_en_cours = self.creees = self.fermees = 0
+
+    async def demarrer(self):
+        self._libres = asyncio.Queue()
+        for _ in range(self.taille):
+            await self._libres.put(await self._nouvelle_page())
+
+    async def _nouvelle_page(self):
+        self.creees += 1
+        return [PageFactice(self), 0]
+
+    async def arreter(self):
+        pass
+
+
+@pytest.fixture
+def service():
+    pool = PoolFactice()
+    boucle = asyncio.new_event_loop()
+    serveur = pdf_service.ServeurPDF(pool, '127.0.0.1:0')
+    boucle.run_until_complete(serveur.demarrer())
+    thread = threading.Thread(target=boucle.run_forever, daemon=True)
+    thread.start()
+    yield serveur
+    asyncio.run_coroutine_threadsafe(serveur.arreter(), boucle).result()
+    boucle.call_soon_threadsafe(boucle.stop)
+    thread.join()
+
+
+def test_rendu_par_le_service(service):
+    html = '<p>Reçu</p>' * 20000
+    assert pdf_service.rendre_pdf(html, adresse=service.adresse) == b'%PDF-' + html.encode()
+
+
+def test_concurrence_bornee_et_pages_recyclees(service):
+    threads = [
+        threading.Thread(target=pdf_service.rendre_pdf, args=(f'<p>{i}</p>',), kwargs={'adresse': service.adresse})
+        for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert service.pool.max_en_cours == 2
+    # 8 rendus sur 2 pages recyclées tous les 3 rendus : 2 pages initiales + 2 recréées
+    assert service.pool.creees == 4
+
+
+def test_erreur_de_rendu_remontee(service):
+    with pytest.raises(pdf_service.PDFServiceError, match="page plantée"):
+        pdf_service.rendre_pdf('erreur', adresse=service.adresse)
+    # La page fautive est remplacée, le service reste utilisable
+    assert pdf_service.rendre_pdf('<p>ok</p>', adresse=service.adresse) == b'%PDF-<p>ok</p>'
+
+
+def test_service_injoignable():
+    with pytest.raises(pdf_service.PDFServiceError):
+        pdf_service.rendre_pdf('<p></p>', adresse='127.0.0.1:1', timeout=1)
+
+
+@pytest.fixture
+def commande(client):
+    from customer.models import Commande
+    from website.models import SiteInfo
+
+    user = User.objects.create_user(username='test_pdf_service', password='password')
+    photo = SimpleUploadedFile(name='test.jpg', content=b'GIF89a', content_type='image/jpeg')
+    customer = Customer.objects.create(user=user, adresse="Abidjan", contact_1="01", photo=photo)
+    SiteInfo.objects.create(email="site@test.com", logo="logo.png")
+    client.force_login(user)
+    return Commande.objects.create(customer=customer, transaction_id="TPDF", prix_total=1000)
+
+
+@pytest.mark.django_db
+def test_invoice_pdf_passe_par_le_service(client, commande, service, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.PDF_SERVICE = {'ADRESSE': service.adresse, 'TIMEOUT': 5}
+    response = client.get(reverse('invoice_pdf', args=[commande.id]))
+    assert response.status_code == 200
+    contenu = b''.join(response.streaming_content)
+    assert contenu.startswith(b'%PDF-')
+    assert int(response['Content-Length']) == len(contenu)
+    assert 'Recu_TPDF.pdf' in response['Content-Disposition']
+
+
+@pytest.mark.django_db
+def test_invoice_pdf_repli_local_si_service_injoignable(client, commande, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.PDF_SERVICE = {'ADRESSE': '127.0.0.1:1', 'TIMEOUT': 1}
+    with patch('client.pdf_service.rendre_pdf_local', return_value=b'%PDF-local') as local:
+        response = client.get(reverse('invoice_pdf', args=[commande.id]))
+    assert response.status_code == 200
+    assert b''.join(response.streaming_content) == b'%PDF-local'
+    local.assert_called_once()
+
+
+@pytest.mark.django_db
+def test_invoice_pdf_service_indisponible(client, commande, settings):
+    settings.PDF_SERVICE = {'ADRESSE': '127.0.0.1:1', 'TIMEOUT': 1}
+    with patch('client.pdf_service.rendre_pdf_local', side_effect=RuntimeError("Chromium absent")):
+        response = client.get(reverse('invoice_pdf', args=[commande.id]))
+    assert response.status_code == 503
@@ -0,0 +1,48 @@
+import base64
+from unittest.mock import patch
+
+import pytest
+from django.template import Context, Template
+
+from client import qrcodes, utils
+
+URL = "https://cooldeal.example.com/client/commande/42/recu/"
+
+
+def test_svg_compact():
+    svg = qrcodes.encoder(URL, 'svg').decode()
+    assert svg.startswith('<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 37 37"')
+    # Une seule forme pour les modules noirs, pas un rectangle par module
+    assert svg.count('<path') == 2
+    assert len(svg) < 5000
+
+
+def test_png_1_bit():
+    png = qrcodes.encoder(URL, 'png')
+    assert png.startswith(b'\x89PNG')
+    assert len(png) < 1000
+
+
+def test_format_inconnu():
+    with pytest.raises(ValueError):
+        qrcodes.data_uri(URL, 'gif')
+
+
+def test_image_calculee_une_seule_fois():
+    with patch('client.qrcodes.encoder', wraps=qrcodes.encoder) as encoder:
+        premiere = qrcodes.qr_code(URL, 'svg')
+        assert qrcodes.qr_code(URL, 'svg') == premiere
+        qrcodes.qr_code(URL, 'png')
+        qrcodes.qr_code(URL + '?autre', 'svg')
+    # Clé par format et par contenu
+    assert encoder.call_count == 3
+
+
+def test_qrcode_base64_passe_par_le_cache():
+    assert base64.b64decode(utils.qrcode_base64(URL)) == qrcodes.qr_code(URL, 'png')
+
+
+def test_balise_de_gabarit():
+    html = Template("{% load qrcode_tags %}<img src=\"{% qr_code_uri url 'png' %}\">").render(Context({'url': URL}))
+    assert html == f'<img src="{qrcodes.data_uri(URL, "png")}">'
+    assert html.startswith('<img src="data:image/png;base64,iVBOR')
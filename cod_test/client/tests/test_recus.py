@@ -0,0 +1,133 @@
+import hashlib
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+
+from client import recus
+from customer.models import Commande, Customer
+from website.models import SiteInfo
+
+
+@pytest.fixture(autouse=True)
+def stockage(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+def _rendu(html):
+    # Un PDF différent par commande, comme le vrai rendu
+    return b'%PDF-' + hashlib.md5(html.encode()).hexdigest().encode()
+
+
+@pytest.fixture
+def commande(db):
+    user = User.objects.create_user(username='client_recu', password='password')
+    customer = Customer.objects.create(user=user, adresse="Abidjan", contact_1="01", photo="p.jpg")
+    SiteInfo.objects.create(email="site@test.com", logo="logo.png")
+    return Commande.objects.create(customer=customer, transaction_id="TRECU", prix_total=1000)
+
+
+def test_recu_genere_une_seule_fois(client, commande, stockage):
+    client.force_login(commande.customer.user)
+    url = reverse('invoice_pdf', args=[commande.id])
+    with patch('client.pdf_service.generer_pdf', side_effect=_rendu) as rendu:
+        premiere = client.get(url)
+        seconde = client.get(url)
+    assert rendu.call_count == 1
+
+    contenu = b''.join(premiere.streaming_content)
+    assert contenu.startswith(b'%PDF-')
+    assert b''.join(seconde.streaming_content) == contenu
+    assert int(seconde['Content-Length']) == len(contenu)
+    assert 'Recu_TRECU.pdf' in seconde['Content-Disposition']
+
+    empreinte = hashlib.sha256(contenu).hexdigest()
+    assert seconde['ETag'] == f'"{empreinte}"'
+    commande.refresh_from_db()
+    assert commande.recu_paiement.name == f'fichiers/paiements/{empreinte[:2]}/{empreinte}.pdf'
+    assert (stockage / commande.recu_paiement.name).read_bytes() == contenu
+
+
+def test_recu_diffuse_sous_asgi(commande):
+    from asgiref.sync import async_to_sync
+    from django.test import AsyncClient
+
+    with patch('client.pdf_service.generer_pdf', side_effect=_rendu):
+        recus.generer_recu(commande)
+    client = AsyncClient()
+    client.force_login(commande.customer.user)
+
+    async def scenario():
+        response = await client.get(reverse('invoice_pdf', args=[commande.id]))
+        assert response.is_async
+        return response, b''.join([bloc async for bloc in response.streaming_content])
+
+    response, contenu = async_to_sync(scenario)()
+    assert contenu == commande.recu_paiement.open('rb').read()
+    assert int(response['Content-Length']) == len(contenu)
+    assert response['Content-Disposition'] == 'attachment; filename="Recu_TRECU.pdf"'
+    assert response['ETag'] == recus.etag(commande)
+
+
+def test_etag_connu_renvoie_304(client, commande):
+    client.force_login(commande.customer.user)
+    with patch('client.pdf_service.generer_pdf', side_effect=_rendu):
+        recus.generer_recu(commande)
+    response = client.get(reverse('invoice_pdf', args=[commande.id]), HTTP_IF_NONE_MATCH=recus.etag(commande))
+    assert response.status_code == 304
+    assert response['ETag'] == recus.etag(commande)
+
+
+def test_contenu_identique_non_reecrit(commande, stockage):
+    with patch('client.pdf_service.generer_pdf', return_value=b'%PDF-meme'):
+        chemin = recus.generer_recu(commande)
+        assert recus.generer_recu(commande, force=True) == chemin
+    assert len(list(stockage.rglob('*.pdf'))) == 1
+
+
+def test_service_indisponible_pas_de_recu_enregistre(client, commande, settings):
+    settings.PDF_SERVICE = {'ADRESSE': '127.0.0.1:1', 'TIMEOUT': 1}
+    client.force_login(commande.customer.user)
+    # Ni service ni Chromium local
+    with patch('client.pdf_service.rendre_pdf_local', side_effect=RuntimeError("Chromium absent")):
+        assert client.get(reverse('invoice_pdf', args=[commande.id])).status_code == 503
+    commande.refresh_from_db()
+    assert not commande.recu_paiement
+
+
+def test_recu_genere_a_la_confirmation_du_paiement(commande, django_capture_on_commit_callbacks):
+    from shop import webhook
+
+    Commande.objects.filter(pk=commande.pk).update(status=False)
+
+    class Gateway:
+        def verifier_paiement(self, transaction_id):
+            return {'status': 'ACCEPTED', 'amount': '1000'}
+
+    with patch('client.pdf_service.generer_pdf', side_effect=_rendu):
+        with django_capture_on_commit_callbacks(execute=True):
+            assert webhook._reconcilier('TRECU', Gateway()) == 'ACCEPTED'
+    commande.refresh_from_db()
+    assert commande.recu_paiement.name.startswith('fichiers/paiements/')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_commande_generer_recus_en_parallele(stockage):
+    user = User.objects.create_user(username='client_hist', password='password')
+    customer = Customer.objects.create(user=user, adresse="Abidjan", contact_1="01", photo="p.jpg")
+    SiteInfo.objects.create(email="site@test.com", logo="logo.png")
+    payees = [
+        Commande.objects.create(customer=customer, transaction_id=f"THIST{i}", prix_total=1000)
+        for i in range(6)
+    ]
+    Commande.objects.create(customer=customer, transaction_id="TNONPAYEE", prix_total=1000, status=False)
+
+    with patch('client.pdf_service.generer_pdf', side_effect=_rendu):
+        call_command('generer_recus', workers=3)
+
+    assert Commande.objects.filter(pk__in=[c.pk for c in payees], recu_paiement__startswith='fichiers/').count() == 6
+    assert not Commande.objects.get(transaction_id="TNONPAYEE").recu_paiement
+    assert len(list(stockage.rglob('*.pdf'))) == 6
@@ -9,5 +9,7 @@ urlpatterns = [
     path('liste-souhait', views.souhait, name="liste-souhait"),
     path('parametre', views.parametre, name="parametre"),
     path('receipt/<int:order_id>/', views.invoice_pdf, name="invoice_pdf"),
+    path('receipts/export/', views.export_recus, name="export_recus"),
+    path('receipts/export/<str:jeton>/', views.export_recus_progression, name="export_recus_progression"),
 
 ]
@@ -1,24 +1,44 @@
 from io import BytesIO
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
 from django.http import HttpResponse
 from django.template.loader import get_template
 
 from xhtml2pdf import pisa
-import qrcode, base64
-from io import BytesIO
 
+from .qrcodes import qr_code
+import base64
 
-def render_to_pdf(template_src, context_dict={}):
-    template = get_template(template_src)
-    html = template.render(context_dict)
+
+def link_callback(uri, rel):
+    """Résout les URL statiques et média en fichiers locaux pour xhtml2pdf."""
+    if uri.startswith(settings.MEDIA_URL):
+        chemin = os.path.join(settings.MEDIA_ROOT, uri[len(settings.MEDIA_URL):])
+    elif uri.startswith(settings.STATIC_URL):
+        chemin = finders.find(uri[len(settings.STATIC_URL):])
+    else:
+        return uri
+    return chemin if chemin and os.path.isfile(chemin) else uri
+
+
+def html_to_pdf(html):
+    """Convertit ``html`` en PDF avec xhtml2pdf, ``None`` en cas d'erreur."""
     result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("utf-8")), result)
+    pdf = pisa.pisaDocument(BytesIO(html.encode("utf-8")), result, link_callback=link_callback)
     if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type='application/pdf')
+        return result.getvalue()
+    return None
+
+
+def render_to_pdf(template_src, context_dict={}):
+    template = get_template(template_src)
+    contenu = html_to_pdf(template.render(context_dict))
+    if contenu is not None:
+        return HttpResponse(contenu, content_type='application/pdf')
     return None
 
 
 def qrcode_base64(data: str) -> str:
-    img = qrcode.make(data)
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    return base64.b64encode(buf.getvalue()).decode("utf-8")
\ No newline at end of file
+    return base64.b64encode(qr_code(data, "png")).decode("utf-8")
@@ -1,15 +1,15 @@
+import datetime
+
 from django.shortcuts import render, reverse, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from customer.models import Commande, ProduitPanier
 from shop.models import Favorite
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Prefetch, Q
 from cities_light.models import City
-from django.template.loader import render_to_string
-from django.http import HttpResponse
-from .utils import qrcode_base64
-from website.models import SiteInfo
-from playwright.sync_api import sync_playwright
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from . import exports, recus
 
 
 # Create your views here.
@@ -36,6 +36,35 @@ def profil(request):
     return render(request, 'profil.html', datas)
 
 
+# Formats de date acceptés par la recherche, du jour à l'année
+FORMATS_RECHERCHE_DATE = (
+    ('%d/%m/%Y', 'jour'), ('%Y-%m-%d', 'jour'), ('%d-%m-%Y', 'jour'),
+    ('%m/%Y', 'mois'), ('%Y-%m', 'mois'),
+    ('%Y', 'annee'),
+)
+
+
+def _periode_recherchee(query):
+    """``(début, fin)`` couvert par une date saisie dans la recherche, ``None`` sinon.
+
+    La recherche porte alors sur un intervalle de ``date_add``, servi par
+    l'index, plutôt que sur la date convertie en texte.
+    """
+    for format, unite in FORMATS_RECHERCHE_DATE:
+        try:
+            debut = datetime.datetime.strptime(query.strip(), format)
+        except ValueError:
+            continue
+        if unite == 'jour':
+            fin = debut + datetime.timedelta(days=1)
+        elif unite == 'mois':
+            fin = (debut + datetime.timedelta(days=32)).replace(day=1)
+        else:
+            fin = debut.replace(year=debut.year + 1)
+        return timezone.make_aware(debut), timezone.make_aware(fin)
+    return None
+
+
 @login_required
 def commande(request):
     user = request.user
@@ -45,31 +74,31 @@ def commande(request):
     except Exception:
         return redirect('index')
 
-    # Récupération de toutes les commandes de l'utilisateur
-    commandes = Commande.objects.filter(customer=customer).order_by('-date_add')
+    # Lignes et produits de la page chargés en une requête, quelle que soit sa taille
+    commandes = Commande.objects.filter(customer=customer).prefetch_related(
+        Prefetch('produit_commande', queryset=ProduitPanier.objects.select_related('produit').order_by('pk'))
+    ).order_by('-date_add', '-pk')
 
     # Recherche par ID transaction, produit ou date
     query = request.GET.get('q')
     if query:
-        commandes = commandes.filter(
-            Q(transaction_id__icontains=query) |
-            Q(date_add__icontains=query) |
-            Q(produit_commande__produit__nom__icontains=query)
-        ).distinct()
+        recherche = Q(transaction_id__icontains=query) | Q(Exists(
+            ProduitPanier.objects.filter(commande=OuterRef('pk'), produit__nom__icontains=query)
+        ))
+        periode = _periode_recherchee(query)
+        if periode:
+            recherche |= Q(date_add__gte=periode[0], date_add__lt=periode[1])
+        commandes = commandes.filter(recherche)
 
     # Pagination : Limite à 10 articles par page
     paginator = Paginator(commandes, 10)  # 10 commandes par page
     page = request.GET.get('page')
     commandes_paginated = paginator.get_page(page)
 
-    # Récupération des produits associés aux commandes paginées
-    commandes_data = []
-    for commande in commandes_paginated:
-        produits_commande = ProduitPanier.objects.filter(commande=commande).select_related('produit')
-        commandes_data.append({
-            'commande': commande,
-            'produits': produits_commande,
-        })
+    commandes_data = [
+        {'commande': commande, 'produits': commande.produit_commande.all()}
+        for commande in commandes_paginated
+    ]
 
     datas = {
         'user': user,
@@ -210,38 +239,27 @@ def invoice_pdf(request, order_id):
     if not hasattr(request.user, "customer") or order.customer_id != request.user.customer.id:
         return redirect("commande")
 
-    # 1. Générer le QR code en base64
-
-    detail_url = request.build_absolute_uri(
-        reverse("commande-reçu-detail", args=[order.id])  # ou une URL publique de vérif
-    )
-    qr_b64 = qrcode_base64(detail_url)
-
-    # 2. Construire le HTML à partir du template
-    html = render_to_string("receipt.html", {
-        "order_id": order,
-        "produits_commande": order.produit_commande.all(),
-        "qr_code": qr_b64,
-        "logo": request.build_absolute_uri(SiteInfo.objects.latest('date_add').logo.url)
-    }, request=request)
-
-    # 3. Lancer Playwright et générer le PDF
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page()
-        page.set_content(html, wait_until="load")  # on imprime directement le HTML rendu
-        pdf_bytes = page.pdf(
-            format="A4",
-            print_background=True,
-            margin={"top": "10mm", "right": "10mm", "bottom": "10mm", "left": "10mm"}
-        )
-        browser.close()
-
-    # 4. Forcer le téléchargement du PDF
-    filename = f"Recu_{order.transaction_id}.pdf"
-    response = HttpResponse(pdf_bytes, content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return response
+    # Rendu au premier téléchargement seulement, ensuite servi depuis le stockage
+    if not order.recu_paiement:
+        try:
+            recus.generer_recu(order, request)
+        except recus.RecuError:
+            return HttpResponse("Service PDF indisponible, merci de réessayer.", status=503)
+    return recus.servir_recu(request, order)
+
+@login_required
+def export_recus(request):
+    if not hasattr(request.user, "customer"):
+        return redirect("commande")
+    return exports.reponse_zip(request, Commande.objects.filter(customer=request.user.customer), "commande")
+
+
+@login_required
+def export_recus_progression(request, jeton):
+    etat = exports.progression(request.user, jeton)
+    if etat is None:
+        return JsonResponse({'message': "Export inconnu", 'success': False}, status=404)
+    return JsonResponse({'success': True, **etat})
 
 #
 # @login_required
@@ -0,0 +1,19 @@
+import pytest
+from django.core.cache import caches
+from django.test import override_settings
+
+
+@pytest.fixture(autouse=True)
+def _reinitialiser_ratelimit(settings):
+    # Toute la suite tourne depuis 127.0.0.1 : on repart de compteurs vides à chaque test
+    from base import ratelimit
+    caches[settings.RATELIMIT_CACHE].clear()
+    ratelimit.reinitialiser()
+    yield
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _media_temporaire(tmp_path_factory):
+    # Les fichiers envoyés par les tests (photos, images produits) restent hors de media/
+    with override_settings(MEDIA_ROOT=str(tmp_path_factory.mktemp('media'))):
+        yield
@@ -1,9 +1,10 @@
 from django.contrib import admin
 
+from base.admin_performance import AdminPerformant
 import contact.models as models
 
 
-class ContactAdmin(admin.ModelAdmin):
+class ContactAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -15,22 +16,22 @@ class ContactAdmin(admin.ModelAdmin):
         'date_update',
         'status',
     )
-    list_filter = (
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'nom',
-        'sujet',
-        'email',
-        'message',
-    )
+    list_filter = ('status', 'date_add')
+    search_fields = ('nom', 'email', 'sujet')
 
 
-class NewsLetterAdmin(admin.ModelAdmin):
+class NewsLetterAdmin(AdminPerformant):
 
     list_display = ('id', 'email', 'date_add', 'date_update', 'status')
-    list_filter = ('date_add', 'date_update', 'status', 'id', 'email')
+    list_filter = ('status', 'date_add')
+    search_fields = ('email',)
+
+
+class CampagneNewsletterAdmin(AdminPerformant):
+
+    list_display = ('id', 'sujet', 'date_add', 'lancee_le', 'terminee_le', 'envoyes', 'echecs')
+    # La progression n'est modifiée que par l'envoi (commande envoyer_campagne)
+    readonly_fields = ('lancee_le', 'terminee_le', 'dernier_abonne_id', 'envoyes', 'echecs')
 
 
 def _register(model, admin_class):
@@ -38,4 +39,5 @@ def _register(model, admin_class):
 
 
 _register(models.Contact, ContactAdmin)
-_register(models.NewsLetter, NewsLetterAdmin)
\ No newline at end of file
+_register(models.NewsLetter, NewsLetterAdmin)
+_register(models.CampagneNewsletter, CampagneNewsletterAdmin)
\ No newline at end of file
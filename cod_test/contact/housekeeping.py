@@ -0,0 +1,14 @@
+"""Politiques de rétention de l'application contact (voir ``base.housekeeping``)."""
+from datetime import timedelta
+
+from django.conf import settings
+
+from base.housekeeping import politique
+
+from . import models
+
+
+@politique('contacts', "Messages de contact plus anciens que la durée de rétention")
+def contacts_anciens(maintenant):
+    retention = timedelta(days=getattr(settings, 'CONTACT_RETENTION_JOURS', 365))
+    return models.Contact.objects.filter(date_add__lt=maintenant - retention)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from contact.models import CampagneNewsletter
+from contact.newsletter import CONNEXIONS, TAILLE_LOT, envoyer_campagne
+
+
+class Command(BaseCommand):
+    help = "Envoie une campagne newsletter à tous les abonnés actifs, ou reprend un envoi interrompu."
+
+    def add_arguments(self, parser):
+        parser.add_argument('campagne', type=int, help="Identifiant de la campagne")
+        parser.add_argument('--lot', type=int, default=TAILLE_LOT, help="Abonnés par lot")
+        parser.add_argument('--connexions', type=int, default=CONNEXIONS, help="Connexions SMTP en parallèle")
+
+    def handle(self, *args, **options):
+        try:
+            campagne = CampagneNewsletter.objects.get(pk=options['campagne'])
+        except CampagneNewsletter.DoesNotExist:
+            raise CommandError("Campagne inconnue")
+        if campagne.dernier_abonne_id and not campagne.terminee_le:
+            self.stdout.write(f"Reprise après l'abonné {campagne.dernier_abonne_id}.")
+
+        campagne = envoyer_campagne(campagne, options['lot'], options['connexions'])
+        duree = (campagne.terminee_le - campagne.lancee_le).total_seconds()
+        self.stdout.write(
+            f"Campagne terminée : {campagne.envoyes} envoyés, {campagne.echecs} en échec "
+            f"({duree:.1f}s depuis le lancement)."
+        )
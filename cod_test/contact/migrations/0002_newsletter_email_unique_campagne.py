@@ -0,0 +1,55 @@
+# Generated by Django 4.2.9 on 2026-10-19 05:08
+
+from django.db import migrations, models
+
+
+def normaliser_emails(apps, schema_editor):
+    # Emails en minuscules et sans doublon avant la pose de l'index unique ;
+    # on garde l'abonnement le plus ancien de chaque adresse.
+    NewsLetter = apps.get_model('contact', 'NewsLetter')
+    vus = set()
+    doublons = []
+    for pk, email in NewsLetter.objects.order_by('pk').values_list('pk', 'email').iterator():
+        normalise = (email or '').strip().lower()
+        if normalise in vus:
+            doublons.append(pk)
+            continue
+        vus.add(normalise)
+        if normalise != email:
+            NewsLetter.objects.filter(pk=pk).update(email=normalise)
+    NewsLetter.objects.filter(pk__in=doublons).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contact', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampagneNewsletter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sujet', models.CharField(max_length=255)),
+                ('template', models.CharField(default='newsletter/campagne.html', max_length=255)),
+                ('contexte', models.JSONField(blank=True, default=dict)),
+                ('date_add', models.DateTimeField(auto_now_add=True)),
+                ('lancee_le', models.DateTimeField(blank=True, null=True)),
+                ('terminee_le', models.DateTimeField(blank=True, null=True)),
+                ('dernier_abonne_id', models.PositiveBigIntegerField(default=0)),
+                ('envoyes', models.PositiveIntegerField(default=0)),
+                ('echecs', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Campagne newsletter',
+                'verbose_name_plural': 'Campagnes newsletter',
+            },
+        ),
+        migrations.RunPython(normaliser_emails, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='newsletter',
+            name='email',
+            field=models.EmailField(max_length=255, unique=True),
+        ),
+    ]
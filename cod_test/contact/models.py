@@ -16,12 +16,47 @@ class Contact(models.Model):
         return self.nom
 
 
+def normaliser_email(email):
+    return str(email or '').strip().lower()
+
+
 class NewsLetter(models.Model):
-    email = models.EmailField(max_length=255)
+    # Stocké normalisé (voir normaliser_email) : l'index unique écarte les doublons de casse
+    email = models.EmailField(max_length=255, unique=True)
 
     date_add = models.DateTimeField(auto_now_add=True)
     date_update = models.DateTimeField(auto_now=True)
     status = models.BooleanField(default=True)
 
+    def save(self, *args, **kwargs):
+        self.email = normaliser_email(self.email)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.email
+
+
+class CampagneNewsletter(models.Model):
+    """Envoi d'un gabarit à tous les abonnés actifs.
+
+    ``dernier_abonne_id`` est la progression : les abonnés sont parcourus par
+    clé primaire croissante, une campagne interrompue reprend après lui.
+    """
+
+    sujet = models.CharField(max_length=255)
+    template = models.CharField(max_length=255, default='newsletter/campagne.html')
+    contexte = models.JSONField(default=dict, blank=True)
+
+    date_add = models.DateTimeField(auto_now_add=True)
+    lancee_le = models.DateTimeField(null=True, blank=True)
+    terminee_le = models.DateTimeField(null=True, blank=True)
+    dernier_abonne_id = models.PositiveBigIntegerField(default=0)
+    envoyes = models.PositiveIntegerField(default=0)
+    echecs = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Campagne newsletter'
+        verbose_name_plural = 'Campagnes newsletter'
+
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.sujet
\ No newline at end of file
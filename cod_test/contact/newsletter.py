@@ -0,0 +1,155 @@
+"""Abonnements et envoi des campagnes newsletter.
+
+L'abonnement est un upsert sur l'index unique de l'email normalisé : s'abonner
+deux fois, ou se réabonner après une désactivation, ne crée jamais de doublon.
+
+Une campagne rend son gabarit une seule fois, parcourt les abonnés actifs par
+clé primaire avec ``.iterator()`` et envoie des lots en parallèle, chaque
+thread réutilisant une connexion SMTP du pool. La progression n'avance que
+sur des lots consécutifs terminés : une campagne interrompue reprend au
+premier lot inachevé.
+"""
+import logging
+import queue
+import smtplib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import CampagneNewsletter, NewsLetter, normaliser_email
+
+logger = logging.getLogger(__name__)
+
+TAILLE_LOT = 200
+CONNEXIONS = 4
+
+
+def abonner(email):
+    """Abonne ``email`` (ou le réactive) en une seule requête."""
+    email = normaliser_email(email)
+    NewsLetter.objects.bulk_create(
+        [NewsLetter(email=email, status=True)],
+        update_conflicts=True,
+        unique_fields=['email'],
+        update_fields=['status', 'date_update'],
+    )
+    return email
+
+
+class PoolSMTP:
+    """Connexions SMTP ouvertes à la demande et partagées entre threads."""
+
+    def __init__(self, taille=CONNEXIONS, fabrique=get_connection):
+        self._libres = queue.LifoQueue()
+        for _ in range(taille):
+            self._libres.put(fabrique(fail_silently=False))
+        self._toutes = list(self._libres.queue)
+
+    @contextmanager
+    def connexion(self):
+        connexion = self._libres.get()
+        try:
+            connexion.open()
+            yield connexion
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Connexion inutilisable : elle sera rouverte au prochain emprunt
+            connexion.close()
+            raise
+        finally:
+            self._libres.put(connexion)
+
+    def fermer(self):
+        for connexion in self._toutes:
+            connexion.close()
+
+
+def _rendre(campagne):
+    html = render_to_string(campagne.template, dict(campagne.contexte, sujet=campagne.sujet))
+    return html, strip_tags(html).strip()
+
+
+def _envoyer_lot(pool, campagne, html, texte, abonnes):
+    envoyes = echecs = 0
+    with pool.connexion() as connexion:
+        for _, email in abonnes:
+            message = EmailMultiAlternatives(campagne.sujet, texte, None, [email], connection=connexion)
+            message.attach_alternative(html, 'text/html')
+            try:
+                connexion.send_messages([message])
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as exc:
+                # Refus propre à cette adresse : on continue le lot
+                logger.warning("Newsletter non envoyée à %s : %s", email, exc)
+                echecs += 1
+            else:
+                envoyes += 1
+    return envoyes, echecs
+
+
+def _lots(campagne, taille_lot):
+    abonnes = NewsLetter.objects.filter(
+        status=True, pk__gt=campagne.dernier_abonne_id
+    ).order_by('pk').values_list('pk', 'email')
+    lot = []
+    for abonne in abonnes.iterator(chunk_size=taille_lot):
+        lot.append(abonne)
+        if len(lot) == taille_lot:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+def _avancer(campagne, dernier_id, envoyes, echecs):
+    CampagneNewsletter.objects.filter(pk=campagne.pk).update(
+        dernier_abonne_id=dernier_id,
+        envoyes=F('envoyes') + envoyes,
+        echecs=F('echecs') + echecs,
+    )
+
+
+def envoyer_campagne(campagne, taille_lot=TAILLE_LOT, connexions=CONNEXIONS, pool=None):
+    """Envoie (ou reprend) ``campagne``, retourne la campagne à jour.
+
+    Une erreur de connexion arrête l'envoi après avoir enregistré la
+    progression des lots déjà terminés, puis est propagée.
+    """
+    if campagne.terminee_le:
+        return campagne
+    if campagne.lancee_le is None:
+        campagne.lancee_le = timezone.now()
+        campagne.save(update_fields=['lancee_le'])
+
+    html, texte = _rendre(campagne)
+    pool_local = pool is None
+    pool = pool or PoolSMTP(connexions)
+    en_cours = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=connexions) as executeur:
+            try:
+                for lot in _lots(campagne, taille_lot):
+                    en_cours.append((lot[-1][0], executeur.submit(_envoyer_lot, pool, campagne, html, texte, lot)))
+                    # Au plus deux lots en attente par connexion : la mémoire reste bornée
+                    while len(en_cours) >= 2 * connexions or (en_cours and en_cours[0][1].done()):
+                        dernier_id, futur = en_cours.popleft()
+                        _avancer(campagne, dernier_id, *futur.result())
+                while en_cours:
+                    dernier_id, futur = en_cours.popleft()
+                    _avancer(campagne, dernier_id, *futur.result())
+            except BaseException:
+                # Les lots pas encore commencés ne partent pas ; ils seront repris
+                for _, futur in en_cours:
+                    futur.cancel()
+                raise
+    finally:
+        if pool_local:
+            pool.fermer()
+
+    CampagneNewsletter.objects.filter(pk=campagne.pk).update(terminee_le=timezone.now())
+    campagne.refresh_from_db()
+    return campagne
@@ -1,6 +1,12 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse, resolve
 import json
+import smtplib
+from unittest import mock
+
+from base.smtp_sink import SMTPSink
+from . import newsletter
+from .models import CampagneNewsletter, NewsLetter
 
 
 class ContactUrlsTests(TestCase):
@@ -55,3 +61,88 @@ class ContactViewsTests(TestCase):
         data = response.json()
         self.assertIn('success', data)
         self.assertFalse(data['success'])
+
+
+class NewsletterAbonnementTests(TestCase):
+    def _abonner(self, email):
+        return self.client.post(
+            reverse('post_newsletter'), data=json.dumps({'email': email}), content_type='application/json'
+        ).json()
+
+    def test_abonnement_enregistre_et_normalise(self):
+        self.assertTrue(self._abonner('  Client@Example.COM ')['success'])
+        self.assertEqual(list(NewsLetter.objects.values_list('email', flat=True)), ['client@example.com'])
+
+    def test_abonnement_idempotent(self):
+        self._abonner('client@example.com')
+        self._abonner('CLIENT@example.com')
+        self.assertEqual(NewsLetter.objects.count(), 1)
+
+    def test_reabonnement_reactive(self):
+        NewsLetter.objects.create(email='client@example.com', status=False)
+        with self.assertNumQueries(1):
+            newsletter.abonner('client@example.com')
+        self.assertTrue(NewsLetter.objects.get().status)
+
+
+class CampagneNewsletterTests(TestCase):
+    def setUp(self):
+        self.sink = SMTPSink().start()
+        self.addCleanup(self.sink.stop)
+        reglages = override_settings(**self.sink.settings())
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        NewsLetter.objects.bulk_create(
+            [NewsLetter(email=f'abonne{numero}@example.com') for numero in range(45)]
+            + [NewsLetter(email='inactif@example.com', status=False)]
+        )
+        self.campagne = CampagneNewsletter.objects.create(
+            sujet='Offres de la semaine', contexte={'contenu': 'Jusqu\'à -50 %'}
+        )
+
+    def test_envoi_a_tous_les_abonnes_actifs(self):
+        with mock.patch.object(newsletter, 'render_to_string', wraps=newsletter.render_to_string) as rendu:
+            campagne = newsletter.envoyer_campagne(self.campagne, taille_lot=10, connexions=3)
+        rendu.assert_called_once()
+        self.assertEqual(campagne.envoyes, 45)
+        self.assertIsNotNone(campagne.terminee_le)
+        self.assertEqual(campagne.dernier_abonne_id, NewsLetter.objects.filter(status=True).latest('pk').pk)
+        destinataires = {d[0] for _, d, _ in self.sink.messages}
+        self.assertEqual(len(destinataires), 45)
+        self.assertNotIn('<inactif@example.com>', destinataires)
+        # Connexions réutilisées d'un lot à l'autre
+        self.assertLessEqual(self.sink.connexions, 3)
+
+    def test_reprise_apres_interruption(self):
+        appels = []
+        envoyer_lot = newsletter._envoyer_lot
+
+        def lot_interrompu(pool, campagne, html, texte, abonnes):
+            appels.append(abonnes)
+            if len(appels) == 3:
+                raise smtplib.SMTPServerDisconnected("coupure")
+            return envoyer_lot(pool, campagne, html, texte, abonnes)
+
+        with mock.patch.object(newsletter, '_envoyer_lot', lot_interrompu):
+            with self.assertRaises(smtplib.SMTPServerDisconnected):
+                newsletter.envoyer_campagne(self.campagne, taille_lot=10, connexions=1)
+
+        self.campagne.refresh_from_db()
+        self.assertEqual(self.campagne.envoyes, 20)
+        self.assertEqual(self.campagne.dernier_abonne_id, appels[1][-1][0])
+        self.assertIsNone(self.campagne.terminee_le)
+
+        campagne = newsletter.envoyer_campagne(self.campagne, taille_lot=10, connexions=1)
+        self.assertEqual(campagne.envoyes, 45)
+        self.assertEqual(len(self.sink.messages), 45)
+
+    def test_refus_d_une_adresse_compte_en_echec(self):
+        self.sink.refus = 2
+        campagne = newsletter.envoyer_campagne(self.campagne, taille_lot=10, connexions=2)
+        self.assertEqual((campagne.envoyes, campagne.echecs), (43, 2))
+
+    def test_campagne_terminee_non_renvoyee(self):
+        newsletter.envoyer_campagne(self.campagne, taille_lot=50)
+        newsletter.envoyer_campagne(self.campagne, taille_lot=50)
+        self.assertEqual(len(self.sink.messages), 45)
+
@@ -1,9 +1,12 @@
 from django.core.validators import validate_email
 from django.shortcuts import render
 from . import models
+from .newsletter import abonner
 import json
 from django.http import JsonResponse
 
+from base.ratelimit import ratelimit
+
 
 # Create your views here.
 def contact(request):
@@ -11,6 +14,7 @@ def contact(request):
     return render(request, 'contact-us.html', datas)
 
 
+@ratelimit('5/m')
 def post_contact(request):
     postdata = json.loads(request.body.decode('utf-8'))
 
@@ -46,12 +50,13 @@ def post_contact(request):
     return JsonResponse(data, safe=False)
 
 
+@ratelimit('5/m')
 def post_newsletter(request):
     postdata = json.loads(request.body.decode('utf-8'))
 
     # name = postdata['name']
 
-    email = postdata['email']
+    email = models.normaliser_email(postdata.get('email'))
     try:
         validate_email(email)
         is_email = True
@@ -59,9 +64,7 @@ def post_newsletter(request):
         is_email = False
     isSuccess = False
     if is_email:
-        newsletter = models.NewsLetter()
-        
-        newsletter.email = email
+        abonner(email)
         isSuccess = True
         message = "Félicitations vous êtes abonnés à notre newsletter"
     else:
@@ -31,6 +31,9 @@ else:
 
 ALLOWED_HOSTS = ['127.0.0.1', '51.38.37.84', 'cooldeal-ci.com', 'www.cooldeal-ci.com']
 
+# Adresse publique du site, pour les liens construits hors requête (reçus PDF)
+SITE_URL = os.environ.get('SITE_URL', 'https://www.cooldeal-ci.com')
+
 # --- Windows fix for packages importing `resource` (POSIX-only) ---
 import sys, types
 
@@ -87,8 +90,11 @@ MIDDLEWARE = [
     "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Avant CsrfViewMiddleware : une requête limitée est refusée sans lire son corps
+    'base.ratelimit.RateLimitMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'customer.middleware.AnonymousCartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -97,6 +103,10 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
 
 CRON_CLASSES = [
     "customer.cron.CleanExpiredTokensCronJob",
+    "base.cron.HousekeepingCronJob",
+    "shop.cron.TraiterNotificationsPaiementCronJob",
+    "base.cron.EnvoyerEmailsCronJob",
+    "shop.cron.AlertesFavorisCronJob",
 ]
 
 
@@ -131,12 +141,22 @@ TEMPLATES = [
                 'website.context_processors.cart',
                 'website.context_processors.galeries',
                 'website.context_processors.horaires',
+                'website.context_processors.favoris',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'cooldeal.wsgi.application'
+ASGI_APPLICATION = 'cooldeal.asgi.application'
+
+# Panier des visiteurs : cookie signé ou cache (customer.cart_storage.CacheCartStorage)
+ANONYMOUS_CART_STORAGE = 'customer.cart_storage.SignedCookieCartStorage'
+ANONYMOUS_CART_COOKIE_NAME = 'panier'
+ANONYMOUS_CART_MAX_AGE = 60 * 60 * 24 * 30
+
+# Intervalle (secondes) de sondage de la base par les flux SSE des marchands
+COMMANDES_SSE_POLL_INTERVAL = 15
 
 
 # Database
@@ -218,6 +238,17 @@ SILENCED_SYSTEM_CHECKS = ["security.W019"]
 
 LOGIN_URL = 'login'
 
+AUTHENTICATION_BACKENDS = ['customer.backends.EmailOrUsernameBackend']
+
+# Limitation de débit (base.ratelimit). RATELIMIT_PROXIES est le nombre de
+# proxys de confiance devant l'application : l'adresse du client est alors lue
+# dans X-Forwarded-For, à cette position en partant de la droite (1 derrière
+# le routeur Heroku). À 0, REMOTE_ADDR est utilisée ; ne jamais compter un
+# proxy absent, l'en-tête serait alors fourni par le client.
+RATELIMIT_ENABLE = os.environ.get('RATELIMIT_ENABLE', 'True') == 'True'
+RATELIMIT_CACHE = 'default'
+RATELIMIT_PROXIES = int(os.environ.get('RATELIMIT_PROXIES', '0'))
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
@@ -225,8 +256,63 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'nguessanlandry216@gmail.com'
 EMAIL_HOST_PASSWORD = 'fddd pmet bors unhf'  # Remplacez par le mot de passe d'application généré
 DEFAULT_FROM_EMAIL = 'nguessandezz@gmail.com'
+EMAIL_TIMEOUT = 10
+
+# Boîte d'envoi (base.outbox) : délai de base et nombre maximal de tentatives
+EMAIL_SORTANT_DELAI = 60
+EMAIL_SORTANT_MAX_TENTATIVES = 5
+
+# Rétention des données (base.housekeeping) : pause entre deux lots et durée
+# maximale d'un passage, en secondes ; le reste est repris au passage suivant.
+HOUSEKEEPING_PAUSE = 0.05
+HOUSEKEEPING_DUREE_MAX = 15 * 60
+CONTACT_RETENTION_JOURS = 365
 CONTACT_EMAIL = 'nguessandezz@gmail.com'
 
+# Passerelle de paiement : désactivée tant que CINETPAY_API_KEY n'est pas défini.
+# En local, `python manage.py fake_cinetpay` sert une API factice.
+PAYMENT_GATEWAY = {
+    'BACKEND': 'shop.gateway.CinetPayGateway',
+    'BASE_URL': os.environ.get('CINETPAY_BASE_URL', 'https://api-checkout.cinetpay.com'),
+    'API_KEY': os.environ.get('CINETPAY_API_KEY', ''),
+    'SITE_ID': os.environ.get('CINETPAY_SITE_ID', ''),
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    # Échéance d'un appel, réessais et reprise du paiement compris
+    'TOTAL_TIMEOUT': 15,
+    'MAX_RETRIES': 2,
+    'BACKOFF': 0.5,
+    'POOL_SIZE': 10,
+    'CIRCUIT_FAILURE_THRESHOLD': 5,
+    'CIRCUIT_RESET_TIMEOUT': 30,
+}
+
+# Réconciliation des notifications de paiement : délai initial (secondes), doublé à chaque échec
+PAIEMENT_NOTIFICATION_DELAI = 30
+PAIEMENT_NOTIFICATION_MAX_TENTATIVES = 8
+
+# Service de rendu PDF (client.pdf_service, commande serveur_pdf). Sans
+# ADRESSE, les reçus sont rendus dans le worker web en lançant Chromium. Avec
+# une adresse locale (127.0.0.1:8790), la commande web du Procfile lance le
+# service dans chaque dyno web : un dyno Heroku ne joint pas les autres.
+PDF_SERVICE = {
+    'ADRESSE': os.environ.get('PDF_SERVICE_ADRESSE', ''),
+    'TIMEOUT': 30,
+    'PAGES': 4,
+    'RECYCLAGE': 100,
+}
+
+# Moteur des reçus PDF (client.pdf_backends) : 'playwright', 'xhtml2pdf' ou
+# 'reportlab'. Les deux derniers ne demandent pas de navigateur.
+RECU_PDF_BACKEND = os.environ.get('RECU_PDF_BACKEND', 'playwright')
+
+# Cache des QR codes de reçus (client.qrcodes), une entrée par adresse et format
+QRCODE_CACHE = 'default'
+
+# Export ZIP des reçus (client.exports) : rendus en parallèle, reçus par archive
+EXPORT_RECUS_WORKERS = 4
+EXPORT_RECUS_MAX = 500
+
 DAISY_SETTINGS = {
     'SITE_TITLE': 'Django Admin',  # The title of the site
     'SITE_HEADER': 'Administration',  # Header text displayed in the admin panel
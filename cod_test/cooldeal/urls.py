@@ -27,5 +27,6 @@ urlpatterns = [
     path('deals/', include('shop.urls')),
     path('contact/', include('contact.urls')),
     path('client/', include('client.urls')),
+    path('base/', include('base.urls')),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT) \
  + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,10 +1,11 @@
 from django.contrib import admin
 
+from base.admin_performance import AdminPerformant
 import customer.models as models
 from .models import PasswordResetToken  
 
 
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -19,22 +20,13 @@ class CustomerAdmin(admin.ModelAdmin):
         'date_update',
         'status',
     )
-    list_filter = (
-        'user',
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'adresse',
-        'photo',
-        'contact_1',
-        'contact_2',
-        'ville',
-        'pays',
-    )
+    list_filter = ('status', 'date_add')
+    list_select_related = ('user', 'ville')
+    autocomplete_fields = ('user', 'ville')
+    search_fields = ('user__username', 'user__email', 'contact_1')
 
 
-class CodePromotionnelAdmin(admin.ModelAdmin):
+class CodePromotionnelAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -48,22 +40,12 @@ class CodePromotionnelAdmin(admin.ModelAdmin):
         'date_update',
         'status',
     )
-    list_filter = (
-        'etat',
-        'date_fin',
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'libelle',
-        'reduction',
-        'nombre_u',
-        'code_promo',
-    )
+    list_filter = ('status', 'etat', 'date_fin', 'date_add')
+    search_fields = ('code_promo', 'libelle')
     raw_id_fields = ('forfait',)
 
 
-class PanierAdmin(admin.ModelAdmin):
+class PanierAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -74,17 +56,13 @@ class PanierAdmin(admin.ModelAdmin):
         'date_update',
         'status',
     )
-    list_filter = (
-        'session_id',
-        'customer',
-        'date_add',
-        'coupon',
-        'date_update',
-        'status',
-    )
+    list_filter = ('status', 'date_add', 'date_update')
+    list_select_related = ('session_id', 'customer__user', 'coupon')
+    autocomplete_fields = ('customer',)
+    raw_id_fields = ('session_id', 'coupon')
 
 
-class CommandeAdmin(admin.ModelAdmin):
+class CommandeAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -100,23 +78,13 @@ class CommandeAdmin(admin.ModelAdmin):
         'status',
         'recu_paiement',
     )
-    list_filter = (
-        'customer',
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'id_paiment',
-        'payment_token',
-        'payment_url',
-        'api_response_id',
-        'crypto',
-        'prix_total',
-        'recu_paiement',
-    )
+    list_filter = ('status', 'date_add', 'date_update')
+    list_select_related = ('customer__user',)
+    autocomplete_fields = ('customer',)
+    search_fields = ('transaction_id', 'id_paiment')
 
 
-class ProduitPanierAdmin(admin.ModelAdmin):
+class ProduitPanierAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -128,23 +96,34 @@ class ProduitPanierAdmin(admin.ModelAdmin):
         'date_update',
         'status',
     )
-    list_filter = (
-        'produit',
-        'commande',
-        'date_add',
-        'date_update',
-        'status',
+    list_filter = ('status', 'en_promotion', 'date_add')
+    list_select_related = ('produit', 'panier', 'commande')
+    autocomplete_fields = ('produit',)
+    raw_id_fields = ('panier', 'commande')
+
+
+class NotificationPaiementAdmin(AdminPerformant):
+
+    list_display = (
         'id',
-        'panier',
-        'quantite',
+        'transaction_id',
+        'date_add',
+        'traitee_le',
+        'resultat',
+        'tentatives',
+        'prochaine_tentative',
     )
-    raw_id_fields = ('panier',)
+    list_filter = ('resultat',)
+    search_fields = ('transaction_id',)
+    # Boîte de réception en ajout seul : le contenu reçu n'est pas modifiable
+    readonly_fields = ('transaction_id', 'empreinte', 'payload', 'date_add')
 
 
-class PasswordResetTokenAdmin(admin.ModelAdmin):
+class PasswordResetTokenAdmin(AdminPerformant):
     list_display = ('id', 'user', 'token', 'created_at')  # Colonnes affichées dans la liste
     list_filter = ('created_at',)  # Filtres par champ
     search_fields = ('user__username', 'token')  # Champs de recherche
+    list_select_related = ('user',)
 
 # Enregistrez le modèle avec l'administration
 admin.site.register(PasswordResetToken, PasswordResetTokenAdmin)
@@ -158,4 +137,5 @@ _register(models.Customer, CustomerAdmin)
 _register(models.CodePromotionnel, CodePromotionnelAdmin)
 _register(models.Panier, PanierAdmin)
 _register(models.Commande, CommandeAdmin)
-_register(models.ProduitPanier, ProduitPanierAdmin)
\ No newline at end of file
+_register(models.ProduitPanier, ProduitPanierAdmin)
+_register(models.NotificationPaiement, NotificationPaiementAdmin)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CustomerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'customer'
+
+    def ready(self):
+        # Branche l'invalidation du cache des coupons
+        from . import coupons  # noqa: F401
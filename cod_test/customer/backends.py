@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+UserModel = get_user_model()
+
+# Au-delà, un identifiant partagé par trop de comptes est refusé
+MAX_CANDIDATS = 5
+
+
+class EmailOrUsernameBackend(ModelBackend):
+    """Connexion par nom d'utilisateur ou e-mail, sans tenir compte de la casse.
+
+    Une seule requête, servie par les index ``LOWER(username)`` et
+    ``LOWER(email)`` (migration ``customer.0014``). Le profil ``customer``
+    est chargé dans la même requête.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if not username or password is None:
+            return None
+
+        identifiant = str(username).strip().lower()
+        candidats = list(
+            UserModel._default_manager.annotate(
+                username_ci=Lower('username'), email_ci=Lower('email')
+            ).filter(
+                Q(username_ci=identifiant) | Q(email_ci=identifiant)
+            ).select_related('customer').order_by('pk')[:MAX_CANDIDATS]
+        )
+        if not candidats:
+            # Même coût qu'un mot de passe vérifié, pour ne pas révéler les comptes existants
+            UserModel().set_password(password)
+            return None
+
+        # Le nom d'utilisateur exact est prioritaire sur les correspondances par e-mail
+        candidats.sort(key=lambda user: user.get_username() != username)
+        for user in candidats:
+            if user.check_password(password) and self.user_can_authenticate(user):
+                return user
+        return None
@@ -0,0 +1,283 @@
+"""Stockage des paniers anonymes hors base de données.
+
+Un visiteur non connecté n'a plus de ligne ``Panier`` : son panier vit dans un
+cookie signé (``SignedCookieCartStorage``) ou dans le cache
+(``CacheCartStorage``), selon ``settings.ANONYMOUS_CART_STORAGE``. À la
+connexion, il est fusionné dans le ``Panier`` persistant du client.
+"""
+import uuid
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from shop.models import Produit
+from . import coupons, models
+
+# Identifiant exposé aux templates à la place de ``Panier.id`` pour les visiteurs
+ANONYMOUS_CART_ID = 'anonyme'
+
+SALT = 'customer.cart_storage'
+
+
+class LigneAnonyme:
+    """Équivalent en mémoire d'un ``ProduitPanier``, identifié par son produit."""
+
+    total = models.ProduitPanier.total
+    total_ligne = None
+
+    def __init__(self, produit, quantite):
+        self.id = produit.id
+        self.produit = produit
+        self.produit_id = produit.id
+        self.quantite = quantite
+
+
+class LignesAnonymes:
+    """Imite le related manager ``produit_panier`` utilisé dans les templates."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._lignes = None
+
+    def count(self):
+        return len(self.storage.produits)
+
+    def all(self):
+        if self._lignes is None:
+            quantites = self.storage.produits
+            produits = Produit.objects.in_bulk(list(quantites)) if quantites else {}
+            self._lignes = [
+                LigneAnonyme(produits[produit_id], quantite)
+                for produit_id, quantite in quantites.items()
+                if produit_id in produits
+            ]
+        return self._lignes
+
+    def __iter__(self):
+        return iter(self.all())
+
+
+class PanierAnonyme:
+    """Panier d'un visiteur, compatible avec les templates du ``Panier``."""
+
+    id = ANONYMOUS_CART_ID
+    customer = None
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.produit_panier = LignesAnonymes(storage)
+
+    def __str__(self):
+        return "panier"
+
+    @property
+    def coupon(self):
+        return coupons.trouver(self.storage.coupon) if self.storage.coupon else None
+
+    @property
+    def total(self):
+        return int(sum(ligne.total for ligne in self.produit_panier.all()))
+
+    @property
+    def total_with_coupon(self):
+        return coupons.totaux_lignes(self.produit_panier.all(), getattr(self.coupon, 'id', None))[1]
+
+    @property
+    def check_empty(self):
+        return self.produit_panier.count() > 0
+
+
+class BaseCartStorage(ABC):
+    """Lecture paresseuse et écriture différée (dans la réponse) du panier."""
+
+    def __init__(self, request):
+        self.request = request
+        self._data = None
+        self.modified = False
+
+    @property
+    def cookie_name(self):
+        return getattr(settings, 'ANONYMOUS_CART_COOKIE_NAME', 'panier')
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'ANONYMOUS_CART_MAX_AGE', 60 * 60 * 24 * 30)
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self._decode(self._load()) or {'produits': {}, 'coupon': None}
+        return self._data
+
+    @property
+    def produits(self):
+        return self.data['produits']
+
+    @property
+    def coupon(self):
+        return self.data['coupon']
+
+    def set(self, produit_id, quantite):
+        self.produits[int(produit_id)] = int(quantite)
+        self.modified = True
+
+    def remove(self, produit_id):
+        if self.produits.pop(int(produit_id), None) is not None:
+            self.modified = True
+
+    def set_coupon(self, code):
+        self.data['coupon'] = code
+        self.modified = True
+
+    def clear(self):
+        self._data = {'produits': {}, 'coupon': None}
+        self.modified = True
+
+    def as_panier(self):
+        return PanierAnonyme(self)
+
+    def update(self, response):
+        if self.modified:
+            self._store(response)
+
+    # Format compact : {"p": [[produit_id, quantite], ...], "c": code}
+    def _encode(self):
+        return {'p': [[k, v] for k, v in self.produits.items()], 'c': self.coupon}
+
+    def _decode(self, payload):
+        if not isinstance(payload, dict):
+            return None
+        try:
+            produits = {int(k): int(v) for k, v in payload.get('p', [])}
+        except (TypeError, ValueError):
+            return None
+        return {'produits': produits, 'coupon': payload.get('c')}
+
+    def _set_cookie(self, response, value):
+        response.set_cookie(
+            self.cookie_name, value, max_age=self.max_age,
+            httponly=True, samesite='Lax',
+            secure=settings.SESSION_COOKIE_SECURE,
+        )
+
+    @abstractmethod
+    def _load(self):
+        """Contenu brut du panier, ``None`` s'il n'y en a pas."""
+
+    @abstractmethod
+    def _store(self, response):
+        """Enregistre le panier, au besoin en posant un cookie sur ``response``."""
+
+
+class SignedCookieCartStorage(BaseCartStorage):
+    """Le panier entier tient dans un cookie signé et compressé."""
+
+    def _load(self):
+        value = self.request.COOKIES.get(self.cookie_name)
+        if not value:
+            return None
+        try:
+            return signing.loads(value, salt=SALT, max_age=self.max_age)
+        except signing.BadSignature:
+            return None
+
+    def _store(self, response):
+        if self.produits or self.coupon:
+            self._set_cookie(response, signing.dumps(self._encode(), salt=SALT, compress=True))
+        else:
+            response.delete_cookie(self.cookie_name, samesite='Lax')
+
+
+class CacheCartStorage(BaseCartStorage):
+    """Le cookie ne porte qu'une clé signée, le contenu est dans le cache."""
+
+    def __init__(self, request):
+        super().__init__(request)
+        self._key = None
+
+    def _cache_key(self, key):
+        return f'panier-anonyme:{key}'
+
+    def _load(self):
+        value = self.request.COOKIES.get(self.cookie_name)
+        if not value:
+            return None
+        try:
+            self._key = signing.loads(value, salt=SALT)
+        except signing.BadSignature:
+            return None
+        return cache.get(self._cache_key(self._key))
+
+    def _store(self, response):
+        if not (self.produits or self.coupon):
+            if self._key:
+                cache.delete(self._cache_key(self._key))
+            response.delete_cookie(self.cookie_name, samesite='Lax')
+            return
+        nouveau = self._key is None
+        if nouveau:
+            self._key = uuid.uuid4().hex
+        cache.set(self._cache_key(self._key), self._encode(), self.max_age)
+        if nouveau:
+            self._set_cookie(response, signing.dumps(self._key, salt=SALT))
+
+
+def default_storage(request):
+    backend = getattr(
+        settings, 'ANONYMOUS_CART_STORAGE', 'customer.cart_storage.SignedCookieCartStorage'
+    )
+    return import_string(backend)(request)
+
+
+def get_anonymous_cart(request):
+    """Retourne le stockage du panier anonyme attaché à la requête."""
+    if not hasattr(request, 'anonymous_cart'):
+        request.anonymous_cart = default_storage(request)
+    return request.anonymous_cart
+
+
+def merge_into_customer(request, customer):
+    """Fusionne le panier anonyme dans le ``Panier`` persistant du client.
+
+    Les lignes sont écrites en un seul upsert sur ``(panier, produit)`` : la
+    quantité choisie en tant que visiteur remplace celle déjà enregistrée.
+    """
+    storage = get_anonymous_cart(request)
+    if not (storage.produits or storage.coupon):
+        return None
+
+    panier = get_customer_panier(customer)
+    quantites = storage.produits
+    produit_ids = Produit.objects.filter(id__in=list(quantites)).values_list('id', flat=True)
+    date_update = timezone.now()
+    models.ProduitPanier.objects.bulk_create(
+        [
+            models.ProduitPanier(
+                panier=panier, produit_id=produit_id,
+                quantite=quantites[produit_id], date_update=date_update,
+            )
+            for produit_id in produit_ids
+        ],
+        update_conflicts=True,
+        unique_fields=['panier', 'produit'],
+        update_fields=['quantite', 'date_update'],
+    )
+    if storage.coupon:
+        coupon = coupons.trouver(storage.coupon)
+        # Épuisé depuis sa saisie : le panier du client garde son coupon actuel
+        if coupon and coupons.applicable(coupon.id, verifier_utilisations=True):
+            panier.coupon = coupon
+            panier.save(update_fields=['coupon', 'date_update'])
+    storage.clear()
+    return panier
+
+
+def get_customer_panier(customer):
+    panier = models.Panier.objects.filter(customer=customer).order_by('-id').first()
+    if panier is None:
+        panier = models.Panier.objects.create(customer=customer)
+    return panier
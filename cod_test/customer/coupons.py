@@ -0,0 +1,161 @@
+"""Moteur des codes promotionnels.
+
+Les codes sont stockés en majuscules et indexés. Les coupons actifs (``etat``,
+``status`` et ``date_fin`` non dépassée) sont gardés en mémoire avec les
+produits de leur ``forfait`` ; le cache est vidé par signal à chaque
+modification et rechargé au plus tard après ``DUREE_CACHE`` secondes pour
+suivre les modifications faites par les autres processus.
+
+Le nombre d'utilisations n'est jamais lu depuis le cache : il est incrémenté
+par un ``UPDATE`` conditionnel au moment de la commande (``utiliser``).
+"""
+import datetime
+import threading
+import time
+from collections import defaultdict
+
+from django.db.models import F, Q, Sum
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from shop.models import prix_effectif
+from . import models
+
+DUREE_CACHE = 60
+
+
+def normaliser_code(code):
+    return str(code or '').strip().upper()
+
+
+class CouponCache:
+    """Coupons actifs indexés par code, partagés par les threads du processus."""
+
+    def __init__(self, duree=DUREE_CACHE, horloge=time.monotonic):
+        self.duree = duree
+        self.horloge = horloge
+        self._lock = threading.Lock()
+        self._index = None
+        self._charge_le = 0
+
+    def _charger(self):
+        coupons = {
+            coupon.code_promo: coupon
+            for coupon in models.CodePromotionnel.objects.filter(
+                etat=True, status=True, date_fin__gte=datetime.date.today()
+            )
+        }
+        forfaits = defaultdict(set)
+        lignes = models.CodePromotionnel.forfait.through.objects.filter(
+            codepromotionnel_id__in=[coupon.id for coupon in coupons.values()]
+        ).values_list('codepromotionnel_id', 'produit_id')
+        for coupon_id, produit_id in lignes:
+            forfaits[coupon_id].add(produit_id)
+        for coupon in coupons.values():
+            coupon.forfait_ids = frozenset(forfaits[coupon.id])
+        return coupons
+
+    def _indexer(self):
+        # Deux index sur les mêmes instances : par code saisi et par clé de panier
+        with self._lock:
+            if self._index is None or self.horloge() - self._charge_le > self.duree:
+                coupons = self._charger()
+                self._index = (coupons, {coupon.id: coupon for coupon in coupons.values()})
+                self._charge_le = self.horloge()
+            return self._index
+
+    def actifs(self):
+        return self._indexer()[0]
+
+    def _valide(self, coupon):
+        # Le cache peut avoir été chargé avant minuit
+        if coupon is None or coupon.date_fin < datetime.date.today():
+            return None
+        return coupon
+
+    def get(self, code):
+        return self._valide(self.actifs().get(normaliser_code(code)))
+
+    def get_par_id(self, coupon_id):
+        return self._valide(self._indexer()[1].get(coupon_id))
+
+    def invalider(self):
+        with self._lock:
+            self._index = None
+
+
+cache = CouponCache()
+
+
+@receiver(post_save, sender=models.CodePromotionnel)
+@receiver(post_delete, sender=models.CodePromotionnel)
+@receiver(m2m_changed, sender=models.CodePromotionnel.forfait.through)
+def _invalider_cache(**kwargs):
+    cache.invalider()
+
+
+def trouver(code):
+    """Coupon actif correspondant au code saisi, ``None`` sinon."""
+    return cache.get(code)
+
+
+MESSAGE_EPUISE = "Ce code coupon n'est plus disponible"
+
+
+def applicable(coupon_id, verifier_utilisations=False):
+    """Version active du coupon rattaché à un panier, ``None`` s'il a expiré.
+
+    Avec ``verifier_utilisations``, le compteur est relu en base (une requête)
+    et un coupon épuisé est aussi écarté.
+    """
+    if coupon_id is None:
+        return None
+    coupon = cache.get_par_id(coupon_id)
+    if coupon is not None and verifier_utilisations and not _disponibles(coupon).exists():
+        return None
+    return coupon
+
+
+def _montant_eligible(coupon, total, sous_totaux):
+    # Sans forfait, le coupon s'applique à tout le panier
+    if not coupon.forfait_ids:
+        return total
+    return sum(montant for produit_id, montant in sous_totaux if produit_id in coupon.forfait_ids)
+
+
+def totaux_lignes(lignes, coupon_id):
+    """``(total, total_avec_coupon)`` pour des lignes déjà chargées en mémoire."""
+    total = int(sum(ligne.total for ligne in lignes))
+    coupon = applicable(coupon_id)
+    if coupon is None:
+        return total, total
+    eligible = _montant_eligible(coupon, total, ((ligne.produit_id, ligne.total) for ligne in lignes))
+    return total, int(total - coupon.reduction * eligible)
+
+
+def totaux_panier(panier):
+    """``(total, total_avec_coupon)`` calculés en une seule requête d'agrégation."""
+    coupon = applicable(panier.coupon_id)
+    montant = prix_effectif('produit__') * F('quantite')
+    agregats = {'total': Sum(montant)}
+    if coupon is not None and coupon.forfait_ids:
+        agregats['eligible'] = Sum(montant, filter=Q(produit_id__in=coupon.forfait_ids))
+    resultat = models.ProduitPanier.objects.filter(panier=panier).aggregate(**agregats)
+
+    total = int(resultat['total'] or 0)
+    if coupon is None:
+        return total, total
+    eligible = resultat.get('eligible', total) or 0
+    return total, int(total - coupon.reduction * eligible)
+
+
+def _disponibles(coupon):
+    return models.CodePromotionnel.objects.filter(
+        Q(nombre_u__isnull=True) | Q(nombre_utilisations__lt=F('nombre_u')),
+        pk=coupon.pk, etat=True, status=True, date_fin__gte=datetime.date.today(),
+    )
+
+
+def utiliser(coupon):
+    """Consomme une utilisation du coupon, ``False`` s'il est épuisé ou expiré."""
+    return _disponibles(coupon).update(nombre_utilisations=F('nombre_utilisations') + 1) == 1
@@ -0,0 +1,37 @@
+"""Politiques de rétention de l'application customer (voir ``base.housekeeping``)."""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db.models import Exists, OuterRef, Q
+
+from base.housekeeping import politique
+
+from . import models
+
+
+# Les paniers d'abord. Supprimer une session ne supprime pas ses paniers
+# (``Panier.session_id`` est en SET_NULL) : le panier d'un client lié à une
+# ancienne session survit, les anciens paniers anonymes sont repris ici.
+@politique('paniers', "Paniers vides ou anonymes abandonnés")
+def paniers_abandonnes(maintenant):
+    """Paniers vides depuis un jour, et paniers anonymes plus vieux que leur cookie."""
+    retention_anonyme = timedelta(seconds=getattr(settings, 'ANONYMOUS_CART_MAX_AGE', 60 * 60 * 24 * 30))
+    vide = ~Exists(models.ProduitPanier.objects.filter(panier=OuterRef('pk')))
+    return models.Panier.objects.filter(
+        Q(vide, date_update__lt=maintenant - timedelta(days=1))
+        | Q(customer__isnull=True, date_update__lt=maintenant - retention_anonyme)
+    )
+
+
+@politique('sessions', "Sessions expirées")
+def sessions_expirees(maintenant):
+    return Session.objects.filter(expire_date__lt=maintenant)
+
+
+@politique('tokens', "Jetons de réinitialisation de mot de passe expirés")
+def tokens_expires(maintenant):
+    return models.PasswordResetToken.objects.filter(
+        created_at__lt=maintenant - models.PasswordResetToken.DUREE_VALIDITE
+    )
+
@@ -0,0 +1,82 @@
+import datetime
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from customer import coupons
+from customer.models import CodePromotionnel
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la consommation concurrente d'un coupon (UPDATE conditionnel) "
+        "et la recherche d'un code via le cache comparée à la base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--utilisations', type=int, default=100, help="Valeur de nombre_u du coupon")
+        parser.add_argument('--tentatives', type=int, default=500)
+        parser.add_argument('--concurrence', type=int, default=16)
+        parser.add_argument('--recherches', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        coupon = CodePromotionnel.objects.create(
+            libelle="Benchmark", etat=True, reduction=0.1,
+            date_fin=datetime.date.today() + datetime.timedelta(days=1),
+            nombre_u=options['utilisations'], code_promo=f"BENCH-{uuid.uuid4().hex[:8]}",
+        )
+        try:
+            self._consommation(coupon, options['tentatives'], options['concurrence'])
+            self._recherche(coupon, options['recherches'])
+        finally:
+            coupon.delete()
+
+    def _consommation(self, coupon, tentatives, concurrence):
+        def utiliser(_):
+            try:
+                while True:
+                    try:
+                        return coupons.utiliser(coupon)
+                    except OperationalError:
+                        # SQLite : base verrouillée par un autre écrivain
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrence) as pool:
+            resultats = list(pool.map(utiliser, range(tentatives)))
+        duree = time.perf_counter() - debut
+
+        coupon.refresh_from_db()
+        acceptees = sum(resultats)
+        attendu = min(tentatives, coupon.nombre_u)
+        self.stdout.write(
+            f"{tentatives} utilisations concurrentes en {duree:.2f}s ({tentatives / duree:.0f}/s) : "
+            f"{acceptees} acceptées, compteur={coupon.nombre_utilisations}, attendu={attendu}"
+        )
+        if acceptees != attendu or coupon.nombre_utilisations != attendu:
+            self.stderr.write("Incohérence : le coupon a été sur-consommé")
+
+    def _recherche(self, coupon, recherches):
+        code = coupon.code_promo.lower()
+        coupons.cache.invalider()
+        coupons.trouver(code)
+
+        debut = time.perf_counter()
+        for _ in range(recherches):
+            coupons.trouver(code)
+        cache = time.perf_counter() - debut
+
+        debut = time.perf_counter()
+        for _ in range(recherches):
+            CodePromotionnel.objects.filter(code_promo=coupon.code_promo).first()
+        base = time.perf_counter() - debut
+
+        self.stdout.write(
+            f"{recherches} recherches : cache {cache * 1e6 / recherches:.1f}µs, "
+            f"base {base * 1e6 / recherches:.1f}µs par code"
+        )
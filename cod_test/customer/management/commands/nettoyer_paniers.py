@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from base.housekeeping import TAILLE_LOT, nettoyer
+
+
+class Command(BaseCommand):
+    help = "Supprime par lots les paniers abandonnés et les sessions expirées."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT)
+        parser.add_argument('--pause', type=float, default=0, help="Pause entre deux lots, en secondes")
+        parser.add_argument('--dry-run', action='store_true', help="Compte sans rien supprimer")
+
+    def handle(self, *args, **options):
+        metriques = nettoyer(
+            ('paniers', 'sessions'),
+            taille_lot=options['taille_lot'], pause=options['pause'], dry_run=options['dry_run'],
+        )
+        verbe = "à supprimer" if options['dry_run'] else "supprimés"
+        for nom, m in metriques.items():
+            self.stdout.write(
+                f"{nom} : {m['supprimes']} {verbe} en {m['lots']} lots, "
+                f"{m['duree']:.2f}s ({m['debit']:.0f}/s)"
+            )
@@ -0,0 +1,14 @@
+from .cart_storage import default_storage
+
+
+class AnonymousCartMiddleware:
+    """Attache le panier anonyme à la requête et l'écrit dans la réponse si modifié."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.anonymous_cart = default_storage(request)
+        response = self.get_response(request)
+        request.anonymous_cart.update(response)
+        return response
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def supprimer_doublons(apps, schema_editor):
+    # Conserve la ligne la plus récente pour chaque couple (panier, produit)
+    ProduitPanier = apps.get_model('customer', 'ProduitPanier')
+    doublons = ProduitPanier.objects.filter(panier__isnull=False).values(
+        'panier', 'produit'
+    ).annotate(n=Count('id'), dernier=Max('id')).filter(n__gt=1)
+    for doublon in doublons:
+        ProduitPanier.objects.filter(
+            panier=doublon['panier'], produit=doublon['produit']
+        ).exclude(id=doublon['dernier']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0008_customer_ville'),
+    ]
+
+    operations = [
+        migrations.RunPython(supprimer_doublons, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='produitpanier',
+            constraint=models.UniqueConstraint(fields=('panier', 'produit'), name='unique_produit_par_panier'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedoublonner_transactions(apps, schema_editor):
+    # Les commandes rejouées avant l'index unique gardent une référence distincte
+    Commande = apps.get_model('customer', 'Commande')
+    doublons = Commande.objects.exclude(transaction_id__isnull=True).values(
+        'transaction_id'
+    ).annotate(n=Count('id')).filter(n__gt=1)
+    for doublon in doublons:
+        commandes = Commande.objects.filter(
+            transaction_id=doublon['transaction_id']
+        ).order_by('id')
+        for commande in commandes[1:]:
+            Commande.objects.filter(id=commande.id).update(
+                transaction_id=f"{commande.transaction_id}-{commande.id}"
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0009_produitpanier_unique_panier_produit'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedoublonner_transactions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='commande',
+            name='transaction_id',
+            field=models.CharField(max_length=100, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='produitpanier',
+            name='prix_unitaire',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
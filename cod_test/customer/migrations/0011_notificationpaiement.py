@@ -0,0 +1,34 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:49
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0010_checkout_idempotent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationPaiement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.CharField(db_index=True, max_length=100)),
+                ('empreinte', models.CharField(max_length=64, unique=True)),
+                ('payload', models.JSONField()),
+                ('date_add', models.DateTimeField(auto_now_add=True)),
+                ('traitee_le', models.DateTimeField(blank=True, null=True)),
+                ('resultat', models.CharField(blank=True, max_length=50)),
+                ('tentatives', models.PositiveIntegerField(default=0)),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now)),
+                ('derniere_erreur', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Notification de paiement',
+                'verbose_name_plural': 'Notifications de paiement',
+                'indexes': [models.Index(fields=['traitee_le', 'prochaine_tentative'], name='notif_paiement_a_traiter')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+import datetime
+
+from django.db import migrations, models
+from django.db.models import BooleanField, Case, F, FloatField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+TAILLE_LOT = 1000
+
+
+def figer_prix_commandes(apps, schema_editor):
+    # Les commandes passées avant l'instantané reçoivent le prix actuel du
+    # catalogue, seule information encore disponible. Une requête UPDATE par
+    # lot de clés primaires pour ne pas verrouiller toute la table.
+    ProduitPanier = apps.get_model('customer', 'ProduitPanier')
+    Produit = apps.get_model('shop', 'Produit')
+
+    today = datetime.date.today()
+    promo = Q(date_debut_promo__lte=today, date_fin_promo__gte=today)
+    produit = Produit.objects.filter(pk=OuterRef('produit_id'))
+    prix = Coalesce(
+        F('prix_unitaire'),
+        Subquery(produit.annotate(p=Case(
+            When(promo, then=F('prix_promotionnel')), default=F('prix'), output_field=FloatField()
+        )).values('p')[:1]),
+    )
+    en_promotion = Subquery(produit.annotate(p=Case(
+        When(promo, then=Value(True)), default=Value(False), output_field=BooleanField()
+    )).values('p')[:1])
+
+    a_figer = ProduitPanier.objects.filter(commande__isnull=False, total_ligne__isnull=True)
+    dernier = 0
+    while True:
+        ids = list(a_figer.filter(pk__gt=dernier).order_by('pk').values_list('pk', flat=True)[:TAILLE_LOT])
+        if not ids:
+            break
+        ProduitPanier.objects.filter(pk__in=ids).update(
+            prix_unitaire=prix, en_promotion=en_promotion, total_ligne=prix * F('quantite'),
+        )
+        dernier = ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Chaque lot est validé séparément
+    atomic = False
+
+    dependencies = [
+        ('customer', '0011_notificationpaiement'),
+        ('shop', '0017_produit_quantite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produitpanier',
+            name='en_promotion',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='produitpanier',
+            name='total_ligne',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(figer_prix_commandes, migrations.RunPython.noop),
+    ]
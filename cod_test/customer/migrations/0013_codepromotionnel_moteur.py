@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models.functions import Trim, Upper
+
+
+def normaliser_codes(apps, schema_editor):
+    CodePromotionnel = apps.get_model('customer', 'CodePromotionnel')
+    CodePromotionnel.objects.update(code_promo=Upper(Trim('code_promo')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0012_produitpanier_snapshot_prix'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codepromotionnel',
+            name='nombre_utilisations',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(normaliser_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='codepromotionnel',
+            name='code_promo',
+            field=models.CharField(db_index=True, max_length=150),
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+INDEX = [
+    models.Index(Lower('username'), name='auth_user_username_ci_idx'),
+    models.Index(Lower('email'), name='auth_user_email_ci_idx'),
+]
+
+
+# Index posés sur la table de django.contrib.auth, qu'on ne peut pas migrer directement
+def creer_index(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    for index in INDEX:
+        schema_editor.add_index(User, index)
+
+
+def supprimer_index(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    for index in INDEX:
+        schema_editor.remove_index(User, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('customer', '0013_codepromotionnel_moteur'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
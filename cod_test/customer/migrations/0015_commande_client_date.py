@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-19 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0014_auth_user_index_identifiants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['customer', 'date_add'], name='commande_client_date'),
+        ),
+    ]
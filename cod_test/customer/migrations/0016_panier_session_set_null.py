@@ -0,0 +1,20 @@
+# Generated by Django 4.2.9 on 2026-10-19 06:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sessions', '0001_initial'),
+        ('customer', '0015_commande_client_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='panier',
+            name='session_id',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='session_panier', to='sessions.session'),
+        ),
+    ]
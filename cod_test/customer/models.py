@@ -36,12 +36,14 @@ class Customer(models.Model):
 
 
 class PasswordResetToken(models.Model):
+    DUREE_VALIDITE = timedelta(hours=1)
+
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='password_reset_token')
     token = models.CharField(max_length=100, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def is_valid(self):
-        return now() - self.created_at <= timedelta(hours=1)  # Token valide pendant 1 heure
+        return now() - self.created_at <= self.DUREE_VALIDITE
 
     def __str__(self):
         return f"Token for {self.user.username}"
@@ -57,7 +59,9 @@ class CodePromotionnel(models.Model):
     forfait = models.ManyToManyField(Produit, related_name="produit_code_promo", blank=True)
     reduction = models.FloatField()
     nombre_u = models.PositiveIntegerField(null=True)
-    code_promo = models.CharField(max_length=150)
+    nombre_utilisations = models.PositiveIntegerField(default=0)
+    # Toujours en majuscules, voir customer.coupons.normaliser_code
+    code_promo = models.CharField(max_length=150, db_index=True)
 
     date_add = models.DateTimeField(auto_now_add=True)
     date_update = models.DateTimeField(auto_now=True)
@@ -73,12 +77,18 @@ class CodePromotionnel(models.Model):
         """Unicode representation of CodePromotionnel."""
         return self.libelle
 
+    def save(self, *args, **kwargs):
+        from .coupons import normaliser_code
+        self.code_promo = normaliser_code(self.code_promo)
+        super().save(*args, **kwargs)
+
 
 class Panier(models.Model):
     """Model definition for Panier."""
 
     # TODO: Define fields here
-    session_id = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="session_panier", null=True , blank=True)
+    # SET_NULL : purger les sessions expirées ne doit pas emporter le panier d'un client
+    session_id = models.ForeignKey(Session, on_delete=models.SET_NULL, related_name="session_panier", null=True , blank=True)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="user_panier", null=True , blank=True)
     date_add = models.DateTimeField(auto_now_add=True)
     coupon = models.ForeignKey(CodePromotionnel, on_delete=models.CASCADE, related_name="code_use", null=True , blank=True)
@@ -96,18 +106,14 @@ class Panier(models.Model):
 
     @property
     def total(self):
-        panier = Panier.objects.get(id=self.id)
-        sum = 0
-        for i in panier.produit_panier.all():
-            sum = sum + i.total
-        return int(sum)
+        from .coupons import totaux_panier
+        return totaux_panier(self)[0]
 
     @property
     def total_with_coupon(self):
-        reduction = 0
-        if self.coupon:
-            reduction = self.coupon.reduction * self.total
-        return int(self.total - reduction)
+        # La réduction ne porte que sur les lignes éligibles au forfait du coupon
+        from .coupons import totaux_panier
+        return totaux_panier(self)[1]
 
     @property
     def check_empty(self):
@@ -126,7 +132,7 @@ class Commande(models.Model):
     id_paiment = models.CharField( max_length=50, null=True)
     payment_token = models.CharField(max_length=250, null=True)
     payment_url = models.TextField(null=True)
-    transaction_id = models.TextField(null=True)
+    transaction_id = models.CharField(max_length=100, unique=True, null=True)
     api_response_id = models.CharField(max_length=50, null=True)
     crypto = models.CharField(max_length=50, null=True)
     prix_total = models.FloatField()
@@ -140,6 +146,10 @@ class Commande(models.Model):
 
         verbose_name = 'Commande'
         verbose_name_plural = 'Commandes'
+        indexes = [
+            # Historique d'un client : filtre, tri et recherche par date
+            models.Index(fields=['customer', 'date_add'], name='commande_client_date'),
+        ]
 
     def __str__(self):
         """Unicode representation of UserRessource."""
@@ -159,6 +169,10 @@ class ProduitPanier(models.Model):
     panier = models.ForeignKey(Panier, related_name="produit_panier", on_delete=models.CASCADE, null=True)
     commande = models.ForeignKey(Commande, related_name="produit_commande", on_delete=models.CASCADE, null=True)
     quantite = models.IntegerField(default=1)
+    # Prix figés au moment de la commande, l'historique ne suit plus le catalogue
+    prix_unitaire = models.FloatField(null=True, blank=True)
+    en_promotion = models.BooleanField(default=False)
+    total_ligne = models.FloatField(null=True, blank=True)
     date_add = models.DateTimeField(auto_now_add=True)
     date_update = models.DateTimeField(auto_now=True)
     status = models.BooleanField(default=True)
@@ -168,14 +182,45 @@ class ProduitPanier(models.Model):
 
         verbose_name = 'Produit Panier/Commande'
         verbose_name_plural = 'Produits Panier/Commande'
+        constraints = [
+            # Permet l'upsert des lignes lors de la fusion du panier anonyme
+            models.UniqueConstraint(fields=['panier', 'produit'], name='unique_produit_par_panier'),
+        ]
 
     @property
     def total(self):
+        if self.total_ligne is not None:
+            return self.total_ligne
         if self.produit.check_promotion:
             return self.produit.prix_promotionnel * self.quantite
         else:
             return self.produit.prix * self.quantite
-        
 
 
+class NotificationPaiement(models.Model):
+    """Boîte de réception des notifications de la passerelle de paiement.
 
+    Une ligne est ajoutée par notification reçue et son contenu n'est jamais
+    modifié ; seules les colonnes de suivi du traitement évoluent.
+    """
+
+    transaction_id = models.CharField(max_length=100, db_index=True)
+    # Empreinte du contenu : une notification renvoyée à l'identique n'est stockée qu'une fois
+    empreinte = models.CharField(max_length=64, unique=True)
+    payload = models.JSONField()
+    date_add = models.DateTimeField(auto_now_add=True)
+    traitee_le = models.DateTimeField(null=True, blank=True)
+    resultat = models.CharField(max_length=50, blank=True)
+    tentatives = models.PositiveIntegerField(default=0)
+    prochaine_tentative = models.DateTimeField(default=now)
+    derniere_erreur = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'Notification de paiement'
+        verbose_name_plural = 'Notifications de paiement'
+        indexes = [
+            models.Index(fields=['traitee_le', 'prochaine_tentative'], name='notif_paiement_a_traiter'),
+        ]
+
+    def __str__(self):
+        return self.transaction_id
@@ -2,8 +2,30 @@ from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
 from customer.models import Customer
+from base import housekeeping
+import io
 import json
 
+
+def creer_etablissement():
+    """Établissement de test « Resto », avec sa catégorie et son propriétaire."""
+    from shop.models import CategorieEtablissement, Etablissement
+
+    categorie = CategorieEtablissement.objects.create(nom="Resto")
+    return Etablissement.objects.create(
+        user=User.objects.create_user('restaurateur', 'pass'),
+        nom="Resto", categorie=categorie, contact_1="01", email="e@e.com", logo="l.png", couverture="c.png",
+        nom_du_responsable="Responsable", prenoms_duresponsable="Prenom"
+    )
+
+
+def creer_produit(etablissement, nom, prix, **champs):
+    from shop.models import CategorieProduit, Produit
+
+    categorie, _ = CategorieProduit.objects.get_or_create(nom="Plats", categorie=etablissement.categorie)
+    return Produit.objects.create(nom=nom, prix=prix, categorie=categorie, etablissement=etablissement, **champs)
+
+
 class CustomerTests(TestCase):
     def setUp(self):
         self.client = Client()
@@ -208,3 +230,481 @@ class CustomerTests(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'forgot-password.html')
+
+
+class CartBatchTests(TestCase):
+    """Endpoint groupé des opérations panier"""
+
+    def setUp(self):
+        from customer.models import Panier, ProduitPanier
+
+        user = User.objects.create_user(username='batchuser', password='password')
+        customer = Customer.objects.create(user=user, adresse="Abidjan", contact_1="01020304")
+        etab = creer_etablissement()
+        self.produits = [creer_produit(etab, f"P{i}", 1000 * (i + 1)) for i in range(4)]
+        self.panier = Panier.objects.create(customer=customer)
+        self.ligne_1 = ProduitPanier.objects.create(panier=self.panier, produit=self.produits[0], quantite=1)
+        self.ligne_2 = ProduitPanier.objects.create(panier=self.panier, produit=self.produits[1], quantite=1)
+
+    def _post(self, operations):
+        data = {'panier': self.panier.id, 'operations': operations}
+        return self.client.post(reverse('cart_batch'), json.dumps(data), content_type="application/json")
+
+    def test_cart_batch_applies_all_operations(self):
+        from customer.models import CodePromotionnel
+
+        CodePromotionnel.objects.create(
+            libelle="Batch", code_promo="BATCH10", reduction=0.10, date_fin="2030-01-01", etat=True
+        )
+        response = self._post([
+            {'action': 'update', 'produit': self.produits[0].id, 'quantite': 3},
+            {'action': 'delete', 'produit_panier': self.ligne_2.id},
+            {'action': 'add', 'produit': self.produits[2].id, 'quantite': 2},
+            {'action': 'coupon', 'coupon': 'BATCH10'},
+        ])
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['panier']['total'], 3 * 1000 + 2 * 3000)
+        self.assertEqual(data['panier']['total_with_coupon'], int(9000 * 0.9))
+        self.assertEqual(
+            sorted(self.panier.produit_panier.values_list('produit_id', 'quantite')),
+            sorted([(self.produits[0].id, 3), (self.produits[2].id, 2)]),
+        )
+        self.panier.refresh_from_db()
+        self.assertEqual(self.panier.coupon.code_promo, 'BATCH10')
+
+    def test_cart_batch_add_concurrent_annule_le_lot(self):
+        from unittest import mock
+        from customer.models import ProduitPanier
+
+        bulk_create = ProduitPanier.objects.bulk_create
+
+        def add_to_cart_concurrent(lignes):
+            # La même ligne est créée par une autre requête entre la lecture et l'écriture
+            ProduitPanier.objects.create(panier=self.panier, produit=self.produits[2], quantite=5)
+            return bulk_create(lignes)
+
+        with mock.patch.object(ProduitPanier.objects, 'bulk_create', side_effect=add_to_cart_concurrent):
+            response = self._post([
+                {'action': 'update', 'produit': self.produits[0].id, 'quantite': 3},
+                {'action': 'add', 'produit': self.produits[2].id, 'quantite': 2},
+            ])
+        data = response.json()
+        self.assertFalse(data['success'])
+        self.assertEqual(
+            sorted(self.panier.produit_panier.values_list('produit_id', 'quantite')),
+            sorted([(self.produits[0].id, 1), (self.produits[1].id, 1)]),
+        )
+
+    def test_cart_batch_rejects_whole_batch_on_invalid_operation(self):
+        response = self._post([
+            {'action': 'update', 'produit': self.produits[0].id, 'quantite': 5},
+            {'action': 'update', 'produit': self.produits[3].id, 'quantite': 1},
+        ])
+        data = response.json()
+        self.assertFalse(data['success'])
+        self.assertEqual(data['errors'][0]['index'], 1)
+        self.ligne_1.refresh_from_db()
+        self.assertEqual(self.ligne_1.quantite, 1)
+
+    def test_cart_batch_query_count_does_not_grow_with_operations(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as petit:
+            self._post([{'action': 'update', 'produit': self.produits[0].id, 'quantite': 2}])
+        with CaptureQueriesContext(connection) as grand:
+            self._post([
+                {'action': 'update', 'produit': self.produits[0].id, 'quantite': 4},
+                {'action': 'update', 'produit': self.produits[1].id, 'quantite': 4},
+            ])
+        self.assertEqual(len(petit.captured_queries), len(grand.captured_queries))
+
+
+class AnonymousCartTests(TestCase):
+    """Panier des visiteurs stocké hors base puis fusionné à la connexion"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='guest', password='password')
+        self.customer = Customer.objects.create(user=self.user, adresse="Abidjan", contact_1="01020304")
+        etab = creer_etablissement()
+        self.produit = creer_produit(etab, "Alloco", 500)
+        self.autre = creer_produit(etab, "Placali", 700)
+
+    def _add(self, produit, quantite):
+        data = {'panier': 'anonyme', 'produit': produit.id, 'quantite': quantite}
+        return self.client.post(reverse('add_to_cart'), json.dumps(data), content_type="application/json")
+
+    def test_anonymous_add_to_cart_creates_no_rows(self):
+        from customer.models import Panier, ProduitPanier
+
+        response = self._add(self.produit, 2)
+        self.assertTrue(response.json()['success'])
+        self.assertIn('panier', response.cookies)
+        self.assertFalse(Panier.objects.exists())
+        self.assertFalse(ProduitPanier.objects.exists())
+
+        response = self.client.get(reverse('cart'))
+        self.assertContains(response, "Alloco")
+        self.assertEqual(response.context['cart'].total, 1000)
+
+    def test_anonymous_add_to_cart_rejects_invalid_input(self):
+        for produit, quantite in ((self.produit.id, 'deux'), (self.produit.id, 0), (999999, 1), ('abc', 1)):
+            data = {'panier': 'anonyme', 'produit': produit, 'quantite': quantite}
+            response = self.client.post(reverse('add_to_cart'), json.dumps(data), content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.json()['success'])
+            self.assertNotIn('panier', response.cookies)
+
+    def test_add_to_cart_reste_limite(self):
+        from customer import views
+
+        self.assertEqual([regle.nom for regle in views.add_to_cart.ratelimit], ['customer.views.add_to_cart:60/m'])
+        self.assertFalse(hasattr(views._quantite_valide, 'ratelimit'))
+
+    def test_storage_is_abstract(self):
+        from customer.cart_storage import BaseCartStorage
+
+        with self.assertRaises(TypeError):
+            BaseCartStorage(None)
+
+    def test_anonymous_browsing_runs_no_cart_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('login'))
+        tables = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('customer_panier', tables)
+        self.assertNotIn('django_session', tables)
+
+    def test_login_merges_anonymous_cart(self):
+        from customer.models import Panier, ProduitPanier
+
+        panier = Panier.objects.create(customer=self.customer)
+        ProduitPanier.objects.create(panier=panier, produit=self.produit, quantite=1)
+        self._add(self.produit, 3)
+        self._add(self.autre, 1)
+
+        data = {'username': 'guest', 'password': 'password'}
+        response = self.client.post(reverse('post'), json.dumps(data), content_type="application/json")
+        self.assertTrue(response.json()['success'])
+
+        self.assertEqual(Panier.objects.filter(customer=self.customer).count(), 1)
+        self.assertEqual(
+            sorted(panier.produit_panier.values_list('produit__nom', 'quantite')),
+            [('Alloco', 3), ('Placali', 1)],
+        )
+        self.assertEqual(response.cookies['panier'].value, '')
+
+    def test_cache_backend(self):
+        from django.test import override_settings
+        from customer.models import Panier
+
+        with override_settings(ANONYMOUS_CART_STORAGE='customer.cart_storage.CacheCartStorage'):
+            self._add(self.produit, 4)
+            data = {'panier': 'anonyme', 'produit_panier': self.produit.id}
+            response = self.client.get(reverse('cart'))
+            self.assertEqual(response.context['cart'].total, 2000)
+            self.client.post(reverse('delete_from_cart'), json.dumps(data), content_type="application/json")
+            response = self.client.get(reverse('cart'))
+            self.assertFalse(response.context['cart'].check_empty)
+        self.assertFalse(Panier.objects.exists())
+
+
+class PrixFigesTests(TestCase):
+    """Instantané des prix sur les lignes de commande"""
+
+    def setUp(self):
+        from customer.models import Commande, ProduitPanier
+
+        self.user = User.objects.create_user(username='prixuser', password='password')
+        customer = Customer.objects.create(user=self.user, adresse="Abidjan", contact_1="01020304", photo="p.jpg")
+        self.produit = creer_produit(
+            creer_etablissement(), "Placali", 1200, prix_promotionnel=900,
+            date_debut_promo='2000-01-01', date_fin_promo='2999-01-01',
+        )
+        self.commande = Commande.objects.create(customer=customer, transaction_id='TXPRIX', prix_total=1800)
+        self.ligne = ProduitPanier.objects.create(commande=self.commande, produit=self.produit, quantite=2)
+
+    def test_backfill_des_commandes_existantes(self):
+        import importlib
+        from django.apps import apps
+
+        migration = importlib.import_module('customer.migrations.0012_produitpanier_snapshot_prix')
+        migration.figer_prix_commandes(apps, None)
+
+        self.ligne.refresh_from_db()
+        self.assertEqual(
+            (self.ligne.prix_unitaire, self.ligne.en_promotion, self.ligne.total_ligne), (900, True, 1800)
+        )
+
+    def test_detail_commande_ignore_le_prix_courant(self):
+        self.ligne.prix_unitaire = 900
+        self.ligne.en_promotion = True
+        self.ligne.total_ligne = 1800
+        self.ligne.save()
+        self.produit.prix = 5000
+        self.produit.date_fin_promo = '2001-01-01'
+        self.produit.save()
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('commande-detail', args=[self.commande.id]))
+        self.assertContains(response, '1800 F CFA')
+        self.assertNotContains(response, '5000 F CFA')
+        self.assertEqual(self.ligne.total, 1800)
+
+
+class CouponEngineTests(TestCase):
+    """Moteur des codes promotionnels"""
+
+    def setUp(self):
+        import datetime
+        from customer.models import CodePromotionnel, Panier, ProduitPanier
+
+        user = User.objects.create_user(username='couponuser', password='password')
+        self.customer = Customer.objects.create(user=user, adresse="Abidjan", contact_1="01020304")
+        etab = creer_etablissement()
+        self.garba = creer_produit(etab, "Garba", 1000)
+        self.alloco = creer_produit(etab, "Alloco", 500)
+        self.demain = datetime.date.today() + datetime.timedelta(days=1)
+        self.coupon = CodePromotionnel.objects.create(
+            libelle="Garba -50%", etat=True, date_fin=self.demain, reduction=0.5,
+            nombre_u=2, code_promo="  garba50 ",
+        )
+        self.coupon.forfait.add(self.garba)
+        self.panier = Panier.objects.create(customer=self.customer, coupon=self.coupon)
+        ProduitPanier.objects.create(panier=self.panier, produit=self.garba, quantite=2)
+        ProduitPanier.objects.create(panier=self.panier, produit=self.alloco, quantite=1)
+
+    def test_code_normalise_et_recherche_insensible_a_la_casse(self):
+        from customer import coupons
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.code_promo, "GARBA50")
+        self.assertEqual(coupons.trouver("Garba50").id, self.coupon.id)
+        with self.assertNumQueries(0):
+            coupons.trouver("garba50")
+
+    def test_coupon_epuise_refuse_a_l_ajout(self):
+        from customer.models import CodePromotionnel, Panier
+
+        CodePromotionnel.objects.filter(pk=self.coupon.pk).update(nombre_utilisations=2)
+        panier = Panier.objects.create(customer=self.customer)
+        data = {'panier': panier.id, 'coupon': 'garba50'}
+        response = self.client.post(reverse('add_coupon'), json.dumps(data), content_type="application/json")
+        self.assertEqual(response.json(), {'message': "Ce code coupon n'est plus disponible", 'success': False})
+        panier.refresh_from_db()
+        self.assertIsNone(panier.coupon_id)
+
+    def test_coupon_epuise_refuse_par_le_lot(self):
+        from customer.models import CodePromotionnel, Panier, ProduitPanier
+
+        CodePromotionnel.objects.filter(pk=self.coupon.pk).update(nombre_u=1, nombre_utilisations=1)
+        panier = Panier.objects.create(customer=self.customer)
+        ligne = ProduitPanier.objects.create(panier=panier, produit=self.garba, quantite=1)
+        data = {'panier': panier.id, 'operations': [
+            {'action': 'update', 'produit': self.garba.id, 'quantite': 3},
+            {'action': 'coupon', 'coupon': 'garba50'},
+        ]}
+        reponse = self.client.post(reverse('cart_batch'), json.dumps(data), content_type="application/json").json()
+        self.assertFalse(reponse['success'])
+        self.assertEqual(reponse['errors'], [{'index': 1, 'message': "Ce code coupon n'est plus disponible"}])
+        # Le lot entier est annulé
+        panier.refresh_from_db()
+        ligne.refresh_from_db()
+        self.assertEqual((panier.coupon_id, ligne.quantite), (None, 1))
+
+    def test_coupon_epuise_non_repris_a_la_fusion(self):
+        from customer.models import CodePromotionnel
+
+        self.customer.user.set_password('password')
+        self.customer.user.save()
+        self.panier.coupon = None
+        self.panier.save()
+        self.client.post(reverse('add_to_cart'), json.dumps(
+            {'panier': 'anonyme', 'produit': self.alloco.id, 'quantite': 2}
+        ), content_type="application/json")
+        reponse = self.client.post(reverse('add_coupon'), json.dumps(
+            {'panier': 'anonyme', 'coupon': 'garba50'}
+        ), content_type="application/json").json()
+        self.assertTrue(reponse['success'])
+        # Épuisé entre la saisie du visiteur et sa connexion
+        CodePromotionnel.objects.filter(pk=self.coupon.pk).update(nombre_utilisations=2)
+
+        data = {'username': 'couponuser', 'password': 'password'}
+        self.assertTrue(self.client.post(reverse('post'), json.dumps(data), content_type="application/json").json()['success'])
+        self.panier.refresh_from_db()
+        self.assertIsNone(self.panier.coupon_id)
+        self.assertEqual(self.panier.produit_panier.get(produit=self.alloco).quantite, 2)
+
+    def test_coupon_inactif_ou_expire_refuse(self):
+        import datetime
+        from customer import coupons
+
+        self.coupon.etat = False
+        self.coupon.save()
+        self.assertIsNone(coupons.trouver("GARBA50"))
+        self.coupon.etat = True
+        self.coupon.date_fin = datetime.date.today() - datetime.timedelta(days=1)
+        self.coupon.save()
+        self.assertIsNone(coupons.trouver("GARBA50"))
+        self.assertEqual(self.panier.total_with_coupon, self.panier.total)
+
+    def test_reduction_limitee_aux_produits_du_forfait(self):
+        self.assertEqual(self.panier.total, 2500)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.panier.total_with_coupon, 2500 - 1000)
+
+        # Le cache suit les modifications du forfait
+        self.coupon.forfait.add(self.alloco)
+        self.assertEqual(self.panier.total_with_coupon, 1250)
+
+    def test_utilisations_comptees_par_update_conditionnel(self):
+        from customer import coupons
+
+        self.assertTrue(coupons.utiliser(self.coupon))
+        self.assertTrue(coupons.utiliser(self.coupon))
+        self.assertFalse(coupons.utiliser(self.coupon))
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.nombre_utilisations, 2)
+
+    def test_checkout_consomme_le_coupon(self):
+        from customer.models import CodePromotionnel, Commande
+
+        self.coupon.nombre_u = 1
+        self.coupon.save()
+        self.client.force_login(self.customer.user)
+        data = {'transaction_id': 'TXCOUPON', 'notify_url': 'http://n', 'return_url': 'http://r', 'panier': self.panier.id}
+        reponse = self.client.post(reverse('paiement_detail'), json.dumps(data), content_type="application/json").json()
+        self.assertTrue(reponse['success'])
+        self.assertEqual(Commande.objects.get(transaction_id='TXCOUPON').prix_total, 1500)
+        self.assertEqual(CodePromotionnel.objects.get(pk=self.coupon.pk).nombre_utilisations, 1)
+
+    def test_checkout_refuse_un_coupon_epuise(self):
+        from customer.models import CodePromotionnel, Commande
+
+        CodePromotionnel.objects.filter(pk=self.coupon.pk).update(nombre_utilisations=2)
+        self.client.force_login(self.customer.user)
+        data = {'transaction_id': 'TXEPUISE', 'notify_url': 'http://n', 'return_url': 'http://r', 'panier': self.panier.id}
+        reponse = self.client.post(reverse('paiement_detail'), json.dumps(data), content_type="application/json").json()
+        self.assertFalse(reponse['success'])
+        self.assertFalse(Commande.objects.exists())
+        self.assertEqual(self.panier.produit_panier.count(), 2)
+
+
+class HousekeepingTests(TestCase):
+    """Nettoyage par lots des paniers abandonnés et des sessions expirées"""
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.contrib.sessions.models import Session
+        from django.utils import timezone
+        from customer.models import Panier, ProduitPanier
+
+        maintenant = timezone.now()
+        ancien = maintenant - timedelta(days=60)
+        user = User.objects.create_user(username='menageuser', password='password')
+        customer = Customer.objects.create(user=user, adresse="Abidjan", contact_1="01020304")
+        produit = creer_produit(creer_etablissement(), "Garba", 1000)
+
+        self.anonymes = [Panier.objects.create() for _ in range(5)]
+        self.vide = Panier.objects.create(customer=customer)
+        self.garde = Panier.objects.create(customer=customer)
+        self.recent = Panier.objects.create()
+        ProduitPanier.objects.create(panier=self.garde, produit=produit)
+        Panier.objects.exclude(pk=self.recent.pk).update(date_update=ancien)
+
+        for i in range(3):
+            Session.objects.create(session_key=f'expiree{i}', session_data='', expire_date=ancien)
+        Session.objects.create(session_key='active', session_data='', expire_date=maintenant + timedelta(days=1))
+
+    def test_dry_run_ne_supprime_rien(self):
+        from django.core.management import call_command
+        from customer.models import Panier
+
+        sortie = io.StringIO()
+        call_command('nettoyer_paniers', taille_lot=2, dry_run=True, stdout=sortie)
+        self.assertIn("paniers : 6 à supprimer en 3 lots", sortie.getvalue())
+        self.assertIn("sessions : 3 à supprimer", sortie.getvalue())
+        metriques = housekeeping.nettoyer(('paniers', 'sessions'), taille_lot=2, dry_run=True)
+        self.assertEqual(metriques['paniers']['supprimes'], 6)
+        self.assertEqual(metriques['paniers']['lots'], 3)
+        self.assertEqual(metriques['sessions']['supprimes'], 3)
+        self.assertEqual(Panier.objects.count(), 8)
+
+    def test_suppression_par_lots(self):
+        from django.contrib.sessions.models import Session
+        from customer.models import Panier
+
+        metriques = housekeeping.nettoyer(('paniers', 'sessions'), taille_lot=2)
+        self.assertEqual(metriques['paniers']['supprimes'], 6)
+        self.assertEqual(metriques['paniers']['lots'], 3)
+        self.assertEqual(metriques['sessions']['supprimes'], 3)
+        self.assertIn('debit', metriques['sessions'])
+        self.assertEqual(set(Panier.objects.values_list('pk', flat=True)), {self.garde.pk, self.recent.pk})
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['active'])
+
+    def test_purge_des_sessions_conserve_le_panier_client(self):
+        from django.contrib.sessions.models import Session
+        from customer.models import Panier, ProduitPanier
+
+        # Panier client antérieur aux paniers anonymes hors base, encore rattaché à sa session
+        Panier.objects.filter(pk=self.garde.pk).update(session_id=Session.objects.get(session_key='expiree0'))
+        metriques = housekeeping.nettoyer(['sessions'])
+        self.assertEqual(metriques['sessions']['supprimes'], 3)
+        self.garde.refresh_from_db()
+        self.assertIsNone(self.garde.session_id_id)
+        self.assertEqual(ProduitPanier.objects.filter(panier=self.garde).count(), 1)
+
+
+class EmailOrUsernameBackendTests(TestCase):
+    """Connexion par nom d'utilisateur ou e-mail en une seule requête"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='Awa.Kone', email='Awa@Test.ci', password='password')
+        Customer.objects.create(user=self.user, adresse="Abidjan", contact_1="01020304")
+
+    def _login(self, username, password='password'):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                reverse('post'), json.dumps({'username': username, 'password': password}),
+                content_type="application/json"
+            )
+        requetes_user = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT') and 'FROM "auth_user"' in q['sql']
+        ]
+        return response.json(), requetes_user
+
+    def test_connexion_par_email_ou_nom_sans_casse(self):
+        for identifiant in ('awa@test.ci', 'AWA.KONE', 'Awa.Kone'):
+            reponse, requetes = self._login(identifiant)
+            self.assertTrue(reponse['success'], identifiant)
+            self.assertEqual(len(requetes), 1, identifiant)
+            self.client.logout()
+
+    def test_echec_en_une_requete(self):
+        reponse, requetes = self._login('awa@test.ci', 'mauvais')
+        self.assertFalse(reponse['success'])
+        self.assertEqual(len(requetes), 1)
+        reponse, requetes = self._login('inconnu@test.ci')
+        self.assertFalse(reponse['success'])
+        self.assertEqual(len(requetes), 1)
+
+    def test_requete_servie_par_les_index(self):
+        from django.db import connection
+        from django.db.models import Q
+        from django.db.models.functions import Lower
+
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plan de requête spécifique à SQLite")
+        queryset = User.objects.annotate(
+            username_ci=Lower('username'), email_ci=Lower('email')
+        ).filter(Q(username_ci='x') | Q(email_ci='x'))
+        plan = queryset.explain()
+        self.assertIn('auth_user_username_ci_idx', plan)
+        self.assertIn('auth_user_email_ci_idx', plan)
@@ -2,15 +2,19 @@ from django.core.validators import validate_email
 from django.shortcuts import render, redirect
 from django.shortcuts import render
 from . import models
+from . import cart_storage
+from . import coupons
 from shop import models as shop_models
 from django.contrib.auth import authenticate, login as login_request, logout
 import json
 from django.http import JsonResponse
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from cities_light.models import City
 
 
-from django.core.mail import send_mail
+from base.outbox import send_mail
 from django.utils.crypto import get_random_string
 from django.contrib import messages
 from django.urls import reverse
@@ -21,6 +25,8 @@ from .models import PasswordResetToken
 from django.core.exceptions import ValidationError
 from django.utils.timezone import now
 
+from base.ratelimit import ratelimit
+
 # Create your views here.
 def login(request):
     if request.user.is_authenticated:
@@ -51,6 +57,8 @@ def forgot_password(request):
         return render(request, 'forgot-password.html', datas)
 
 
+@ratelimit('100/h', cles=('ip',))
+@ratelimit('10/m', cles=('ip',))
 def islogin(request):
     postdata = json.loads(request.body.decode('utf-8'))
 
@@ -62,17 +70,15 @@ def islogin(request):
     isSuccess = False
     try:
 
-        if '@' in username:
-            utilisateur = User.objects.get(email=username)
-            user = authenticate(username=utilisateur.username, password=password)
-        else:
-            utilisateur = User.objects.get(username=username)
-            user = authenticate(username=utilisateur.username, password=password)
+        # Nom d'utilisateur ou e-mail : une seule requête (customer.backends)
+        user = authenticate(request, username=username, password=password)
         if user is not None and user.is_active:
 
             isSuccess = True
             _ = isSuccess
             login_request(request, user)
+            if hasattr(user, 'customer'):
+                cart_storage.merge_into_customer(request, user.customer)
             datas = {
                 'success': True,
                 'message': 'Vous êtes connectés!!!',
@@ -99,6 +105,7 @@ def deconnexion(request):
 
 
 # Fonction de recuperation et de traitement des données en cas de post ###############
+@ratelimit('10/h', cles=('ip',))
 def inscription(request):
 
     # name = postdata['name']
@@ -155,6 +162,7 @@ def inscription(request):
                     issuccess = True
                     if user is not None and user.is_active:
                         login_request(request, user)
+                        cart_storage.merge_into_customer(request, profile)
                         message = "Votre Compte a été créé avec succès"
                         issuccess = True
                 except Exception:
@@ -178,6 +186,16 @@ def inscription(request):
     return JsonResponse(datas, safe=False)
 
 
+def _quantite_valide(valeur):
+    """Quantité entière strictement positive, ``None`` sinon."""
+    try:
+        quantite = int(valeur)
+    except (TypeError, ValueError):
+        return None
+    return quantite if quantite >= 1 else None
+
+
+@ratelimit('60/m')
 def add_to_cart(request):
     postdata = json.loads(request.body.decode('utf-8'))
 
@@ -187,7 +205,14 @@ def add_to_cart(request):
     produit = postdata['produit']
     quantite = postdata['quantite']
     isSuccess = False
-    if panier is not None and produit is not None and quantite is not None:
+    if panier == cart_storage.ANONYMOUS_CART_ID and produit is not None and quantite is not None:
+        quantite = _quantite_valide(quantite)
+        if quantite is None or not str(produit).isdigit() or not shop_models.Produit.objects.filter(id=produit).exists():
+            return JsonResponse({'message': "Produit ou quantité invalide", 'success': False}, status=400)
+        cart_storage.get_anonymous_cart(request).set(produit, quantite)
+        isSuccess = True
+        message = "Produit ajouté au panier avec succès"
+    elif panier is not None and produit is not None and quantite is not None:
         panier = models.Panier.objects.get(id=panier)
         produit = shop_models.Produit.objects.get(id=produit)
         try:
@@ -212,6 +237,7 @@ def add_to_cart(request):
     return JsonResponse(data, safe=False)
 
 
+@ratelimit('60/m')
 def delete_from_cart(request):
     postdata = json.loads(request.body.decode('utf-8'))
 
@@ -221,7 +247,12 @@ def delete_from_cart(request):
     produit_panier = postdata['produit_panier']
 
     isSuccess = False
-    if panier is not None and produit_panier is not None :
+    if panier == cart_storage.ANONYMOUS_CART_ID and produit_panier is not None:
+        # Les lignes d'un panier anonyme sont identifiées par leur produit
+        cart_storage.get_anonymous_cart(request).remove(produit_panier)
+        isSuccess = True
+        message = "Produit supprimé avec succès"
+    elif panier is not None and produit_panier is not None :
         produit_panier = models.ProduitPanier.objects.get(id=produit_panier)
         produit_panier.delete()
         isSuccess = True
@@ -236,6 +267,9 @@ def delete_from_cart(request):
     return JsonResponse(data, safe=False)
 
 
+# Cible des essais de codes à la chaîne : limite stricte
+@ratelimit('50/h')
+@ratelimit('10/m')
 def add_coupon(request):
     postdata = json.loads(request.body.decode('utf-8'))
 
@@ -247,12 +281,23 @@ def add_coupon(request):
     isSuccess = False
     if panier is not None and coupon is not None :
         try:
-            coupon = models.CodePromotionnel.objects.get(code_promo=coupon)
-            panier = models.Panier.objects.get(id=panier)
-            panier.coupon = coupon
-            panier.save()
-            isSuccess = True
-            message = "Félicitations, vous avez ajouté un code coupon"
+            coupon = coupons.trouver(coupon)
+            if coupon is None:
+                raise models.CodePromotionnel.DoesNotExist
+            if coupons.applicable(coupon.id, verifier_utilisations=True) is None:
+                # Épuisé : la commande le refuserait, le panier n'affiche pas la remise
+                isSuccess = False
+                message = coupons.MESSAGE_EPUISE
+            elif panier == cart_storage.ANONYMOUS_CART_ID:
+                cart_storage.get_anonymous_cart(request).set_coupon(coupon.code_promo)
+                isSuccess = True
+                message = "Félicitations, vous avez ajouté un code coupon"
+            else:
+                panier = models.Panier.objects.get(id=panier)
+                panier.coupon = coupon
+                panier.save()
+                isSuccess = True
+                message = "Félicitations, vous avez ajouté un code coupon"
         except Exception:
             isSuccess = False
             message = "Code coupon invalide"
@@ -266,6 +311,7 @@ def add_coupon(request):
     return JsonResponse(data, safe=False)
 
 
+@ratelimit('60/m')
 def update_cart(request):
     postdata = json.loads(request.body.decode('utf-8'))
 
@@ -276,7 +322,17 @@ def update_cart(request):
     quantite = postdata['quantite']
 
     isSuccess = False
-    if panier is not None and produit is not None :
+    if panier == cart_storage.ANONYMOUS_CART_ID and produit is not None:
+        storage = cart_storage.get_anonymous_cart(request)
+        quantite = _quantite_valide(quantite)
+        if quantite is not None and str(produit).isdigit() and int(produit) in storage.produits:
+            storage.set(produit, quantite)
+            isSuccess = True
+            message = "Panier modifié avec succès"
+        else:
+            isSuccess = False
+            message = "Une erreur s'est produite"
+    elif panier is not None and produit is not None :
         panier = models.Panier.objects.get(id=panier)
         produit = shop_models.Produit.objects.get(id=produit)
         produit_panier = models.ProduitPanier.objects.get(panier=panier, produit=produit)
@@ -294,7 +350,153 @@ def update_cart(request):
     return JsonResponse(data, safe=False)
 
 
+def _resume_panier(panier, lignes):
+    total, total_with_coupon = coupons.totaux_lignes(lignes, getattr(panier.coupon, 'id', None))
+    return {
+        'id': panier.id,
+        'nombre_produits': len(lignes),
+        'quantite': sum(ligne.quantite for ligne in lignes),
+        'total': total,
+        'total_with_coupon': total_with_coupon,
+        'coupon': panier.coupon.code_promo if panier.coupon else None,
+    }
+
+
+@ratelimit('60/m')
+def cart_batch(request):
+    """Applique une liste d'opérations panier en une seule transaction.
+
+    Corps attendu : ``{"panier": id, "operations": [{"action": ..., ...}]}`` avec
+    ``action`` parmi ``add``, ``update``, ``delete`` et ``coupon``. Toutes les
+    opérations sont validées avant écriture : une seule erreur annule le lot.
+    """
+    try:
+        postdata = json.loads(request.body.decode('utf-8'))
+        operations = postdata['operations']
+        if postdata['panier'] == cart_storage.ANONYMOUS_CART_ID:
+            storage = cart_storage.get_anonymous_cart(request)
+            panier = storage.as_panier()
+        else:
+            storage = None
+            panier = models.Panier.objects.select_related('coupon').get(id=postdata['panier'])
+    except Exception:
+        return JsonResponse({'success': False, 'message': "Une erreur s'est produite"}, safe=False)
+
+    if not isinstance(operations, list):
+        operations = []
+
+    if storage is None:
+        lignes = {ligne.produit_id: ligne for ligne in panier.produit_panier.select_related('produit')}
+    else:
+        lignes = {ligne.produit_id: ligne for ligne in panier.produit_panier.all()}
+    lignes_par_id = {str(ligne.id): ligne for ligne in lignes.values()}
+    produit_ids = {str(op.get('produit')) for op in operations if isinstance(op, dict) and op.get('action') in ('add', 'update')}
+    produits = shop_models.Produit.objects.in_bulk([int(i) for i in produit_ids if i.isdigit()])
+    codes = [str(op.get('coupon')) for op in operations if isinstance(op, dict) and op.get('action') == 'coupon']
+    coupons_saisis = {code: coupons.trouver(code) for code in codes}
+
+    erreurs = []
+    a_creer, a_modifier, a_supprimer = {}, {}, set()
+    coupon = None
+    for index, op in enumerate(operations):
+        action = op.get('action') if isinstance(op, dict) else None
+        if action in ('add', 'update'):
+            try:
+                produit = produits.get(int(op.get('produit')))
+                quantite = int(op.get('quantite'))
+            except (TypeError, ValueError):
+                produit, quantite = None, 0
+            if produit is None or quantite < 1:
+                erreurs.append({'index': index, 'message': "Produit ou quantité invalide"})
+            elif produit.id in lignes and (action == 'add' or produit.id not in a_supprimer):
+                ligne = lignes[produit.id]
+                ligne.quantite = quantite
+                a_supprimer.discard(produit.id)
+                a_modifier[produit.id] = ligne
+            elif produit.id in a_creer:
+                a_creer[produit.id].quantite = quantite
+            elif action == 'add' and produit.id not in lignes:
+                if storage is None:
+                    a_creer[produit.id] = models.ProduitPanier(panier=panier, produit=produit, quantite=quantite)
+                else:
+                    a_creer[produit.id] = cart_storage.LigneAnonyme(produit, quantite)
+            else:
+                erreurs.append({'index': index, 'message': "Ce produit n'est pas dans le panier"})
+        elif action == 'delete':
+            ligne = lignes_par_id.get(str(op.get('produit_panier')))
+            if ligne is None:
+                erreurs.append({'index': index, 'message': "Produit introuvable dans le panier"})
+            else:
+                a_supprimer.add(ligne.produit_id)
+                a_modifier.pop(ligne.produit_id, None)
+        elif action == 'coupon':
+            coupon = coupons_saisis.get(str(op.get('coupon')))
+            if coupon is None:
+                erreurs.append({'index': index, 'message': "Code coupon invalide"})
+            elif coupons.applicable(coupon.id, verifier_utilisations=True) is None:
+                # Même contrôle que add_coupon : la commande refuserait un coupon épuisé
+                erreurs.append({'index': index, 'message': coupons.MESSAGE_EPUISE})
+        else:
+            erreurs.append({'index': index, 'message': "Opération inconnue"})
+
+    if erreurs:
+        return JsonResponse({
+            'success': False,
+            'message': "Merci de vérifier vos informations",
+            'errors': erreurs,
+        }, safe=False)
+
+    if storage is not None:
+        for produit_id in a_supprimer:
+            storage.remove(produit_id)
+        for ligne in list(a_modifier.values()) + list(a_creer.values()):
+            storage.set(ligne.produit_id, ligne.quantite)
+        if coupon is not None:
+            storage.set_coupon(coupon.code_promo)
+        panier = storage.as_panier()
+        return JsonResponse({
+            'success': True,
+            'message': "Panier modifié avec succès",
+            'panier': _resume_panier(panier, panier.produit_panier.all()),
+        }, safe=False)
+
+    try:
+        with transaction.atomic():
+            if a_supprimer:
+                models.ProduitPanier.objects.filter(
+                    id__in=[lignes[i].id for i in a_supprimer]
+                ).delete()
+            if a_modifier:
+                date_update = timezone.now()
+                for ligne in a_modifier.values():
+                    ligne.date_update = date_update
+                models.ProduitPanier.objects.bulk_update(a_modifier.values(), ['quantite', 'date_update'])
+            if a_creer:
+                models.ProduitPanier.objects.bulk_create(a_creer.values())
+            if coupon is not None:
+                panier.coupon = coupon
+                panier.save(update_fields=['coupon', 'date_update'])
+    except IntegrityError:
+        # Un add_to_cart concurrent a créé la même ligne : le lot est annulé en entier
+        return JsonResponse({
+            'success': False,
+            'message': "Le panier a été modifié entre-temps, merci de réessayer",
+        }, safe=False)
+
+    for produit_id in a_supprimer:
+        lignes.pop(produit_id)
+    lignes.update(a_creer)
+
+    data = {
+        'success': True,
+        'message': "Panier modifié avec succès",
+        'panier': _resume_panier(panier, list(lignes.values())),
+    }
+    return JsonResponse(data, safe=False)
+
+
 # Étape 1 : Vue pour demander l'e-mail
+@ratelimit('5/h', cles=('ip',))
 def request_reset_password(request):
     if request.method == 'POST':
         email = request.POST.get('email')
@@ -308,7 +510,7 @@ def request_reset_password(request):
             token.token = get_random_string(64)
             token.save()
 
-            # Envoyer l'e-mail
+            # Mettre l'e-mail en file d'envoi (envoyé par le worker base.outbox)
             reset_url = request.build_absolute_uri(reverse('reset_password', args=[token.token]))
             send_mail(
                 'Réinitialisation de mot de passe',
@@ -333,6 +535,7 @@ def request_reset_password(request):
 
 
 # Étape 2 : Vue pour réinitialiser le mot de passe
+@ratelimit('10/h', cles=('ip',))
 def reset_password(request, token):
     try:
         reset_token = PasswordResetToken.objects.get(token=token)
@@ -376,6 +579,6 @@ def test_email(request):
             ['votre_email@exemple.com'],
             fail_silently=False,
         )
-        return JsonResponse({'status': 'success', 'message': 'E-mail envoyé avec succès !'})
+        return JsonResponse({'status': 'success', 'message': "E-mail ajouté à la file d'envoi !"})
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': f'Erreur : {str(e)}'})
\ No newline at end of file
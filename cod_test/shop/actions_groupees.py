@@ -0,0 +1,113 @@
+"""Modifications groupées des produits : une seule requête ``UPDATE`` par action.
+
+Utilisées par les actions de l'admin et par l'inventaire du tableau de bord
+marchand. Rien ne passe par ``Produit.save()`` : les prix sont recalculés en
+SQL avec des expressions ``F()``.
+
+``QuerySet.update()`` ne touche pas les champs ``auto_now`` : ``date_update``
+est donc posé explicitement, les alertes favoris (``shop.alertes``) s'en
+servent comme filigrane.
+"""
+import datetime
+import math
+
+from django.db import IntegrityError
+from django.db.models import F
+from django.db.models.functions import Least, Round
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+class ActionGroupeeError(Exception):
+    pass
+
+
+def appliquer(produits, **valeurs):
+    """Applique ``valeurs`` à tous les ``produits`` en une requête ; retourne le nombre modifié."""
+    try:
+        return produits.update(date_update=timezone.now(), **valeurs)
+    except IntegrityError:
+        raise ActionGroupeeError("Valeurs refusées par la base de données")
+
+
+def changer_statut(produits, status):
+    return appliquer(produits, status=status)
+
+
+def changer_super_deal(produits, super_deal):
+    return appliquer(produits, super_deal=super_deal)
+
+
+def programmer_promotion(produits, debut, fin, remise=None):
+    """Fixe la période de promotion ; avec ``remise`` (en %), le prix promotionnel suit le prix."""
+    if debut and fin and debut > fin:
+        raise ActionGroupeeError("La promotion doit commencer avant de finir")
+    valeurs = {'date_debut_promo': debut, 'date_fin_promo': fin}
+    if remise is not None:
+        if not 0 < remise < 100:
+            raise ActionGroupeeError("La remise doit être comprise entre 0 et 100 %")
+        valeurs['prix_promotionnel'] = Round(F('prix') * (100 - remise) / 100)
+    return appliquer(produits, **valeurs)
+
+
+def ajuster_prix(produits, pourcentage):
+    """Augmente (ou baisse, si négatif) le prix de ``pourcentage`` %, arrondi au franc.
+
+    Le prix promotionnel est ramené au nouveau prix s'il le dépasse, dans la
+    même requête : une baisse ne laisse pas de « promotion » plus chère.
+    """
+    if pourcentage <= -100:
+        raise ActionGroupeeError("Une baisse doit rester inférieure à 100 %")
+    nouveau_prix = Round(F('prix') * (100 + pourcentage) / 100)
+    return appliquer(
+        produits, prix=nouveau_prix, prix_promotionnel=Least(F('prix_promotionnel'), nouveau_prix),
+    )
+
+
+def _date(valeur, nom):
+    if not valeur:
+        return None
+    if isinstance(valeur, datetime.date):
+        return valeur
+    jour = parse_date(valeur)
+    if jour is None:
+        raise ActionGroupeeError(f"Date invalide pour {nom} : {valeur}")
+    return jour
+
+
+def _pourcentage(valeur, nom, requis=True):
+    if valeur in (None, ''):
+        if requis:
+            raise ActionGroupeeError(f"Indiquez {nom}")
+        return None
+    try:
+        pourcentage = float(str(valeur).replace(',', '.'))
+    except ValueError:
+        raise ActionGroupeeError(f"Pourcentage invalide pour {nom} : {valeur}")
+    # float() accepte « nan » et « inf », que la base stockerait en NULL
+    if not math.isfinite(pourcentage):
+        raise ActionGroupeeError(f"Pourcentage invalide pour {nom} : {valeur}")
+    return pourcentage
+
+
+ACTIONS = {
+    'activer': ("Rendre disponibles", lambda produits, data: changer_statut(produits, True)),
+    'desactiver': ("Rendre indisponibles", lambda produits, data: changer_statut(produits, False)),
+    'marquer_super_deal': ("Marquer en super deal", lambda produits, data: changer_super_deal(produits, True)),
+    'retirer_super_deal': ("Retirer des super deals", lambda produits, data: changer_super_deal(produits, False)),
+    'programmer_promotion': ("Programmer une promotion", lambda produits, data: programmer_promotion(
+        produits,
+        _date(data.get('date_debut_promo'), 'la date de début'),
+        _date(data.get('date_fin_promo'), 'la date de fin'),
+        _pourcentage(data.get('remise'), 'la remise', requis=False),
+    )),
+    'ajuster_prix': ("Ajuster les prix", lambda produits, data: ajuster_prix(
+        produits, _pourcentage(data.get('pourcentage'), 'le pourcentage'),
+    )),
+}
+
+
+def executer(action, produits, data):
+    """Exécute l'action nommée ``action`` avec les paramètres de formulaire ``data``."""
+    if action not in ACTIONS:
+        raise ActionGroupeeError(f"Action inconnue : {action}")
+    return ACTIONS[action][1](produits, data)
@@ -1,10 +1,15 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.template.response import TemplateResponse
 
+from base.admin_performance import AdminPerformant
 import shop.models as models
+from shop import actions_groupees
+from shop.actions_groupees import ActionGroupeeError
 from shop.models import Favorite
 
 
-class CategorieEtablissementAdmin(admin.ModelAdmin):
+class CategorieEtablissementAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -16,20 +21,11 @@ class CategorieEtablissementAdmin(admin.ModelAdmin):
         'status',
         'slug',
     )
-    list_filter = (
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'nom',
-        'description',
-        'couverture',
-        'slug',
-    )
-    search_fields = ('slug',)
+    list_filter = ('status', 'date_add')
+    search_fields = ('nom', 'slug')
 
 
-class CategorieProduitAdmin(admin.ModelAdmin):
+class CategorieProduitAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -42,21 +38,13 @@ class CategorieProduitAdmin(admin.ModelAdmin):
         'status',
         'slug',
     )
-    list_filter = (
-        'categorie',
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'nom',
-        'description',
-        'couverture',
-        'slug',
-    )
-    search_fields = ('slug',)
+    list_filter = ('status', 'categorie', 'date_add')
+    list_select_related = ('categorie',)
+    autocomplete_fields = ('categorie',)
+    search_fields = ('nom', 'slug')
 
 
-class EtablissementAdmin(admin.ModelAdmin):
+class EtablissementAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -77,29 +65,13 @@ class EtablissementAdmin(admin.ModelAdmin):
         'status',
         'slug',
     )
-    list_filter = (
-        'categorie',
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'nom',
-        'description',
-        'logo',
-        'couverture',
-        'ville',
-        'adresse',
-        'pays',
-        'site_web',
-        'contact_1',
-        'contact_2',
-        'email',
-        'slug',
-    )
-    search_fields = ('slug',)
+    list_filter = ('status', 'categorie', 'date_add')
+    list_select_related = ('categorie', 'ville')
+    autocomplete_fields = ('user', 'categorie', 'ville')
+    search_fields = ('nom', 'slug', 'email')
 
 
-class ProduitAdmin(admin.ModelAdmin):
+class ProduitAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -123,32 +95,80 @@ class ProduitAdmin(admin.ModelAdmin):
         'slug',
     )
     list_filter = (
-        'date_debut_promo',
-        'date_fin_promo',
+        'status',
+        'super_deal',
         'categorie_etab',
         'categorie',
-        'etablissement',
-        'super_deal',
+        'date_debut_promo',
+        'date_fin_promo',
         'date_add',
-        'date_update',
-        'status',
-        'id',
-        'nom',
-        'description',
-        'description_deal',
-        'prix',
-        'prix_promotionnel',
-        'image',
-        'image_2',
-        'image_3',
-        'slug',
     )
-    search_fields = ('slug',)
+    list_select_related = ('categorie_etab', 'categorie', 'etablissement')
+    autocomplete_fields = ('categorie_etab', 'categorie', 'etablissement')
+    search_fields = ('nom', 'slug')
+    actions = (
+        'activer',
+        'desactiver',
+        'marquer_super_deal',
+        'retirer_super_deal',
+        'programmer_promotion',
+        'ajuster_prix',
+    )
 
-class FavoriteAdmin(admin.ModelAdmin):
+    def _executer(self, request, queryset, action):
+        # Une seule requête UPDATE pour toute la sélection (shop.actions_groupees)
+        try:
+            modifies = actions_groupees.executer(action, queryset, request.POST)
+        except ActionGroupeeError as exc:
+            self.message_user(request, str(exc), messages.ERROR)
+        else:
+            self.message_user(request, f"{modifies} produit(s) modifié(s).", messages.SUCCESS)
+
+    def _avec_formulaire(self, request, queryset, action):
+        """Page intermédiaire demandant les paramètres de l'action, puis exécution."""
+        if 'appliquer' in request.POST:
+            return self._executer(request, queryset, action)
+        return TemplateResponse(request, 'admin/shop/produit/action_groupee.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': actions_groupees.ACTIONS[action][0],
+            'action': action,
+            'nombre': queryset.count(),
+            'selection': request.POST.getlist(ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': ACTION_CHECKBOX_NAME,
+        })
+
+    @admin.action(description=actions_groupees.ACTIONS['activer'][0])
+    def activer(self, request, queryset):
+        self._executer(request, queryset, 'activer')
+
+    @admin.action(description=actions_groupees.ACTIONS['desactiver'][0])
+    def desactiver(self, request, queryset):
+        self._executer(request, queryset, 'desactiver')
+
+    @admin.action(description=actions_groupees.ACTIONS['marquer_super_deal'][0])
+    def marquer_super_deal(self, request, queryset):
+        self._executer(request, queryset, 'marquer_super_deal')
+
+    @admin.action(description=actions_groupees.ACTIONS['retirer_super_deal'][0])
+    def retirer_super_deal(self, request, queryset):
+        self._executer(request, queryset, 'retirer_super_deal')
+
+    @admin.action(description=actions_groupees.ACTIONS['programmer_promotion'][0])
+    def programmer_promotion(self, request, queryset):
+        return self._avec_formulaire(request, queryset, 'programmer_promotion')
+
+    @admin.action(description=actions_groupees.ACTIONS['ajuster_prix'][0])
+    def ajuster_prix(self, request, queryset):
+        return self._avec_formulaire(request, queryset, 'ajuster_prix')
+
+class FavoriteAdmin(AdminPerformant):
     list_display = ('id', 'user', 'produit', 'added_at')  # Colonnes affichées dans la liste
-    list_filter = ('user', 'produit', 'added_at')  # Filtres dans l'interface admin
+    list_filter = ('added_at',)  # Filtres dans l'interface admin
     search_fields = ('user__username', 'produit__nom')  # Recherche par utilisateur ou produit
+    list_select_related = ('user', 'produit')
+    autocomplete_fields = ('user', 'produit')
 
 admin.site.register(Favorite, FavoriteAdmin)
 
@@ -160,3 +180,11 @@ _register(models.CategorieEtablissement, CategorieEtablissementAdmin)
 _register(models.CategorieProduit, CategorieProduitAdmin)
 _register(models.Etablissement, EtablissementAdmin)
 _register(models.Produit, ProduitAdmin)
+
+
+class ExecutionAlertesFavorisAdmin(AdminPerformant):
+    list_display = ('id', 'date_add', 'jour', 'filigrane', 'produits', 'alertes', 'emails')
+    date_hierarchy = 'date_add'
+    readonly_fields = ('date_add', 'filigrane', 'jour', 'produits', 'alertes', 'emails')
+
+_register(models.ExecutionAlertesFavoris, ExecutionAlertesFavorisAdmin)
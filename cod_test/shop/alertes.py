@@ -0,0 +1,137 @@
+"""Alertes favoris : baisse de prix et début de promotion, un e-mail récapitulatif par utilisateur.
+
+Chaque passage ne relit que les produits modifiés depuis le filigrane du
+passage précédent (``Produit.date_update``), plus ceux dont la promotion
+commence ou se termine depuis son dernier jour : une promotion programmée
+change le prix effectif sans toucher ``date_update``. Leur prix effectif est
+comparé au dernier relevé (``PrixSuivi``), puis les favoris des produits en
+baisse sont lus par lots avec ``produit_id__in``. Le travail dépend du nombre
+de produits modifiés, pas du nombre total de favoris.
+
+Le premier passage relève les prix sans rien envoyer. Les e-mails partent
+par la boîte d'envoi (``base.outbox``), insérés en un lot.
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from base.outbox import mettre_en_file_lot
+from .models import ExecutionAlertesFavoris, Favorite, PrixSuivi, Produit, en_promotion, prix_effectif
+
+logger = logging.getLogger(__name__)
+
+TAILLE_LOT = 500
+SUJET = "Vos favoris CoolDeal sont en promotion"
+TEMPLATE = 'emails/alertes_favoris.html'
+
+
+def produits_a_examiner(precedente, jour):
+    """Produits dont le prix effectif a pu changer depuis le passage ``precedente``."""
+    if precedente is None:
+        return Produit.objects.all()
+    condition = Q(date_debut_promo__gt=precedente.jour, date_debut_promo__lte=jour)
+    # Lendemain de la fin : le prix remonte, le relevé doit suivre
+    condition |= Q(date_fin_promo__gte=precedente.jour, date_fin_promo__lt=jour)
+    if precedente.filigrane is not None:
+        condition |= Q(date_update__gt=precedente.filigrane)
+    return Produit.objects.filter(condition)
+
+
+def _lots(iterable, taille):
+    lot = []
+    for element in iterable:
+        lot.append(element)
+        if len(lot) == taille:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+def _baisses(lot):
+    """Relève les prix du lot et retourne les produits à annoncer, par identifiant."""
+    connus = dict(
+        (pk, (prix, promo))
+        for pk, prix, promo in PrixSuivi.objects.filter(
+            produit_id__in=[p['pk'] for p in lot]
+        ).values_list('produit_id', 'prix', 'en_promotion')
+    )
+    baisses = {}
+    for produit in lot:
+        if produit['pk'] not in connus:
+            continue
+        ancien_prix, ancienne_promo = connus[produit['pk']]
+        debut_promo = produit['promo'] and not ancienne_promo
+        if produit['prix_effectif'] < ancien_prix or debut_promo:
+            baisses[produit['pk']] = dict(produit, ancien_prix=ancien_prix, debut_promo=debut_promo)
+
+    PrixSuivi.objects.bulk_create(
+        [PrixSuivi(produit_id=p['pk'], prix=p['prix_effectif'], en_promotion=p['promo']) for p in lot],
+        update_conflicts=True,
+        unique_fields=['produit'],
+        update_fields=['prix', 'en_promotion', 'date_releve'],
+    )
+    return baisses
+
+
+def _email(destinataire, produits):
+    site = getattr(settings, 'SITE_URL', '').rstrip('/')
+    for produit in produits:
+        produit['url'] = site + reverse('product_detail', args=[produit['slug']])
+    html = render_to_string(TEMPLATE, {
+        'sujet': SUJET, 'prenom': destinataire['prenom'], 'produits': produits,
+    })
+    return {
+        'sujet': SUJET,
+        'corps': strip_tags(html).strip(),
+        'corps_html': html,
+        'destinataires': [destinataire['email']],
+    }
+
+
+def envoyer_alertes(taille_lot=TAILLE_LOT):
+    """Un passage des alertes ; retourne l'``ExecutionAlertesFavoris`` enregistrée."""
+    jour = timezone.localdate()
+    precedente = ExecutionAlertesFavoris.objects.order_by('-pk').first()
+    produits = produits_a_examiner(precedente, jour).annotate(
+        prix_effectif=prix_effectif(date=jour),
+        promo=en_promotion(date=jour),
+    ).order_by('pk').values('pk', 'nom', 'slug', 'prix_effectif', 'promo', 'date_update')
+
+    filigrane = precedente.filigrane if precedente else None
+    examines = alertes = 0
+    # utilisateur -> (coordonnées, produits en baisse)
+    digests = defaultdict(lambda: [None, []])
+    with transaction.atomic():
+        for lot in _lots(produits.iterator(chunk_size=taille_lot), taille_lot):
+            examines += len(lot)
+            plus_recent = max(p['date_update'] for p in lot)
+            if filigrane is None or plus_recent > filigrane:
+                filigrane = plus_recent
+            baisses = _baisses(lot)
+            if not baisses:
+                continue
+            alertes += len(baisses)
+            favoris = Favorite.objects.filter(produit_id__in=list(baisses)).exclude(user__email='').values_list(
+                'user_id', 'user__email', 'user__first_name', 'produit_id'
+            )
+            for user_id, email, prenom, produit_id in favoris:
+                digest = digests[user_id]
+                digest[0] = {'email': email, 'prenom': prenom}
+                digest[1].append(dict(baisses[produit_id]))
+
+        emails = mettre_en_file_lot(_email(destinataire, lignes) for destinataire, lignes in digests.values())
+        execution = ExecutionAlertesFavoris.objects.create(
+            filigrane=filigrane, jour=jour, produits=examines, alertes=alertes, emails=len(emails),
+        )
+    logger.info(
+        "alertes favoris : %s produits examinés, %s en baisse, %s e-mails", examines, alertes, len(emails)
+    )
+    return execution
@@ -0,0 +1,88 @@
+"""Validation d'un panier en commande.
+
+``passer_commande`` est atomique et idempotente : rejouer la même requête
+(même ``transaction_id``) renvoie la commande déjà créée au lieu d'en créer
+une seconde. L'unicité est garantie par l'index sur ``Commande.transaction_id``.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+
+from customer import coupons
+from customer import models as customer_models
+from . import notifications
+from .models import Produit, en_promotion, prix_effectif
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def _commande_existante(customer, transaction_id):
+    commande = customer_models.Commande.objects.filter(transaction_id=transaction_id).first()
+    if commande is not None and commande.customer_id != customer.id:
+        raise CheckoutError("Cet identifiant de transaction est déjà utilisé")
+    return commande
+
+
+def passer_commande(customer, panier_id, transaction_id, **paiement):
+    """Transforme le panier en commande, retourne ``(commande, created)``."""
+    commande = _commande_existante(customer, transaction_id)
+    if commande is not None:
+        return commande, False
+
+    try:
+        with transaction.atomic():
+            panier = customer_models.Panier.objects.select_for_update().get(
+                id=panier_id, customer=customer
+            )
+            commande = customer_models.Commande.objects.create(
+                customer=customer,
+                transaction_id=transaction_id,
+                id_paiment=transaction_id,
+                prix_total=0,
+                **paiement
+            )
+
+            # Une seule requête UPDATE déplace les lignes et fige leurs prix
+            produit = Produit.objects.filter(pk=OuterRef('produit_id'))
+            prix = Subquery(produit.annotate(p=prix_effectif()).values('p')[:1])
+            deplacees = customer_models.ProduitPanier.objects.filter(panier=panier).update(
+                panier=None,
+                commande=commande,
+                prix_unitaire=prix,
+                en_promotion=Subquery(produit.annotate(p=en_promotion()).values('p')[:1]),
+                total_ligne=prix * F('quantite'),
+            )
+            if not deplacees:
+                raise CheckoutError("Le panier est vide")
+
+            coupon = coupons.applicable(panier.coupon_id)
+            agregats = {'total': Sum('total_ligne')}
+            if coupon is not None and coupon.forfait_ids:
+                agregats['eligible'] = Sum('total_ligne', filter=Q(produit_id__in=coupon.forfait_ids))
+            totaux = commande.produit_commande.aggregate(**agregats)
+            total = int(totaux['total'] or 0)
+            reduction = 0
+            if coupon is not None:
+                # Le compteur est incrémenté dans la transaction : annulé si la commande échoue
+                if not coupons.utiliser(coupon):
+                    raise CheckoutError(coupons.MESSAGE_EPUISE)
+                reduction = coupon.reduction * (totaux.get('eligible', total) or 0)
+            commande.prix_total = int(total - reduction)
+            commande.save(update_fields=['prix_total', 'date_update'])
+            panier.delete()
+
+            etablissement_ids = list(
+                commande.produit_commande.values_list('produit__etablissement_id', flat=True).distinct()
+            )
+            transaction.on_commit(
+                lambda: notifications.publier_nouvelle_commande(commande, etablissement_ids)
+            )
+    except (IntegrityError, customer_models.Panier.DoesNotExist, CheckoutError):
+        # Une requête concurrente avec le même identifiant a pu valider le panier
+        commande = _commande_existante(customer, transaction_id)
+        if commande is None:
+            raise
+        return commande, False
+
+    return commande, True
@@ -0,0 +1,24 @@
+from django_cron import CronJobBase, Schedule
+from shop.alertes import envoyer_alertes
+from shop.webhook import traiter_notifications
+
+class TraiterNotificationsPaiementCronJob(CronJobBase):
+    RUN_EVERY_MINS = 1
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = 'shop.traiter_notifications_paiement'
+
+    def do(self):
+        stats = traiter_notifications()
+        print(f"{stats['traitees']} notifications traitées, {stats['echecs']} en échec.")
+
+
+class AlertesFavorisCronJob(CronJobBase):
+    RUN_EVERY_MINS = 60
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = 'shop.alertes_favoris'
+
+    def do(self):
+        execution = envoyer_alertes()
+        print(f"{execution.produits} produits examinés, {execution.emails} e-mails mis en file.")
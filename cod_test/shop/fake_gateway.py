@@ -0,0 +1,140 @@
+"""Serveur CinetPay factice pour les tests et les tests de charge.
+
+Il répond aux routes ``/v2/payment`` et ``/v2/payment/check`` comme l'API
+réelle, avec une latence et des pannes injectables, sans jamais appeler le
+prestataire::
+
+    with FakeCinetPayServer(latence=0.05) as serveur:
+        gateway = CinetPayGateway(serveur.url, 'cle', 'site')
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _repondre(self, status, data):
+        corps = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def do_POST(self):
+        serveur = self.server.fake
+        longueur = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(longueur) or b'{}')
+        except ValueError:
+            return self._repondre(400, {'code': '608', 'message': 'MINIMUM_REQUIRED_FIELDS'})
+
+        serveur.enregistrer(self.path, payload)
+        if serveur.consommer_panne():
+            reponse = 503, {'code': '503', 'message': 'SERVICE_UNAVAILABLE'}
+        elif self.path == '/v2/payment':
+            reponse = serveur.payment(payload)
+        elif self.path == '/v2/payment/check':
+            reponse = serveur.check(payload)
+        else:
+            reponse = 404, {'code': '404', 'message': 'NOT_FOUND'}
+        # La requête est traitée avant la latence : un client qui abandonne a pu créer la transaction
+        if serveur.latence and (serveur.chemins_lents is None or self.path in serveur.chemins_lents):
+            time.sleep(serveur.latence)
+        try:
+            self._repondre(*reponse)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class FakeCinetPayServer:
+    """Serveur HTTP multi-thread lancé en arrière-plan sur ``127.0.0.1``."""
+
+    def __init__(self, port=0, latence=0, pannes=0, statut='ACCEPTED', chemins_lents=None):
+        self.latence = latence
+        # Routes ralenties par ``latence`` ; ``None`` pour toutes
+        self.chemins_lents = chemins_lents
+        self.pannes = pannes
+        self.statut = statut
+        self.requetes = []
+        self.transactions = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def enregistrer(self, chemin, payload):
+        with self._lock:
+            self.requetes.append((chemin, payload))
+
+    def consommer_panne(self):
+        with self._lock:
+            if self.pannes > 0:
+                self.pannes -= 1
+                return True
+            return False
+
+    def payment(self, payload):
+        transaction_id = payload.get('transaction_id')
+        if not (payload.get('apikey') and transaction_id and payload.get('amount')):
+            return 400, {'code': '608', 'message': 'MINIMUM_REQUIRED_FIELDS'}
+        with self._lock:
+            if transaction_id in self.transactions:
+                return 400, {'code': '609', 'message': 'DUPLICATE_TRANSACTION'}
+            token = uuid.uuid4().hex
+            self.transactions[transaction_id] = dict(payload, payment_token=token)
+        return 200, {
+            'code': '201',
+            'message': 'CREATED',
+            'api_response_id': uuid.uuid4().hex[:20],
+            'data': {
+                'payment_token': token,
+                'payment_url': f'{self.url}/payment/{token}',
+            },
+        }
+
+    def check(self, payload):
+        transaction = self.transactions.get(payload.get('transaction_id'))
+        if transaction is None:
+            return 404, {'code': '627', 'message': 'TRANSACTION_NOT_FOUND'}
+        return 200, {
+            'code': '00',
+            'message': 'SUCCES',
+            'data': {
+                'amount': str(transaction['amount']),
+                'currency': transaction['currency'],
+                'status': self.statut,
+                'payment_token': transaction.get('payment_token'),
+            },
+        }
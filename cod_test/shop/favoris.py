@@ -0,0 +1,34 @@
+"""Favoris des utilisateurs : lus en une requête par page, basculés en une écriture."""
+from .models import Favorite
+
+ATTRIBUT_REQUETE = '_favoris_ids'
+
+
+def favoris_ids(request):
+    """Identifiants des produits favoris de l'utilisateur, chargés une fois par requête."""
+    if not request.user.is_authenticated:
+        return frozenset()
+    if not hasattr(request, ATTRIBUT_REQUETE):
+        ids = Favorite.objects.filter(user=request.user).values_list('produit_id', flat=True)
+        setattr(request, ATTRIBUT_REQUETE, frozenset(ids))
+    return getattr(request, ATTRIBUT_REQUETE)
+
+
+def basculer(user, produit_id, favori=None):
+    """Met le produit en favori (``True``), l'en retire (``False``) ou inverse son état (``None``).
+
+    Retourne le nouvel état. Un état demandé coûte une seule écriture ; sans
+    état, la suppression est tentée d'abord et l'insertion n'a lieu que si
+    rien n'a été supprimé.
+    """
+    favoris = Favorite.objects.filter(user=user, produit_id=produit_id)
+    if favori is None:
+        supprimes, _ = favoris.delete()
+        favori = not supprimes
+        if not favori:
+            return False
+    elif not favori:
+        favoris.delete()
+        return False
+    Favorite.objects.bulk_create([Favorite(user=user, produit_id=produit_id)], ignore_conflicts=True)
+    return True
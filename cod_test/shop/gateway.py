@@ -0,0 +1,299 @@
+"""Client de la passerelle de paiement (CinetPay).
+
+Un seul ``requests.Session`` est partagé par processus pour réutiliser les
+connexions. Chaque appel est borné par des délais de connexion et de lecture
+stricts et par une échéance globale, réessayé avec un backoff exponentiel à
+gigue, et protégé par un disjoncteur : après trop d'échecs consécutifs la
+passerelle est considérée indisponible et les appels échouent immédiatement au
+lieu de bloquer un worker.
+
+L'initialisation d'un paiement n'est pas idempotente : elle n'est réessayée
+que si la requête n'a pas pu partir (erreur ou délai de connexion). Après un
+délai de lecture, une erreur serveur ou un refus pour transaction existante,
+l'état réel est relu sur ``/v2/payment/check``.
+"""
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+
+class GatewayError(Exception):
+    """Réponse refusée par la passerelle (erreur définitive)."""
+
+
+class GatewayUnavailable(GatewayError):
+    """Passerelle injoignable, trop lente ou disjoncteur ouvert."""
+
+
+class GatewayIncertain(GatewayUnavailable):
+    """Requête partie sans réponse exploitable : la passerelle a pu la traiter."""
+
+
+class CircuitBreaker:
+    """Disjoncteur fermé / ouvert / semi-ouvert, partagé entre threads."""
+
+    FERME = 'ferme'
+    OUVERT = 'ouvert'
+    SEMI_OUVERT = 'semi-ouvert'
+
+    def __init__(self, seuil_echecs=5, delai_reouverture=30, horloge=time.monotonic):
+        self.seuil_echecs = seuil_echecs
+        self.delai_reouverture = delai_reouverture
+        self.horloge = horloge
+        self._lock = threading.Lock()
+        self._echecs = 0
+        self._ouvert_depuis = None
+        self._essai_en_cours = False
+
+    @property
+    def etat(self):
+        with self._lock:
+            return self._etat()
+
+    def _etat(self):
+        if self._ouvert_depuis is None:
+            return self.FERME
+        if self.horloge() - self._ouvert_depuis >= self.delai_reouverture:
+            return self.SEMI_OUVERT
+        return self.OUVERT
+
+    def autoriser(self):
+        # En semi-ouvert, une seule requête d'essai passe à la fois.
+        with self._lock:
+            etat = self._etat()
+            if etat == self.FERME:
+                return True
+            if etat == self.SEMI_OUVERT and not self._essai_en_cours:
+                self._essai_en_cours = True
+                return True
+            return False
+
+    def succes(self):
+        with self._lock:
+            self._echecs = 0
+            self._ouvert_depuis = None
+            self._essai_en_cours = False
+
+    def echec(self):
+        with self._lock:
+            self._echecs += 1
+            if self._essai_en_cours or self._echecs >= self.seuil_echecs:
+                self._ouvert_depuis = self.horloge()
+            self._essai_en_cours = False
+
+    def liberer(self):
+        # Essai semi-ouvert interrompu sans verdict (exception inattendue)
+        with self._lock:
+            self._essai_en_cours = False
+
+
+class CinetPayGateway:
+    """Initialisation et vérification des paiements CinetPay."""
+
+    CHECKOUT_URL = 'https://checkout.cinetpay.com/payment/{token}'
+
+    def __init__(self, base_url, api_key, site_id, connect_timeout=3.05, read_timeout=10,
+                 max_retries=2, backoff=0.5, pool_size=10, breaker=None, session=None,
+                 total_timeout=15, checkout_url=None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.site_id = site_id
+        self.timeout = (connect_timeout, read_timeout)
+        self.total_timeout = total_timeout
+        self.checkout_url = checkout_url or self.CHECKOUT_URL
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = session or self._session(pool_size)
+
+    @staticmethod
+    def _session(pool_size):
+        session = requests.Session()
+        # Les réessais sont gérés ici, pas par urllib3, pour contrôler la gigue.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _attente(self, tentative):
+        # Backoff exponentiel, gigue complète
+        return random.uniform(0, self.backoff * (2 ** tentative))
+
+    def _echeance(self):
+        return time.monotonic() + self.total_timeout
+
+    def _post(self, chemin, payload, idempotent=True, echeance=None):
+        """POST JSON borné par ``echeance`` (horloge monotone).
+
+        Une requête non ``idempotent`` n'est réessayée que si elle n'a pas pu
+        partir ; sinon ``GatewayIncertain`` est levée.
+        """
+        if echeance is None:
+            echeance = self._echeance()
+        if not self.breaker.autoriser():
+            raise GatewayUnavailable("Disjoncteur ouvert")
+
+        try:
+            return self._envoyer(chemin, dict(payload, apikey=self.api_key, site_id=self.site_id), idempotent, echeance)
+        finally:
+            self.breaker.liberer()
+
+    def _envoyer(self, chemin, payload, idempotent, echeance):
+        erreur = None
+        for tentative in range(self.max_retries + 1):
+            if tentative:
+                time.sleep(min(self._attente(tentative - 1), max(0, echeance - time.monotonic())))
+            restant = echeance - time.monotonic()
+            if restant <= 0:
+                erreur = erreur or requests.Timeout("Échéance dépassée")
+                break
+            connexion, lecture = self.timeout
+            try:
+                response = self.session.post(
+                    f'{self.base_url}{chemin}', json=payload, timeout=(min(connexion, restant), min(lecture, restant))
+                )
+            except (requests.ConnectTimeout, requests.ConnectionError) as exc:
+                # La requête n'a pas atteint la passerelle
+                erreur = exc
+                continue
+            except requests.Timeout as exc:
+                erreur = exc
+                if idempotent:
+                    continue
+                self.breaker.echec()
+                raise GatewayIncertain(str(exc))
+            if response.status_code == 429:
+                erreur = GatewayError("HTTP 429")
+                continue
+            if response.status_code >= 500:
+                erreur = GatewayError(f"HTTP {response.status_code}")
+                if idempotent:
+                    continue
+                self.breaker.echec()
+                raise GatewayIncertain(str(erreur))
+            self.breaker.succes()
+            try:
+                data = response.json()
+            except ValueError:
+                raise GatewayError("Réponse illisible de la passerelle")
+            if response.status_code >= 400:
+                raise GatewayError(data.get('message') or f"HTTP {response.status_code}")
+            return data
+
+        self.breaker.echec()
+        raise GatewayUnavailable(str(erreur))
+
+    def initier_paiement(self, transaction_id, montant, description, notify_url, return_url,
+                         customer_name='', customer_surname='', currency='XOF'):
+        """Retourne ``payment_url``, ``payment_token`` et ``api_response_id``.
+
+        CinetPay refuse un ``transaction_id`` déjà utilisé : après une réponse
+        perdue ou un refus, le paiement existant est repris par
+        ``_reprendre_paiement`` au lieu d'échouer à chaque rejeu.
+        """
+        echeance = self._echeance()
+        try:
+            data = self._post('/v2/payment', {
+                'transaction_id': transaction_id,
+                'amount': int(montant),
+                'currency': currency,
+                'description': description,
+                'notify_url': notify_url,
+                'return_url': return_url,
+                'customer_name': customer_name,
+                'customer_surname': customer_surname,
+                'channels': 'ALL',
+            }, idempotent=False, echeance=echeance)
+        except GatewayIncertain as exc:
+            return self._reprendre_paiement(transaction_id, return_url, echeance, exc)
+        except GatewayUnavailable:
+            raise
+        except GatewayError as exc:
+            # Refus, peut-être parce qu'une tentative précédente a créé la transaction
+            return self._reprendre_paiement(transaction_id, return_url, echeance, exc)
+        paiement = data.get('data') or {}
+        if not paiement.get('payment_url'):
+            raise GatewayError(data.get('description') or data.get('message') or "Paiement refusé")
+        return {
+            'payment_url': paiement['payment_url'],
+            'payment_token': paiement.get('payment_token'),
+            'api_response_id': data.get('api_response_id'),
+        }
+
+    def _reprendre_paiement(self, transaction_id, return_url, echeance, erreur):
+        """URL de paiement d'une transaction peut-être déjà créée par une tentative précédente.
+
+        Si la passerelle ne connaît pas la transaction, ``erreur`` (l'échec de
+        l'initialisation) est relevée telle quelle.
+        """
+        try:
+            paiement = self.verifier_paiement(transaction_id, echeance=echeance)
+        except GatewayUnavailable:
+            raise
+        except GatewayError:
+            raise erreur
+        if paiement.get('status') == 'ACCEPTED':
+            # Déjà payé : le client retourne directement sur le site
+            url = return_url
+        elif paiement.get('payment_url'):
+            url = paiement['payment_url']
+        elif paiement.get('payment_token'):
+            url = self.checkout_url.format(token=paiement['payment_token'])
+        else:
+            raise GatewayError("Paiement déjà initié, URL de paiement introuvable")
+        return {
+            'payment_url': url,
+            'payment_token': paiement.get('payment_token'),
+            'api_response_id': None,
+        }
+
+    def verifier_paiement(self, transaction_id, echeance=None):
+        """Retourne le bloc ``data`` de CinetPay (``status``, ``amount``…)."""
+        data = self._post('/v2/payment/check', {'transaction_id': transaction_id}, echeance=echeance)
+        return data.get('data') or {}
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Passerelle partagée par le processus, ``None`` si elle n'est pas configurée."""
+    global _gateway
+    config = getattr(settings, 'PAYMENT_GATEWAY', {})
+    if not config.get('API_KEY'):
+        return None
+    with _gateway_lock:
+        if _gateway is None:
+            backend = import_string(config.get('BACKEND', 'shop.gateway.CinetPayGateway'))
+            _gateway = backend(
+                base_url=config['BASE_URL'],
+                api_key=config['API_KEY'],
+                site_id=config.get('SITE_ID', ''),
+                connect_timeout=config.get('CONNECT_TIMEOUT', 3.05),
+                read_timeout=config.get('READ_TIMEOUT', 10),
+                max_retries=config.get('MAX_RETRIES', 2),
+                backoff=config.get('BACKOFF', 0.5),
+                pool_size=config.get('POOL_SIZE', 10),
+                total_timeout=config.get('TOTAL_TIMEOUT', 15),
+                checkout_url=config.get('CHECKOUT_URL'),
+                breaker=CircuitBreaker(
+                    seuil_echecs=config.get('CIRCUIT_FAILURE_THRESHOLD', 5),
+                    delai_reouverture=config.get('CIRCUIT_RESET_TIMEOUT', 30),
+                ),
+            )
+        return _gateway
+
+
+@receiver(setting_changed)
+def _reinitialiser_gateway(setting, **kwargs):
+    global _gateway
+    if setting == 'PAYMENT_GATEWAY':
+        _gateway = None
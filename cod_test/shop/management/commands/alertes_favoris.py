@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from shop.alertes import TAILLE_LOT, envoyer_alertes
+
+
+class Command(BaseCommand):
+    help = "Prévient les utilisateurs des baisses de prix et promotions de leurs favoris (un e-mail par utilisateur)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Produits relus par requête")
+
+    def handle(self, *args, **options):
+        execution = envoyer_alertes(taille_lot=options['taille_lot'])
+        self.stdout.write(
+            f"{execution.produits} produits examinés, {execution.alertes} en baisse, "
+            f"{execution.emails} e-mails mis en file."
+        )
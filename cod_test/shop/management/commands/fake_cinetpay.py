@@ -0,0 +1,70 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from shop.fake_gateway import FakeCinetPayServer
+from shop.gateway import CinetPayGateway, CircuitBreaker, GatewayError
+
+
+class Command(BaseCommand):
+    help = (
+        "Lance un serveur CinetPay factice. Avec --bench, mesure le débit "
+        "d'initialisation de paiements à travers le client de la passerelle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latence', type=float, default=0, help="Latence simulée en secondes")
+        parser.add_argument('--pannes', type=int, default=0, help="Nombre de réponses 503 à renvoyer")
+        parser.add_argument('--bench', type=int, default=0, help="Nombre de paiements à initier")
+        parser.add_argument('--concurrence', type=int, default=10)
+
+    def handle(self, *args, **options):
+        serveur = FakeCinetPayServer(
+            port=options['port'], latence=options['latence'], pannes=options['pannes']
+        )
+        if not options['bench']:
+            self.stdout.write(f"Serveur CinetPay factice sur {serveur.url} (Ctrl+C pour arrêter)")
+            try:
+                serveur.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                serveur.stop()
+            return
+
+        with serveur:
+            self._bench(serveur, options['bench'], options['concurrence'])
+
+    def _bench(self, serveur, total, concurrence):
+        gateway = CinetPayGateway(
+            serveur.url, 'bench', 'bench', pool_size=concurrence, backoff=0.05,
+            breaker=CircuitBreaker(seuil_echecs=total + 1),
+        )
+
+        def initier(numero):
+            debut = time.perf_counter()
+            try:
+                gateway.initier_paiement(
+                    f'BENCH-{numero}', 1000, 'Bench', 'http://notify', 'http://return'
+                )
+                ok = True
+            except GatewayError:
+                ok = False
+            return ok, time.perf_counter() - debut
+
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrence) as pool:
+            resultats = list(pool.map(initier, range(total)))
+        duree = time.perf_counter() - debut
+
+        durees = sorted(d for _, d in resultats)
+        echecs = sum(1 for ok, _ in resultats if not ok)
+        centiles = statistics.quantiles(durees, n=100) if len(durees) > 1 else durees * 99
+        self.stdout.write(
+            f"{total} paiements en {duree:.2f}s ({total / duree:.1f}/s), "
+            f"p50={centiles[49] * 1000:.1f}ms p99={centiles[98] * 1000:.1f}ms, "
+            f"{echecs} échec(s)"
+        )
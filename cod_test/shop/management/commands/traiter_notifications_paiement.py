@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.webhook import traiter_notifications
+
+
+class Command(BaseCommand):
+    help = "Réconcilie les commandes à partir des notifications de paiement en attente."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=100, help="Taille d'un lot")
+        parser.add_argument('--continu', action='store_true', help="Tourne en boucle (worker)")
+        parser.add_argument('--intervalle', type=float, default=2, help="Pause entre deux lots vides")
+
+    def handle(self, *args, **options):
+        while True:
+            stats = traiter_notifications(limite=options['limite'])
+            if stats['traitees'] or stats['echecs']:
+                self.stdout.write(
+                    f"{stats['traitees']} notifications traitées, {stats['echecs']} en échec."
+                )
+            if not options['continu']:
+                return
+            if not (stats['traitees'] or stats['echecs']):
+                time.sleep(options['intervalle'])
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.9 on 2026-10-19 05:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_produit_quantite'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecutionAlertesFavoris',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_add', models.DateTimeField(auto_now_add=True)),
+                ('filigrane', models.DateTimeField(blank=True, null=True)),
+                ('jour', models.DateField()),
+                ('produits', models.PositiveIntegerField(default=0)),
+                ('alertes', models.PositiveIntegerField(default=0)),
+                ('emails', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Passage des alertes favoris',
+                'verbose_name_plural': 'Passages des alertes favoris',
+            },
+        ),
+        migrations.CreateModel(
+            name='PrixSuivi',
+            fields=[
+                ('produit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='prix_suivi', serialize=False, to='shop.produit')),
+                ('prix', models.FloatField()),
+                ('en_promotion', models.BooleanField(default=False)),
+                ('date_releve', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Prix suivi',
+                'verbose_name_plural': 'Prix suivis',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['date_update'], name='produit_date_update'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['date_debut_promo'], name='produit_debut_promo'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['date_fin_promo'], name='produit_fin_promo'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import BooleanField, Case, F, FloatField, Q, Value, When
 from django.utils.text import slugify
 import datetime
 from django.contrib.auth.models import User
@@ -110,6 +111,14 @@ class Produit(models.Model):
     status = models.BooleanField(default=True)
     slug = models.SlugField(unique=True, editable=False, null=True,  blank=True)
 
+    class Meta:
+        indexes = [
+            # Produits modifiés ou dont la promotion commence/finit depuis le dernier passage des alertes
+            models.Index(fields=['date_update'], name='produit_date_update'),
+            models.Index(fields=['date_debut_promo'], name='produit_debut_promo'),
+            models.Index(fields=['date_fin_promo'], name='produit_fin_promo'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug or self.slug is None:
             self.slug = '-'.join((slugify(self.nom), slugify(datetime.datetime.now().microsecond)))
@@ -136,6 +145,35 @@ class Produit(models.Model):
         return result
 
 
+def _condition_promotion(prefix, date):
+    today = date or datetime.date.today()
+    return Q(**{
+        f'{prefix}date_debut_promo__lte': today,
+        f'{prefix}date_fin_promo__gte': today,
+    })
+
+
+def en_promotion(prefix='', date=None):
+    """Expression SQL équivalente à ``Produit.check_promotion``."""
+    return Case(
+        When(_condition_promotion(prefix, date), then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def prix_effectif(prefix='', date=None):
+    """Expression SQL équivalente à ``Produit.check_promotion`` appliquée au prix.
+
+    ``prefix`` permet de l'utiliser à travers une relation (ex. ``'produit__'``).
+    """
+    return Case(
+        When(_condition_promotion(prefix, date), then=F(f'{prefix}prix_promotionnel')),
+        default=F(f'{prefix}prix'),
+        output_field=FloatField(),
+    )
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favorites')
     produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='favorited_by')
@@ -150,3 +188,41 @@ class Favorite(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.produit.nom}"
 
+
+
+class PrixSuivi(models.Model):
+    """Dernier prix effectif d'un produit relevé par les alertes favoris (``shop.alertes``)."""
+
+    produit = models.OneToOneField(Produit, primary_key=True, on_delete=models.CASCADE, related_name='prix_suivi')
+    prix = models.FloatField()
+    en_promotion = models.BooleanField(default=False)
+    date_releve = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Prix suivi'
+        verbose_name_plural = 'Prix suivis'
+
+    def __str__(self):
+        return f"{self.produit_id} : {self.prix}"
+
+
+class ExecutionAlertesFavoris(models.Model):
+    """Un passage des alertes favoris. Le dernier porte le filigrane du suivant.
+
+    ``filigrane`` est le plus grand ``Produit.date_update`` examiné : le passage
+    suivant ne relit que les produits modifiés après lui.
+    """
+
+    date_add = models.DateTimeField(auto_now_add=True)
+    filigrane = models.DateTimeField(null=True, blank=True)
+    jour = models.DateField()
+    produits = models.PositiveIntegerField(default=0)
+    alertes = models.PositiveIntegerField(default=0)
+    emails = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Passage des alertes favoris'
+        verbose_name_plural = 'Passages des alertes favoris'
+
+    def __str__(self):
+        return f"{self.date_add:%Y-%m-%d %H:%M} : {self.emails} e-mails"
@@ -0,0 +1,138 @@
+"""Notifications temps réel des nouvelles commandes pour les établissements.
+
+Le checkout publie un évènement dans un bus en mémoire (``broker``) ; chaque
+flux SSE ouvert par un marchand y est abonné. Comme ce bus ne couvre que le
+processus courant, le flux interroge aussi la base à intervalle régulier pour
+récupérer les commandes créées par les autres workers.
+
+Le flux n'est servi que sous ASGI : un serveur WSGI lirait ce générateur
+infini jusqu'au bout et bloquerait un thread par onglet ouvert.
+"""
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from customer.models import Commande
+
+
+class CommandeBroker:
+    """Pub/sub en mémoire, indexé par identifiant d'établissement."""
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._abonnes = {}
+
+    def subscribe(self, etablissement_id):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.maxsize)
+        with self._lock:
+            self._abonnes.setdefault(etablissement_id, set()).add((loop, queue))
+        return queue
+
+    def unsubscribe(self, etablissement_id, queue):
+        with self._lock:
+            abonnes = self._abonnes.get(etablissement_id, set())
+            abonnes.difference_update({a for a in abonnes if a[1] is queue})
+            if not abonnes:
+                self._abonnes.pop(etablissement_id, None)
+
+    def publish(self, etablissement_id, event):
+        # Appelé depuis les vues synchrones : on repasse par la boucle de chaque abonné.
+        with self._lock:
+            abonnes = list(self._abonnes.get(etablissement_id, ()))
+        for loop, queue in abonnes:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_deposer, queue, event)
+        return len(abonnes)
+
+    def subscriber_count(self, etablissement_id):
+        with self._lock:
+            return len(self._abonnes.get(etablissement_id, ()))
+
+
+def _deposer(queue, event):
+    # Un client trop lent perd des évènements, le sondage de la base les rattrapera.
+    if not queue.full():
+        queue.put_nowait(event)
+
+
+broker = CommandeBroker()
+
+
+def serialiser_commande(commande):
+    return {
+        'id': commande.id,
+        'prix_total': commande.prix_total,
+        'date_add': commande.date_add.isoformat(),
+    }
+
+
+def publier_nouvelle_commande(commande, etablissement_ids):
+    event = serialiser_commande(commande)
+    for etablissement_id in set(etablissement_ids):
+        broker.publish(etablissement_id, event)
+
+
+def _commandes_etablissement(etablissement_id):
+    return Commande.objects.filter(
+        produit_commande__produit__etablissement_id=etablissement_id
+    ).distinct()
+
+
+def dernier_commande_id(etablissement_id):
+    commande = _commandes_etablissement(etablissement_id).order_by('-id').values('id').first()
+    return commande['id'] if commande else 0
+
+
+def commandes_depuis(etablissement_id, dernier_id, limite=50):
+    commandes = _commandes_etablissement(etablissement_id).filter(
+        id__gt=dernier_id
+    ).order_by('id').only('id', 'prix_total', 'date_add')[:limite]
+    return [serialiser_commande(c) for c in commandes]
+
+
+def format_sse(event, nom='nouvelle-commande'):
+    return f"id: {event['id']}\nevent: {nom}\ndata: {json.dumps(event)}\n\n"
+
+
+async def flux_commandes(etablissement_id, dernier_id, poll_interval=None):
+    """Générateur SSE : évènements poussés en mémoire et sondage de la base.
+
+    La base est sondée toutes les ``poll_interval`` secondes, que des
+    évènements aient été poussés entre-temps ou non : les commandes créées
+    par les autres workers ne passent que par ce sondage.
+    """
+    if poll_interval is None:
+        poll_interval = getattr(settings, 'COMMANDES_SSE_POLL_INTERVAL', 15)
+
+    loop = asyncio.get_running_loop()
+    queue = broker.subscribe(etablissement_id)
+    curseur = dernier_id
+    envoyes = set()
+    prochain_sondage = loop.time() + poll_interval
+    try:
+        yield f"retry: {int(poll_interval * 1000)}\n\n"
+        while True:
+            try:
+                attente = max(0, prochain_sondage - loop.time())
+                events = [await asyncio.wait_for(queue.get(), timeout=attente)]
+            except asyncio.TimeoutError:
+                prochain_sondage = loop.time() + poll_interval
+                events = await sync_to_async(commandes_depuis)(etablissement_id, curseur)
+                if events:
+                    curseur = events[-1]['id']
+                else:
+                    yield ": keep-alive\n\n"
+
+            for event in events:
+                if event['id'] <= dernier_id or event['id'] in envoyes:
+                    continue
+                envoyes.add(event['id'])
+                yield format_sse(event)
+            envoyes = {i for i in envoyes if i > curseur}
+    finally:
+        broker.unsubscribe(etablissement_id, queue)
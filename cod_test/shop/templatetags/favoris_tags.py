@@ -0,0 +1,9 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def est_favori(produit, favoris):
+    """``{% if produit|est_favori:favoris %}`` : ``favoris`` vient du processeur de contexte."""
+    return getattr(produit, 'pk', produit) in favoris
@@ -1,8 +1,31 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
 from shop.models import Produit, CategorieProduit, CategorieEtablissement, Etablissement
 
+
+def creer_etablissement(user, nom="Maquis", **champs):
+    """Établissement de ``user`` dans la catégorie « Resto », partagée par les tests."""
+    categorie, _ = CategorieEtablissement.objects.get_or_create(nom="Resto", defaults={'description': "Resto"})
+    valeurs = {
+        'description': "Desc", 'adresse': "Yopougon", 'pays': "CI", 'contact_1': "01", 'email': "m@test.com",
+        'logo': "logo.png", 'couverture': "cover.png", 'nom_du_responsable': "Kone",
+        'prenoms_duresponsable': "Awa",
+    }
+    valeurs.update(champs)
+    return Etablissement.objects.create(user=user, nom=nom, categorie=categorie, **valeurs)
+
+
+def creer_produit(etablissement, nom="Garba", prix=1000, **champs):
+    """Produit de la catégorie « Plats » de ``etablissement``."""
+    categorie, _ = CategorieProduit.objects.get_or_create(
+        nom="Plats", categorie=etablissement.categorie, defaults={'description': "Plats"}
+    )
+    return Produit.objects.create(
+        nom=nom, description="Bon", description_deal="Promo", prix=prix,
+        categorie=categorie, etablissement=etablissement, **champs
+    )
+
 class ShopTests(TestCase):
     def setUp(self):
         self.client = Client()
@@ -270,3 +293,876 @@ class ShopTests(TestCase):
         self.assertEqual(response.status_code, 200)
         json_resp = response.json()
         self.assertTrue(json_resp['success'])
+
+
+class CommandeRecuQueryCountTests(TestCase):
+    """Le nombre de requêtes des vues commandes ne doit pas dépendre du volume."""
+
+    def setUp(self):
+        from customer.models import Customer
+
+        self.user = User.objects.create_user(username='marchand', password='password')
+        self.etab = creer_etablissement(self.user)
+        self.produit = creer_produit(self.etab)
+        self.client.force_login(self.user)
+        self.customers = []
+        for i in range(3):
+            user = User.objects.create_user(f'client{i}', first_name=f'Client{i}')
+            self.customers.append(Customer.objects.create(user=user, adresse="Ad", contact_1="01"))
+
+    def _create_commandes(self, count, lignes=1):
+        from customer.models import Commande, ProduitPanier
+
+        commandes = []
+        for i in range(count):
+            commande = Commande.objects.create(
+                customer=self.customers[i % len(self.customers)],
+                transaction_id=f"T{Commande.objects.count()}",
+                prix_total=1000,
+            )
+            for _ in range(lignes):
+                ProduitPanier.objects.create(
+                    commande=commande, produit=self.produit, quantite=2, prix_unitaire=1000, total_ligne=2000
+                )
+            commandes.append(commande)
+        return commandes
+
+    def _count_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_commande_recu_query_count_independent_of_page_size(self):
+        self._create_commandes(1)
+        small, _ = self._count_queries(reverse('commande-reçu'))
+
+        self._create_commandes(20)
+        large, response = self._count_queries(reverse('commande-reçu'))
+
+        self.assertEqual(small, large)
+        self.assertContains(response, "Garba")
+        self.assertContains(response, "Client0")
+
+    def test_commande_recu_detail_query_count_independent_of_lines(self):
+        petite = self._create_commandes(1, lignes=1)[0]
+        grande = self._create_commandes(1, lignes=10)[0]
+
+        small, _ = self._count_queries(reverse('commande-reçu-detail', args=[petite.id]))
+        large, response = self._count_queries(reverse('commande-reçu-detail', args=[grande.id]))
+
+        self.assertEqual(small, large)
+        self.assertContains(response, "2000")
+
+
+class CommandesStreamTests(TestCase):
+    """Flux SSE des nouvelles commandes pour les marchands."""
+
+    def setUp(self):
+        from customer.models import Customer
+
+        self.user = User.objects.create_user(username='marchand_sse', password='password')
+        self.etab = creer_etablissement(self.user)
+        self.produit = creer_produit(self.etab)
+        client_user = User.objects.create_user('client_sse', password='password')
+        self.customer = Customer.objects.create(user=client_user, adresse="Ad", contact_1="01")
+
+    def _lire(self, flux, nombre):
+        from asgiref.sync import async_to_sync
+
+        async def lire():
+            messages = [await flux.__anext__() for _ in range(nombre)]
+            await flux.aclose()
+            return messages
+
+        return async_to_sync(lire)()
+
+    def test_stream_requires_etablissement(self):
+        response = self.client.get(reverse('commandes-stream'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_flux_recoit_evenement_publie(self):
+        from asgiref.sync import async_to_sync
+        from shop import notifications
+
+        async def scenario():
+            flux = notifications.flux_commandes(self.etab.id, 0, poll_interval=5)
+            retry = await flux.__anext__()
+            notifications.broker.publish(self.etab.id, {'id': 7, 'prix_total': 1000, 'date_add': 'x'})
+            message = await flux.__anext__()
+            await flux.aclose()
+            return retry, message
+
+        retry, message = async_to_sync(scenario)()
+        self.assertTrue(retry.startswith('retry:'))
+        self.assertIn('event: nouvelle-commande', message)
+        self.assertIn('"id": 7', message)
+        self.assertEqual(notifications.broker.subscriber_count(self.etab.id), 0)
+
+    def test_flux_rattrape_les_commandes_par_sondage(self):
+        from customer.models import Commande, ProduitPanier
+        from shop import notifications
+
+        commande = Commande.objects.create(customer=self.customer, transaction_id="SSE1", prix_total=1000)
+        ProduitPanier.objects.create(commande=commande, produit=self.produit, quantite=1)
+
+        flux = notifications.flux_commandes(self.etab.id, 0, poll_interval=0.01)
+        _, message = self._lire(flux, 2)
+        self.assertIn(f'id: {commande.id}', message)
+
+    def test_sondage_regulier_malgre_les_evenements_pousses(self):
+        import asyncio
+        from asgiref.sync import async_to_sync
+        from customer.models import Commande, ProduitPanier
+        from shop import notifications
+
+        # Créée par un « autre worker » : seul le sondage la trouve
+        commande = Commande.objects.create(customer=self.customer, transaction_id="SSE2", prix_total=1000)
+        ProduitPanier.objects.create(commande=commande, produit=self.produit, quantite=1)
+
+        async def scenario():
+            flux = notifications.flux_commandes(self.etab.id, 0, poll_interval=0.05)
+            await flux.__anext__()
+            try:
+                for i in range(200):
+                    # Un évènement poussé avant chaque lecture : la file n'est jamais vide assez longtemps
+                    notifications.broker.publish(self.etab.id, {'id': 1000 + i, 'prix_total': 1, 'date_add': 'x'})
+                    message = await flux.__anext__()
+                    if f'id: {commande.id}\n' in message:
+                        return True
+                    await asyncio.sleep(0.005)
+                return False
+            finally:
+                await flux.aclose()
+
+        self.assertTrue(async_to_sync(scenario)())
+
+    def test_flux_refuse_sous_wsgi(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('commandes-stream'))
+        self.assertEqual(response.status_code, 204)
+
+    def test_flux_servi_sous_asgi(self):
+        from asgiref.sync import async_to_sync
+        from django.test import AsyncClient
+
+        client = AsyncClient()
+        client.force_login(self.user)
+
+        async def scenario():
+            response = await client.get(reverse('commandes-stream'))
+            premier = await response.streaming_content.__anext__()
+            await response.streaming_content.aclose()
+            return response, premier
+
+        response, premier = async_to_sync(scenario)()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(premier.startswith(b'retry:'))
+
+    def test_checkout_publie_la_commande(self):
+        from unittest.mock import patch
+        from customer.models import Customer, Panier, ProduitPanier
+
+        Customer.objects.create(user=self.user, adresse="Ad", contact_1="01")
+        panier = Panier.objects.create(customer=self.user.customer)
+        ProduitPanier.objects.create(panier=panier, produit=self.produit, quantite=1)
+        self.client.force_login(self.user)
+
+        data = {
+            'transaction_id': 'TXSSE',
+            'notify_url': 'http://notify',
+            'return_url': 'http://return',
+            'panier': panier.id,
+        }
+        with patch('shop.notifications.publier_nouvelle_commande') as publier:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('paiement_detail'), data=data, content_type='application/json')
+        publier.assert_called_once()
+        self.assertEqual(publier.call_args[0][1], [self.etab.id])
+
+
+class CheckoutIdempotenceTests(TestCase):
+    """Validation atomique et idempotente du panier sur ``transaction_id``."""
+
+    def setUp(self):
+        from customer.models import Customer, Panier, ProduitPanier
+
+        self.user = User.objects.create_user(username='client_checkout', password='password')
+        etab = creer_etablissement(self.user)
+        self.garba = creer_produit(etab)
+        self.alloco = creer_produit(
+            etab, "Alloco", 800,
+            prix_promotionnel=500, date_debut_promo='2000-01-01', date_fin_promo='2999-01-01',
+        )
+        self.customer = Customer.objects.create(user=self.user, adresse="Ad", contact_1="01")
+        self.panier = Panier.objects.create(customer=self.customer)
+        ProduitPanier.objects.create(panier=self.panier, produit=self.garba, quantite=2)
+        ProduitPanier.objects.create(panier=self.panier, produit=self.alloco, quantite=1)
+        self.client.force_login(self.user)
+
+    def _valider(self, transaction_id='TXIDEM'):
+        return self.client.post(reverse('paiement_detail'), data={
+            'transaction_id': transaction_id,
+            'notify_url': 'http://notify',
+            'return_url': 'http://return',
+            'panier': self.panier.id,
+        }, content_type='application/json').json()
+
+    def test_lignes_deplacees_avec_prix_fige(self):
+        from customer.models import Commande, Panier
+
+        reponse = self._valider()
+        self.assertTrue(reponse['success'])
+        commande = Commande.objects.get(pk=reponse['commande'])
+        self.assertEqual(commande.prix_total, 2 * 1000 + 500)
+        lignes = {
+            nom: (prix, promo, total) for nom, prix, promo, total in
+            commande.produit_commande.values_list('produit__nom', 'prix_unitaire', 'en_promotion', 'total_ligne')
+        }
+        self.assertEqual(lignes, {'Garba': (1000, False, 2000), 'Alloco': (500, True, 500)})
+        self.assertFalse(Panier.objects.filter(pk=self.panier.pk).exists())
+
+    def test_rejeu_renvoie_la_meme_commande(self):
+        from customer.models import Commande
+
+        premiere = self._valider()
+        seconde = self._valider()
+        self.assertTrue(seconde['success'])
+        self.assertEqual(premiere['commande'], seconde['commande'])
+        self.assertEqual(Commande.objects.filter(transaction_id='TXIDEM').count(), 1)
+        self.assertEqual(Commande.objects.get().produit_commande.count(), 2)
+
+    def test_transaction_id_d_un_autre_client_refuse(self):
+        from customer.models import Commande, Customer
+
+        autre = Customer.objects.create(
+            user=User.objects.create_user('autre_client'), adresse="Ad", contact_1="02"
+        )
+        Commande.objects.create(customer=autre, transaction_id='TXAUTRE', prix_total=0)
+        reponse = self._valider('TXAUTRE')
+        self.assertFalse(reponse['success'])
+        self.assertEqual(self.panier.produit_panier.count(), 2)
+
+
+class CheckoutConcurrenceTests(TransactionTestCase):
+    """Soumissions simultanées du même panier avec le même ``transaction_id``."""
+
+    paralleles = 4
+
+    def setUp(self):
+        from customer.models import Customer, Panier, ProduitPanier
+
+        self.user = User.objects.create_user(username='client_concurrent', password='password')
+        produit = creer_produit(creer_etablissement(self.user))
+        customer = Customer.objects.create(user=self.user, adresse="Ad", contact_1="01")
+        self.panier = Panier.objects.create(customer=customer)
+        ProduitPanier.objects.create(panier=self.panier, produit=produit, quantite=3)
+
+    def _soumettre(self, client, barriere):
+        from django.db import connection
+
+        barriere.wait()
+        try:
+            return client.post(reverse('paiement_detail'), data={
+                'transaction_id': 'TXPARALLELE',
+                'notify_url': 'http://notify',
+                'return_url': 'http://return',
+                'panier': self.panier.id,
+            }, content_type='application/json').json()
+        finally:
+            connection.close()
+
+    def test_soumissions_paralleles_une_seule_commande(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from customer.models import Commande, ProduitPanier
+
+        clients = [Client() for _ in range(self.paralleles)]
+        for client in clients:
+            client.force_login(self.user)
+        barriere = threading.Barrier(self.paralleles, timeout=10)
+        with ThreadPoolExecutor(max_workers=self.paralleles) as pool:
+            reponses = list(pool.map(lambda client: self._soumettre(client, barriere), clients))
+
+        commande = Commande.objects.get(transaction_id='TXPARALLELE')
+        self.assertEqual(commande.prix_total, 3000)
+        self.assertEqual(ProduitPanier.objects.filter(commande=commande).count(), 1)
+        # Les requêtes qui réussissent pointent toutes vers la même commande
+        reussies = [r for r in reponses if r['success']]
+        self.assertTrue(reussies)
+        self.assertEqual({r['commande'] for r in reussies}, {commande.id})
+
+
+class PaymentGatewayTests(TestCase):
+    """Client CinetPay contre le serveur factice local."""
+
+    def setUp(self):
+        from shop.fake_gateway import FakeCinetPayServer
+
+        self.serveur = FakeCinetPayServer().start()
+        self.addCleanup(self.serveur.stop)
+
+    def _gateway(self, **kwargs):
+        from shop.gateway import CinetPayGateway
+
+        kwargs.setdefault('backoff', 0)
+        return CinetPayGateway(self.serveur.url, 'cle', 'site', **kwargs)
+
+    def test_initier_et_verifier_paiement(self):
+        gateway = self._gateway()
+        paiement = gateway.initier_paiement('TXGW1', 2500, 'Commande', 'http://n', 'http://r')
+        self.assertTrue(paiement['payment_url'].startswith(self.serveur.url))
+        self.assertTrue(paiement['payment_token'])
+        self.assertEqual(gateway.verifier_paiement('TXGW1')['status'], 'ACCEPTED')
+
+    def test_reessaie_les_erreurs_serveur(self):
+        gateway = self._gateway(max_retries=2)
+        gateway.initier_paiement('TXGW2', 100, 'C', 'http://n', 'http://r')
+        self.serveur.pannes = 2
+        self.assertEqual(gateway.verifier_paiement('TXGW2')['status'], 'ACCEPTED')
+        self.assertEqual(len(self.serveur.requetes), 4)
+
+    def test_initialisation_non_rejouee_apres_erreur_serveur(self):
+        from shop.gateway import GatewayUnavailable
+
+        self.serveur.pannes = 1
+        with self.assertRaises(GatewayUnavailable):
+            self._gateway(max_retries=2).initier_paiement('TXGW5', 100, 'C', 'http://n', 'http://r')
+        # Un seul envoi, puis la vérification : la transaction n'existe pas, un rejeu pourra l'initier
+        self.assertEqual([chemin for chemin, _ in self.serveur.requetes], ['/v2/payment', '/v2/payment/check'])
+
+    def test_reprise_apres_delai_de_lecture(self):
+        self.serveur.latence = 0.3
+        self.serveur.chemins_lents = {'/v2/payment'}
+        self.serveur.statut = 'PENDING'
+        gateway = self._gateway(read_timeout=0.05, max_retries=2, checkout_url='https://pay.test/{token}')
+        paiement = gateway.initier_paiement('TXGW6', 100, 'C', 'http://n', 'http://r')
+
+        # Acceptée par la passerelle malgré le délai : pas de second envoi, l'URL est reconstituée
+        token = self.serveur.transactions['TXGW6']['payment_token']
+        self.assertEqual(paiement['payment_url'], f'https://pay.test/{token}')
+        self.assertEqual([chemin for chemin, _ in self.serveur.requetes], ['/v2/payment', '/v2/payment/check'])
+
+    def test_reessaie_les_erreurs_de_connexion(self):
+        import requests
+        from unittest import mock
+
+        gateway = self._gateway(max_retries=2)
+        envoi = gateway.session.post
+        reponses = iter([requests.ConnectionError("refusée")])
+
+        def post(*args, **kwargs):
+            erreur = next(reponses, None)
+            if erreur:
+                raise erreur
+            return envoi(*args, **kwargs)
+
+        with mock.patch.object(gateway.session, 'post', side_effect=post):
+            self.assertTrue(gateway.initier_paiement('TXGW7', 100, 'C', 'http://n', 'http://r')['payment_url'])
+        self.assertEqual(len(self.serveur.requetes), 1)
+
+    def test_echeance_globale(self):
+        import time
+        from shop.gateway import GatewayUnavailable
+
+        self.serveur.latence = 0.3
+        gateway = self._gateway(read_timeout=10, max_retries=5, total_timeout=0.2)
+        debut = time.monotonic()
+        with self.assertRaises(GatewayUnavailable):
+            gateway.verifier_paiement('TXGW8')
+        self.assertLess(time.monotonic() - debut, 1)
+
+    def test_delai_de_lecture_borne(self):
+        from shop.gateway import GatewayUnavailable
+
+        self.serveur.latence = 0.5
+        gateway = self._gateway(read_timeout=0.05, max_retries=1)
+        with self.assertRaises(GatewayUnavailable):
+            gateway.initier_paiement('TXGW3', 100, 'C', 'http://n', 'http://r')
+
+    def test_erreur_definitive_non_reessayee(self):
+        from shop.gateway import GatewayError, GatewayUnavailable
+
+        gateway = self._gateway()
+        with self.assertRaises(GatewayError) as erreur:
+            gateway.initier_paiement('TXGW4', 0, 'C', 'http://n', 'http://r')
+        self.assertNotIsInstance(erreur.exception, GatewayUnavailable)
+        self.assertEqual([chemin for chemin, _ in self.serveur.requetes], ['/v2/payment', '/v2/payment/check'])
+
+    def test_transaction_existante_reprise(self):
+        self.serveur.statut = 'PENDING'
+        gateway = self._gateway()
+        premier = gateway.initier_paiement('TXGW9', 100, 'C', 'http://n', 'http://r')
+        # Le rejeu est refusé comme doublon : le paiement existant est repris
+        rejeu = gateway.initier_paiement('TXGW9', 100, 'C', 'http://n', 'http://r')
+        self.assertEqual(rejeu['payment_token'], premier['payment_token'])
+
+        self.serveur.statut = 'ACCEPTED'
+        self.assertEqual(gateway.initier_paiement('TXGW9', 100, 'C', 'http://n', 'http://r')['payment_url'], 'http://r')
+
+    def test_disjoncteur_coupe_puis_reessaie(self):
+        from shop.gateway import CircuitBreaker, GatewayUnavailable
+
+        maintenant = [0]
+        breaker = CircuitBreaker(seuil_echecs=2, delai_reouverture=30, horloge=lambda: maintenant[0])
+        gateway = self._gateway(max_retries=0, breaker=breaker)
+        self.serveur.pannes = 2
+        for i in range(2):
+            with self.assertRaises(GatewayUnavailable):
+                gateway.initier_paiement(f'TXCB{i}', 100, 'C', 'http://n', 'http://r')
+        self.assertEqual(breaker.etat, CircuitBreaker.OUVERT)
+
+        # Disjoncteur ouvert : aucun appel réseau
+        with self.assertRaises(GatewayUnavailable):
+            gateway.initier_paiement('TXCB2', 100, 'C', 'http://n', 'http://r')
+        self.assertEqual(len(self.serveur.requetes), 2)
+
+        maintenant[0] = 31
+        self.assertEqual(breaker.etat, CircuitBreaker.SEMI_OUVERT)
+        gateway.initier_paiement('TXCB3', 100, 'C', 'http://n', 'http://r')
+        self.assertEqual(breaker.etat, CircuitBreaker.FERME)
+
+    def test_disjoncteur_libere_apres_exception_inattendue(self):
+        from unittest import mock
+        from shop.gateway import CircuitBreaker
+
+        maintenant = [0]
+        breaker = CircuitBreaker(seuil_echecs=1, delai_reouverture=30, horloge=lambda: maintenant[0])
+        breaker.echec()
+        maintenant[0] = 31
+        gateway = self._gateway(breaker=breaker)
+        with mock.patch.object(gateway.session, 'post', side_effect=RuntimeError("bug")):
+            with self.assertRaises(RuntimeError):
+                gateway.verifier_paiement('TXCB4')
+        # L'essai semi-ouvert n'est pas resté réservé
+        self.assertTrue(breaker.autoriser())
+
+    def test_checkout_renvoie_l_url_de_paiement(self):
+        from django.test import override_settings
+        from customer.models import Commande, Customer, Panier, ProduitPanier
+
+        user = User.objects.create_user(username='client_gw', password='password')
+        produit = creer_produit(creer_etablissement(user))
+        customer = Customer.objects.create(user=user, adresse="Ad", contact_1="01")
+        panier = Panier.objects.create(customer=customer)
+        ProduitPanier.objects.create(panier=panier, produit=produit, quantite=2)
+        self.client.force_login(user)
+
+        data = {'transaction_id': 'TXGWVIEW', 'notify_url': 'http://n', 'return_url': 'http://r', 'panier': panier.id}
+        config = {'BASE_URL': self.serveur.url, 'API_KEY': 'cle', 'SITE_ID': 'site', 'BACKOFF': 0}
+        with override_settings(PAYMENT_GATEWAY=config):
+            reponse = self.client.post(reverse('paiement_detail'), data=data, content_type='application/json').json()
+            rejeu = self.client.post(reverse('paiement_detail'), data=data, content_type='application/json').json()
+
+        commande = Commande.objects.get(transaction_id='TXGWVIEW')
+        self.assertTrue(reponse['success'])
+        self.assertEqual(reponse['payment_url'], commande.payment_url)
+        self.assertEqual(rejeu['payment_url'], commande.payment_url)
+        self.assertEqual(self.serveur.transactions['TXGWVIEW']['amount'], 2000)
+        self.assertEqual(len(self.serveur.requetes), 1)
+
+
+class PaiementNotificationTests(TestCase):
+    """Boîte de réception des notifications CinetPay et réconciliation."""
+
+    def setUp(self):
+        from customer.models import Commande, Customer
+        from shop.fake_gateway import FakeCinetPayServer
+
+        self.serveur = FakeCinetPayServer().start()
+        self.addCleanup(self.serveur.stop)
+        user = User.objects.create_user(username='client_notif', password='password')
+        customer = Customer.objects.create(user=user, adresse="Ad", contact_1="01")
+        self.commande = Commande.objects.create(
+            customer=customer, transaction_id='TXNOTIF', prix_total=2000, status=False
+        )
+
+    def _gateway(self):
+        from shop.gateway import CinetPayGateway
+
+        return CinetPayGateway(self.serveur.url, 'cle', 'site', backoff=0, max_retries=0)
+
+    def _notifier(self, **donnees):
+        donnees.setdefault('cpm_trans_id', 'TXNOTIF')
+        return self.client.post(reverse('paiement_notification'), donnees)
+
+    def test_notification_enregistree_sans_doublon(self):
+        from customer.models import NotificationPaiement
+
+        self.assertEqual(self._notifier(cpm_amount='2000').status_code, 200)
+        self.assertEqual(self._notifier(cpm_amount='2000').status_code, 200)
+        self._notifier(cpm_amount='2000', cpm_error_message='SUCCES')
+        self.assertEqual(NotificationPaiement.objects.filter(transaction_id='TXNOTIF').count(), 2)
+        self.assertFalse(NotificationPaiement.objects.filter(traitee_le__isnull=False).exists())
+
+    def test_notification_invalide_refusee(self):
+        from django.test import override_settings
+
+        self.assertEqual(self.client.post(reverse('paiement_notification'), {}).status_code, 400)
+        with override_settings(PAYMENT_GATEWAY={'SITE_ID': 'site', 'SECRET_KEY': 'secret'}):
+            self.assertEqual(self._notifier(cpm_site_id='site').status_code, 400)
+        self.assertEqual(self.client.get(reverse('paiement_notification')).status_code, 200)
+
+    def test_signature_x_token_verifiee(self):
+        import hashlib
+        import hmac
+        from django.test import override_settings
+
+        donnees = {'cpm_site_id': 'site', 'cpm_trans_id': 'TXNOTIF', 'cpm_amount': '2000'}
+        token = hmac.new(b'secret', b'siteTXNOTIF2000', hashlib.sha256).hexdigest()
+        with override_settings(PAYMENT_GATEWAY={'SITE_ID': 'site', 'SECRET_KEY': 'secret'}):
+            reponse = self.client.post(reverse('paiement_notification'), donnees, HTTP_X_TOKEN=token)
+        self.assertEqual(reponse.status_code, 200)
+
+    def test_worker_reconcilie_une_fois_par_transaction(self):
+        from customer.models import NotificationPaiement
+        from shop.webhook import traiter_notifications
+
+        self.serveur.transactions['TXNOTIF'] = {'amount': 2000, 'currency': 'XOF'}
+        self._notifier(cpm_amount='2000')
+        self._notifier(cpm_amount='2000', cpm_error_message='SUCCES')
+
+        stats = traiter_notifications(gateway=self._gateway())
+        self.assertEqual(stats, {'traitees': 2, 'echecs': 0})
+        self.assertEqual(len(self.serveur.requetes), 1)
+        self.commande.refresh_from_db()
+        self.assertTrue(self.commande.status)
+        self.assertEqual(set(NotificationPaiement.objects.values_list('resultat', flat=True)), {'ACCEPTED'})
+
+        # Une notification tardive n'interroge plus la passerelle
+        self._notifier(cpm_amount='2000', cpm_version='V4')
+        traiter_notifications(gateway=self._gateway())
+        self.assertEqual(len(self.serveur.requetes), 1)
+        self.assertEqual(NotificationPaiement.objects.filter(resultat='DEJA_PAYEE').count(), 1)
+
+    def test_worker_reprogramme_en_cas_d_echec(self):
+        from django.utils import timezone
+        from customer.models import NotificationPaiement
+        from shop.webhook import traiter_notifications
+
+        self.serveur.transactions['TXNOTIF'] = {'amount': 2000, 'currency': 'XOF'}
+        self.serveur.pannes = 1
+        self._notifier(cpm_amount='2000')
+
+        self.assertEqual(traiter_notifications(gateway=self._gateway()), {'traitees': 0, 'echecs': 1})
+        notification = NotificationPaiement.objects.get()
+        self.assertEqual(notification.tentatives, 1)
+        self.assertGreater(notification.prochaine_tentative, timezone.now())
+        self.assertTrue(notification.derniere_erreur)
+
+        # Pas de nouvel essai avant l'échéance
+        self.assertEqual(traiter_notifications(gateway=self._gateway()), {'traitees': 0, 'echecs': 0})
+        NotificationPaiement.objects.update(prochaine_tentative=timezone.now())
+        self.assertEqual(traiter_notifications(gateway=self._gateway()), {'traitees': 1, 'echecs': 0})
+        self.commande.refresh_from_db()
+        self.assertTrue(self.commande.status)
+
+
+class FavorisTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='fan', password='password')
+        etab = creer_etablissement(User.objects.create_user(username='maquis', password='password'))
+        self.produits = [creer_produit(etab, f"Plat{i}") for i in range(6)]
+        self.client.force_login(self.user)
+
+    def _basculer(self, produit, **data):
+        return self.client.post(
+            reverse('toggle_favorite', args=[produit.id]), data, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+
+    def test_bascule_json_une_ecriture(self):
+        from shop.models import Favorite
+
+        produit = self.produits[0]
+        with self.assertNumQueries(4):  # session, utilisateur, produit + INSERT
+            response = self._basculer(produit, favori='1')
+        self.assertEqual(response.json()['favori'], True)
+        self.assertTrue(response.json()['success'])
+        # État demandé : un second clic identique ne change rien
+        self.assertTrue(self._basculer(produit, favori='1').json()['favori'])
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 1)
+
+        with self.assertNumQueries(4):  # session, utilisateur, produit + DELETE
+            self.assertFalse(self._basculer(produit, favori='0').json()['favori'])
+        # Sans état demandé, le favori est inversé
+        self.assertTrue(self._basculer(produit).json()['favori'])
+        self.assertFalse(self._basculer(produit).json()['favori'])
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_bascule_json_anonyme(self):
+        self.client.logout()
+        response = self._basculer(self.produits[0])
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(response.json()['success'])
+
+    def test_liste_favoris_en_une_requete(self):
+        from shop.models import Favorite
+
+        for produit in self.produits[:2]:
+            Favorite.objects.create(user=self.user, produit=produit)
+        response = self.client.get(reverse('shop'))
+        self.assertEqual(response.content.decode().count('zmdi zmdi-favorite"'), 2)
+
+        Favorite.objects.create(user=self.user, produit=self.produits[2])
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('shop'))
+        self.assertEqual(response.content.decode().count('zmdi zmdi-favorite"'), 3)
+        self.assertEqual(sum('shop_favorite' in q['sql'] for q in requetes.captured_queries), 1)
+
+    def test_fiche_produit_partage_l_ensemble(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from shop.models import Favorite
+
+        produit = self.produits[0]
+        Favorite.objects.create(user=self.user, produit=produit)
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('product_detail', args=[produit.slug]))
+        self.assertTrue(response.context['is_favorited'])
+        self.assertEqual(sum('shop_favorite' in q['sql'] for q in requetes.captured_queries), 1)
+
+
+class AlertesFavorisTests(TestCase):
+    def setUp(self):
+        from shop.models import Favorite
+
+        etab = creer_etablissement(User.objects.create_user(username='vendeur', password='password'))
+        self.produits = [creer_produit(etab, f"Plat{i}") for i in range(4)]
+        self.awa = User.objects.create_user(username='awa', email='awa@test.com', first_name='Awa')
+        self.yao = User.objects.create_user(username='yao', email='yao@test.com')
+        for produit in self.produits[:3]:
+            Favorite.objects.create(user=self.awa, produit=produit)
+        Favorite.objects.create(user=self.yao, produit=self.produits[0])
+
+    def _passage(self):
+        from shop.alertes import envoyer_alertes
+        return envoyer_alertes(taille_lot=2)
+
+    def test_premier_passage_releve_sans_envoyer(self):
+        from base.models import EmailSortant
+        from shop.models import PrixSuivi
+
+        execution = self._passage()
+        self.assertEqual((execution.produits, execution.alertes, execution.emails), (4, 0, 0))
+        self.assertEqual(PrixSuivi.objects.count(), 4)
+        self.assertFalse(EmailSortant.objects.exists())
+        # Rien n'a changé : aucun produit relu
+        self.assertEqual(self._passage().produits, 0)
+
+    def test_un_recapitulatif_par_utilisateur(self):
+        import datetime
+        from base.models import EmailSortant
+
+        self._passage()
+        aujourd_hui = datetime.date.today()
+        baisse, promo, hausse = self.produits[:3]
+        baisse.prix = 800
+        baisse.save()
+        promo.prix_promotionnel = 500
+        promo.date_debut_promo = aujourd_hui
+        promo.date_fin_promo = aujourd_hui + datetime.timedelta(days=7)
+        promo.save()
+        hausse.prix = 1200
+        hausse.save()
+
+        execution = self._passage()
+        self.assertEqual((execution.produits, execution.alertes, execution.emails), (3, 2, 2))
+        emails = {e.destinataires[0]: e for e in EmailSortant.objects.all()}
+        self.assertEqual(set(emails), {'awa@test.com', 'yao@test.com'})
+        self.assertIn('Plat0', emails['awa@test.com'].corps)
+        self.assertIn('Plat1', emails['awa@test.com'].corps)
+        self.assertNotIn('Plat2', emails['awa@test.com'].corps)
+        self.assertIn('Bonjour Awa', emails['awa@test.com'].corps)
+        self.assertIn(reverse("product_detail", args=[baisse.slug]), emails['yao@test.com'].corps_html)
+        self.assertNotIn('Plat1', emails['yao@test.com'].corps)
+
+        # Déjà annoncées : pas de second e-mail
+        self.assertEqual(self._passage().emails, 0)
+
+    def test_promotion_programmee(self):
+        import datetime
+        from base.models import EmailSortant
+        from shop.models import ExecutionAlertesFavoris
+
+        produit = self.produits[0]
+        hier = datetime.date.today() - datetime.timedelta(days=1)
+        # Promotion qui commence aujourd'hui, saisie avant le passage d'hier
+        Produit.objects.filter(pk=produit.pk).update(
+            prix_promotionnel=700, date_debut_promo=datetime.date.today(),
+            date_fin_promo=datetime.date.today() + datetime.timedelta(days=3),
+        )
+        from shop.models import PrixSuivi
+        PrixSuivi.objects.bulk_create([PrixSuivi(produit=p, prix=1000) for p in self.produits])
+        ExecutionAlertesFavoris.objects.create(jour=hier, filigrane=Produit.objects.latest('date_update').date_update)
+
+        execution = self._passage()
+        self.assertEqual((execution.produits, execution.alertes, execution.emails), (1, 1, 2))
+        self.assertEqual(EmailSortant.objects.count(), 2)
+
+    def test_requetes_independantes_du_nombre_de_favoris(self):
+        from shop.models import Favorite
+
+        self._passage()
+        for i in range(30):
+            Favorite.objects.create(
+                user=User.objects.create_user(username=f'fan{i}', email=f'fan{i}@test.com'), produit=self.produits[0]
+            )
+        produit = self.produits[0]
+        produit.prix = 900
+        produit.save()
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as requetes:
+            execution = self._passage()
+        self.assertEqual(execution.emails, 32)
+        self.assertLessEqual(len(requetes), 10)
+
+
+class ActionsGroupeesTests(TestCase):
+    def setUp(self):
+        self.vendeur = User.objects.create_user(username='vendeur', password='password')
+        self.etab = creer_etablissement(self.vendeur)
+        autre = creer_etablissement(
+            User.objects.create_user(username='voisin', password='password'), "Voisin",
+            adresse="Cocody", contact_1="02", email="v@test.com",
+            nom_du_responsable="Yao", prenoms_duresponsable="Ama",
+        )
+        self.produits = [creer_produit(self.etab, f"Plat{i}", 1000 + 250 * i) for i in range(3)]
+        self.etranger = creer_produit(autre, "Voisin")
+
+    def _prix(self):
+        return list(Produit.objects.filter(etablissement=self.etab).order_by('pk').values_list('prix', flat=True))
+
+    def test_ajustement_en_une_requete(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from shop import actions_groupees
+
+        avant = Produit.objects.get(pk=self.produits[0].pk).date_update
+        with CaptureQueriesContext(connection) as requetes:
+            modifies = actions_groupees.ajuster_prix(Produit.objects.filter(etablissement=self.etab), 10)
+        self.assertEqual(modifies, 3)
+        self.assertEqual(self._prix(), [1100, 1375, 1650])
+        self.assertEqual(len([q for q in requetes if q['sql'].startswith('UPDATE')]), 1)
+        # update() ne passe pas par auto_now : le filigrane des alertes doit suivre
+        self.assertGreater(Produit.objects.get(pk=self.produits[0].pk).date_update, avant)
+        self.assertEqual(Produit.objects.get(pk=self.etranger.pk).prix, 1000)
+
+    def test_changer_statut(self):
+        from shop import actions_groupees
+
+        # Le filtre ne correspond plus après la mise à jour : le nombre renvoyé reste celui du lot
+        modifies = actions_groupees.changer_statut(Produit.objects.filter(etablissement=self.etab, status=True), False)
+        self.assertEqual(modifies, 3)
+        self.assertFalse(Produit.objects.filter(etablissement=self.etab, status=True).exists())
+        self.assertTrue(Produit.objects.get(pk=self.etranger.pk).status)
+
+    def test_promotion_programmee(self):
+        import datetime
+        from shop import actions_groupees
+
+        debut, fin = datetime.date.today(), datetime.date.today() + datetime.timedelta(days=7)
+        actions_groupees.programmer_promotion(Produit.objects.filter(pk=self.produits[1].pk), debut, fin, remise=20)
+        produit = Produit.objects.get(pk=self.produits[1].pk)
+        self.assertEqual((produit.date_debut_promo, produit.date_fin_promo, produit.prix_promotionnel), (debut, fin, 1000))
+        self.assertTrue(produit.check_promotion)
+
+        with self.assertRaises(actions_groupees.ActionGroupeeError):
+            actions_groupees.programmer_promotion(Produit.objects.all(), fin, debut)
+        with self.assertRaises(actions_groupees.ActionGroupeeError):
+            actions_groupees.executer('ajuster_prix', Produit.objects.all(), {'pourcentage': 'abc'})
+
+    def test_baisse_groupee_declenche_les_alertes(self):
+        from shop.alertes import envoyer_alertes
+        from shop import actions_groupees
+        from shop.models import Favorite
+
+        Favorite.objects.create(
+            user=User.objects.create_user(username='awa', email='awa@test.com'), produit=self.produits[0]
+        )
+        envoyer_alertes()
+        actions_groupees.ajuster_prix(Produit.objects.filter(etablissement=self.etab), -10)
+        execution = envoyer_alertes()
+        self.assertEqual((execution.produits, execution.alertes, execution.emails), (3, 3, 1))
+
+    def test_action_admin(self):
+        from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@test.com', 'password'))
+        url = reverse('admin:shop_produit_changelist')
+        selection = [p.pk for p in self.produits[:2]]
+        self.client.post(url, {'action': 'marquer_super_deal', ACTION_CHECKBOX_NAME: selection})
+        self.assertEqual(
+            list(Produit.objects.filter(super_deal=True).order_by('pk').values_list('pk', flat=True)), selection
+        )
+
+        # Les actions paramétrées passent par une page intermédiaire
+        response = self.client.post(url, {'action': 'ajuster_prix', ACTION_CHECKBOX_NAME: selection})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'admin/shop/produit/action_groupee.html')
+        self.assertEqual(self._prix(), [1000, 1250, 1500])
+        response = self.client.post(url, {
+            'action': 'ajuster_prix', ACTION_CHECKBOX_NAME: selection, 'appliquer': '1', 'pourcentage': '-50',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self._prix(), [500, 625, 1500])
+
+    def test_tableau_de_bord_limite_a_l_etablissement(self):
+        self.client.force_login(self.vendeur)
+        url = reverse('articles-action-groupee')
+        response = self.client.post(url, {
+            'action': 'desactiver', 'articles': [self.produits[0].pk, self.etranger.pk],
+        })
+        self.assertRedirects(response, reverse('article-detail'), fetch_redirect_response=False)
+        self.assertFalse(Produit.objects.get(pk=self.produits[0].pk).status)
+        self.assertTrue(Produit.objects.get(pk=self.etranger.pk).status)
+
+        response = self.client.post(url, {'action': 'ajuster_prix', 'articles': [self.produits[1].pk]}, follow=True)
+        self.assertContains(response, "Indiquez le pourcentage")
+        self.assertEqual(Produit.objects.get(pk=self.produits[1].pk).prix, 1250)
+
+    def test_pourcentages_non_finis_refuses(self):
+        from shop import actions_groupees
+
+        for valeur in ('nan', 'inf', '-inf', 'Infinity'):
+            with self.assertRaises(actions_groupees.ActionGroupeeError, msg=valeur):
+                actions_groupees.executer('ajuster_prix', Produit.objects.all(), {'pourcentage': valeur})
+        self.assertEqual(self._prix(), [1000, 1250, 1500])
+
+        self.client.force_login(self.vendeur)
+        response = self.client.post(reverse('articles-action-groupee'), {
+            'action': 'ajuster_prix', 'articles': [self.produits[0].pk], 'pourcentage': 'nan',
+        }, follow=True)
+        self.assertContains(response, "Pourcentage invalide")
+        self.assertEqual(Produit.objects.get(pk=self.produits[0].pk).prix, 1000)
+
+    def test_baisse_ramene_le_prix_promotionnel(self):
+        from shop import actions_groupees
+
+        Produit.objects.filter(pk=self.produits[0].pk).update(prix_promotionnel=900)
+        Produit.objects.filter(pk=self.produits[1].pk).update(prix_promotionnel=800)
+        actions_groupees.ajuster_prix(Produit.objects.filter(etablissement=self.etab), -20)
+        promotions = Produit.objects.filter(etablissement=self.etab).order_by('pk').values_list(
+            'prix', 'prix_promotionnel'
+        )
+        # 900 dépasse le nouveau prix (800) ; 800 reste sous 1000 ; 0 (sans promotion) est conservé
+        self.assertEqual(list(promotions), [(800, 800), (1000, 800), (1200, 0)])
+
+    def test_refus_de_la_base_sans_erreur_serveur(self):
+        from unittest import mock
+        from django.db import IntegrityError
+        from django.db.models import QuerySet
+
+        self.client.force_login(self.vendeur)
+        with mock.patch.object(QuerySet, 'update', side_effect=IntegrityError("NOT NULL")):
+            response = self.client.post(reverse('articles-action-groupee'), {
+                'action': 'ajuster_prix', 'articles': [self.produits[0].pk], 'pourcentage': '5',
+            }, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Valeurs refusées")
@@ -1,23 +1,27 @@
 from django.shortcuts import redirect, render,  get_object_or_404
 from . import models
+from . import notifications
+from .actions_groupees import ACTIONS, ActionGroupeeError, executer
+from .checkout import CheckoutError, passer_commande
+from .favoris import basculer, favoris_ids
+from .gateway import GatewayError, get_gateway
+from .webhook import NotificationInvalide, enregistrer_notification
 from customer import models as customer_models
 from django.contrib.auth.decorators import login_required
 import json
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-try:
-    from cinetpay_sdk.s_d_k import Cinetpay
-except ImportError:
-    class Cinetpay:
-        def __init__(self, *args, **kwargs): pass
-
 from cities_light.models import City
 
 from django.contrib import messages
 from .models import Produit, Favorite, Etablissement, CategorieProduit
-from customer.models import Commande
+from customer.models import Commande, ProduitPanier
+from client import exports
 
+from django.core.handlers.asgi import ASGIRequest
 from django.core.paginator import Paginator
+from django.db.models import OuterRef, Prefetch, Subquery
 from django.utils import timezone
 
 
@@ -34,33 +38,46 @@ def product_detail(request, slug):
     produit = get_object_or_404(Produit, slug=slug)
     produits = Produit.objects.filter(categorie=produit.categorie).exclude(id=produit.id)[:3]
 
-    
-    is_favorited = False
-    if request.user.is_authenticated:
-        is_favorited = Favorite.objects.filter(user=request.user, produit=produit).exists()
-
     datas = {
         'produit': produit,
         'produits': produits,
-        'is_favorited': is_favorited, 
+        # Même ensemble que le processeur de contexte ``favoris`` : une seule requête
+        'is_favorited': produit.pk in favoris_ids(request),
     }
     return render(request, 'product-details.html', datas)
 
 
-def toggle_favorite(request, produit_id):
-    if not request.user.is_authenticated:
-        messages.error(request, "Veuillez vous connecter pour ajouter des favoris.")
-        return redirect('login') 
+def _attend_json(request):
+    return (
+        request.headers.get('x-requested-with') == 'XMLHttpRequest'
+        or 'application/json' in request.headers.get('accept', '')
+    )
+
 
-    produit = get_object_or_404(Produit, id=produit_id)
-    favorite, created = Favorite.objects.get_or_create(user=request.user, produit=produit)
+def toggle_favorite(request, produit_id):
+    """Bascule le favori ; réponse JSON pour les appels AJAX, redirection sinon.
 
-    if not created:  
-        favorite.delete()
-        messages.success(request, f"Le produit {produit.nom} a été retiré de vos favoris.")
+    ``favori`` (``1`` ou ``0``) en POST fixe l'état voulu plutôt que de
+    l'inverser, ce qui rend un double clic sans effet.
+    """
+    if not request.user.is_authenticated:
+        message = "Veuillez vous connecter pour ajouter des favoris."
+        if _attend_json(request):
+            return JsonResponse({'message': message, 'success': False}, status=401)
+        messages.error(request, message)
+        return redirect('login')
+
+    produit = get_object_or_404(Produit.objects.only('id', 'nom', 'slug'), id=produit_id)
+    demande = request.POST.get('favori')
+    favori = basculer(request.user, produit.id, None if demande is None else demande == '1')
+    if favori:
+        message = f"Le produit {produit.nom} a été ajouté à vos favoris."
     else:
-        messages.success(request, f"Le produit {produit.nom} a été ajouté à vos favoris.")
+        message = f"Le produit {produit.nom} a été retiré de vos favoris."
 
+    if _attend_json(request):
+        return JsonResponse({'message': message, 'success': True, 'favori': favori})
+    messages.success(request, message)
     return redirect('product_detail', slug=produit.slug)
 
 
@@ -78,7 +95,9 @@ def checkout(request):
 @csrf_exempt
 def paiement_success(request):
     if request.user.is_authenticated:
-        commandes = customer_models.Commande.objects.filter(customer=request.user.customer)
+        commandes = customer_models.Commande.objects.filter(customer=request.user.customer).prefetch_related(
+            Prefetch('produit_commande', ProduitPanier.objects.select_related('produit'))
+        )
 
         datas = {
             'commandes': commandes,
@@ -119,61 +138,67 @@ def post_paiement_details(request):
     isSuccess = False
 
     _ = isSuccess
-    if user and panier is not None and transaction_id is not None and notify_url is not None and return_url is not None :
+    commande_id = None
+    if user.is_authenticated and panier is not None and transaction_id is not None and notify_url is not None and return_url is not None :
+        gateway = get_gateway()
         try:
-            panier = customer_models.Panier.objects.get(id=panier, customer=user.customer)
+            # Un rejeu (double clic, nouvelle tentative réseau) renvoie la même commande.
+            # Avec une passerelle, la commande reste en attente jusqu'à la notification de paiement.
+            commande, _ = passer_commande(
+                user.customer, panier, str(transaction_id), **({'status': False} if gateway else {})
+            )
+            commande_id = commande.id
+            isSuccess = True
+            message = "Commande validée"
+
+        except CheckoutError as exc:
+            isSuccess = False
+            message = str(exc)
         except Exception:
-            panier = None
-
-        if panier:
-            data = {
-                'amount': 100,
-                'currency': "XOF",
-                'transaction_id': transaction_id,
-                'description': "TRANSACTION DESCRIPTION",
-                'return_url': notify_url,
-                'notify_url': return_url,
-                'customer_name': user.first_name,
-                'customer_surname': user.last_name,
-            }
-
-            try:
-
-                commande = customer_models.Commande()
-                commande.customer = request.user.customer
-                commande.payment_url = 'payment_url'
-                commande.id_paiment = transaction_id
-                commande.transaction_id = transaction_id
-                commande.api_response_id = 'api_response_id'
-                commande.payment_token = 'payment_token'
-                commande.prix_total = panier.total_with_coupon
-                commande.save()
-
-                for i in customer_models.ProduitPanier.objects.filter(panier=panier):
-                    i.panier = None
-                    i.commande = commande
-                    i.save()
-                isSuccess = True
-                message = "Commande validée"
-                panier.delete()
-
-            except Exception:
-                isSuccess = False
-                message = "Une erreur s'est produite, merci de rééssayer"
-        else:
             isSuccess = False
-            message = "Une erreur s'est produite"
+            message = "Une erreur s'est produite, merci de rééssayer"
+
+        if isSuccess and gateway is not None:
+            # Appel hors transaction : la commande reste acquise si la passerelle échoue
+            url = commande.payment_url
+            if not url:
+                try:
+                    paiement = gateway.initier_paiement(
+                        commande.transaction_id, commande.prix_total,
+                        f"Commande {commande.id}", notify_url, return_url,
+                        customer_name=user.first_name, customer_surname=user.last_name,
+                    )
+                except GatewayError:
+                    isSuccess = False
+                    message = "Le service de paiement est indisponible, merci de rééssayer"
+                else:
+                    customer_models.Commande.objects.filter(pk=commande.pk).update(**paiement)
+                    url = paiement['payment_url']
     else:
         isSuccess = False
         message = "Une erreur s'est produite"
     data = {
         'message': message,
         'success': isSuccess,
-        'payment_url' : url
+        'payment_url' : url,
+        'commande': commande_id,
     }
     return JsonResponse(data, safe=False)
 
 
+@csrf_exempt
+def paiement_notification(request):
+    # CinetPay vérifie la disponibilité de l'URL par un GET
+    if request.method != 'POST':
+        return HttpResponse("OK")
+    try:
+        enregistrer_notification(request.POST.dict(), request.headers.get('x-token'))
+    except NotificationInvalide:
+        return HttpResponseBadRequest()
+    # La réconciliation est faite en tâche de fond (shop.webhook.traiter_notifications)
+    return HttpResponse("OK")
+
+
 @login_required
 def dashboard(request):
     
@@ -272,9 +297,32 @@ def article_detail(request):
         "search_query": search_query,
         "category_filter": category_filter,
         "etablissement": etablissement,
+        "actions_groupees": [(nom, libelle) for nom, (libelle, _) in ACTIONS.items()],
     })
 
 
+@login_required
+def action_groupee_articles(request):
+    etablissement = get_object_or_404(Etablissement, user=request.user)
+    if request.method != "POST":
+        return redirect("article-detail")
+
+    selection = request.POST.getlist("articles")
+    if not selection:
+        messages.error(request, "Sélectionnez au moins un article.")
+        return redirect("article-detail")
+
+    # Limité aux articles de l'établissement connecté, en une seule requête UPDATE
+    articles = Produit.objects.filter(etablissement=etablissement, pk__in=selection)
+    try:
+        modifies = executer(request.POST.get("action"), articles, request.POST)
+    except (ActionGroupeeError, ValueError) as exc:
+        messages.error(request, f"Erreur : {exc}")
+    else:
+        messages.success(request, f"{modifies} article(s) modifié(s).")
+    return redirect("article-detail")
+
+
 @login_required
 def modifier_article(request, article_id):
     etablissement = get_object_or_404(Etablissement, user=request.user)
@@ -326,7 +374,17 @@ def supprimer_article(request, article_id):
 @login_required
 def commande_reçu(request):
     etablissement = get_object_or_404(Etablissement, user=request.user)
-    commandes_list = Commande.objects.filter(produit_commande__produit__etablissement=etablissement).distinct().order_by('-date_add')
+
+    # Nom du premier produit de chaque commande, calculé en SQL plutôt que par ligne dans le template
+    premier_produit = ProduitPanier.objects.filter(
+        commande=OuterRef('pk')
+    ).order_by('pk').values('produit__nom')[:1]
+
+    commandes_list = Commande.objects.filter(
+        produit_commande__produit__etablissement=etablissement
+    ).distinct().select_related('customer__user').annotate(
+        premier_produit_nom=Subquery(premier_produit)
+    ).order_by('-date_add')
 
     # 📌 Filtrage par client
     client = request.GET.get("client")
@@ -360,11 +418,55 @@ def commande_reçu(request):
     return render(request, "commande-reçu.html", {"commandes": commandes, "etablissement": etablissement})
 
 
+@login_required(login_url='login')
+def export_recus_etablissement(request):
+    etablissement = get_object_or_404(Etablissement, user=request.user)
+    return exports.reponse_zip(
+        request, Commande.objects.filter(produit_commande__produit__etablissement=etablissement), 'commande-reçu'
+    )
+
+
+def _etablissement_connecte(request):
+    if not request.user.is_authenticated:
+        return None
+    return Etablissement.objects.filter(user=request.user).first()
+
+
+async def commandes_stream(request):
+    # Vue asynchrone : login_required ne s'applique pas aux coroutines sous Django 4.2.
+    etablissement = await sync_to_async(_etablissement_connecte)(request)
+    if etablissement is None:
+        return HttpResponseForbidden()
+    if not isinstance(request, ASGIRequest):
+        # Sous WSGI (runserver, cooldeal.wsgi) : 204 indique au navigateur de ne pas se reconnecter
+        return HttpResponse(status=204)
+
+    dernier_id = request.headers.get('Last-Event-ID') or request.GET.get('depuis')
+    if dernier_id and dernier_id.isdigit():
+        dernier_id = int(dernier_id)
+    else:
+        dernier_id = await sync_to_async(notifications.dernier_commande_id)(etablissement.id)
+
+    response = StreamingHttpResponse(
+        notifications.flux_commandes(etablissement.id, dernier_id),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def commande_reçu_detail(request, commande_id):
     etablissement = get_object_or_404(Etablissement, user=request.user)
+    commandes = Commande.objects.select_related('customer__user').prefetch_related(
+        Prefetch(
+            'produit_commande',
+            queryset=ProduitPanier.objects.select_related('produit').order_by('pk'),
+        )
+    ).distinct()
     commande = get_object_or_404(
-        Commande,
+        commandes,
         id=commande_id,
         produit_commande__produit__etablissement=etablissement
     )
@@ -0,0 +1,150 @@
+"""Notifications de paiement envoyées par CinetPay sur ``notify_url``.
+
+La vue se contente de valider la notification et de l'ajouter à la boîte de
+réception (``NotificationPaiement``) avant de répondre. La réconciliation des
+commandes, qui interroge la passerelle, est faite plus tard par
+``traiter_notifications`` (tâche cron ou commande ``traiter_notifications_paiement``).
+"""
+import hashlib
+import hmac
+import json
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from client import recus
+from customer.models import Commande, NotificationPaiement
+from .gateway import GatewayError, get_gateway
+
+# Champs concaténés par CinetPay pour calculer l'en-tête ``x-token``
+CHAMPS_SIGNES = (
+    'cpm_site_id', 'cpm_trans_id', 'cpm_trans_date', 'cpm_amount', 'cpm_currency',
+    'signature', 'payment_method', 'cel_phone_num', 'cpm_phone_prefixe',
+    'cpm_language', 'cpm_version', 'cpm_payment_config', 'cpm_page_action',
+    'cpm_custom', 'cpm_designation', 'cpm_error_message',
+)
+
+# Durée pendant laquelle un lot réservé par un worker est invisible aux autres
+BAIL = timedelta(minutes=5)
+
+
+class NotificationInvalide(Exception):
+    pass
+
+
+class ReconciliationError(Exception):
+    pass
+
+
+def valider_notification(donnees, token=None):
+    transaction_id = donnees.get('cpm_trans_id')
+    if not transaction_id or len(transaction_id) > 100:
+        raise NotificationInvalide("cpm_trans_id manquant")
+
+    config = getattr(settings, 'PAYMENT_GATEWAY', {})
+    site_id = config.get('SITE_ID')
+    if site_id and donnees.get('cpm_site_id') != site_id:
+        raise NotificationInvalide("cpm_site_id inattendu")
+
+    secret = config.get('SECRET_KEY')
+    if secret:
+        message = ''.join(donnees.get(champ, '') for champ in CHAMPS_SIGNES)
+        attendu = hmac.new(secret.encode(), message.encode(), hashlib.sha256).hexdigest()
+        if not token or not hmac.compare_digest(attendu, token):
+            raise NotificationInvalide("x-token invalide")
+    return transaction_id
+
+
+def enregistrer_notification(donnees, token=None):
+    """Ajoute la notification à la boîte de réception, sans doublon."""
+    transaction_id = valider_notification(donnees, token)
+    empreinte = hashlib.sha256(json.dumps(donnees, sort_keys=True).encode()).hexdigest()
+    NotificationPaiement.objects.bulk_create(
+        [NotificationPaiement(transaction_id=transaction_id, empreinte=empreinte, payload=donnees)],
+        ignore_conflicts=True,
+    )
+    return transaction_id
+
+
+def _max_tentatives():
+    return getattr(settings, 'PAIEMENT_NOTIFICATION_MAX_TENTATIVES', 8)
+
+
+def _delai(tentatives):
+    base = getattr(settings, 'PAIEMENT_NOTIFICATION_DELAI', 30)
+    return timedelta(seconds=min(base * 2 ** tentatives, 3600))
+
+
+def _reserver(limite):
+    maintenant = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            NotificationPaiement.objects.select_for_update(skip_locked=True).filter(
+                traitee_le__isnull=True,
+                prochaine_tentative__lte=maintenant,
+                tentatives__lt=_max_tentatives(),
+            ).order_by('id').values_list('id', flat=True)[:limite]
+        )
+        NotificationPaiement.objects.filter(id__in=ids).update(prochaine_tentative=maintenant + BAIL)
+    return NotificationPaiement.objects.filter(id__in=ids).only('id', 'transaction_id', 'tentatives')
+
+
+def _reconcilier(transaction_id, gateway):
+    commande = Commande.objects.filter(transaction_id=transaction_id).only('id', 'status', 'prix_total').first()
+    if commande is None:
+        raise ReconciliationError("Commande inconnue")
+    if commande.status:
+        return 'DEJA_PAYEE'
+    if gateway is None:
+        raise ReconciliationError("Passerelle non configurée")
+
+    # Le contenu de la notification n'est pas fiable : le statut est relu à la source.
+    paiement = gateway.verifier_paiement(transaction_id)
+    statut = paiement.get('status')
+    if statut == 'ACCEPTED':
+        if int(float(paiement.get('amount') or 0)) != int(commande.prix_total):
+            raise ReconciliationError("Montant payé différent du total de la commande")
+        if Commande.objects.filter(pk=commande.pk, status=False).update(status=True):
+            # Le reçu est rendu ici, dans le worker, plutôt qu'au premier téléchargement
+            transaction.on_commit(lambda: recus.generer_apres_confirmation(commande.pk))
+        return statut
+    if statut in ('REFUSED', 'CANCELED'):
+        return statut
+    raise ReconciliationError(f"Paiement {statut or 'sans statut'}")
+
+
+def traiter_notifications(limite=100, gateway=None):
+    """Traite un lot de notifications en attente, retourne les compteurs.
+
+    Les notifications d'une même transaction sont réconciliées ensemble, par
+    un seul appel à la passerelle. En cas d'échec elles sont reprogrammées
+    avec un délai croissant, jusqu'à ``PAIEMENT_NOTIFICATION_MAX_TENTATIVES``.
+    """
+    gateway = gateway or get_gateway()
+    par_transaction = defaultdict(list)
+    for notification in _reserver(limite):
+        par_transaction[notification.transaction_id].append(notification)
+
+    stats = {'traitees': 0, 'echecs': 0}
+    for transaction_id, notifications in par_transaction.items():
+        ids = [n.id for n in notifications]
+        try:
+            resultat = _reconcilier(transaction_id, gateway)
+        except (ReconciliationError, GatewayError) as exc:
+            tentatives = max(n.tentatives for n in notifications) + 1
+            NotificationPaiement.objects.filter(id__in=ids).update(
+                tentatives=F('tentatives') + 1,
+                prochaine_tentative=timezone.now() + _delai(tentatives),
+                derniere_erreur=str(exc),
+            )
+            stats['echecs'] += len(ids)
+        else:
+            NotificationPaiement.objects.filter(id__in=ids).update(
+                traitee_le=timezone.now(), resultat=resultat, derniere_erreur='',
+            )
+            stats['traitees'] += len(ids)
+    return stats
@@ -0,0 +1,28 @@
+// Favoris sans rechargement : les formulaires .favorite-form sont envoyés en
+// AJAX à toggle_favorite, qui renvoie le nouvel état en JSON.
+document.addEventListener('submit', function (event) {
+    var form = event.target.closest('.favorite-form');
+    if (!form) {
+        return;
+    }
+    event.preventDefault();
+    var icone = form.querySelector('i');
+    var donnees = new FormData(form);
+    // État voulu plutôt qu'une inversion : un double clic reste sans effet
+    donnees.append('favori', icone.classList.contains('zmdi-favorite') ? '0' : '1');
+    fetch(form.action, {
+        method: 'POST',
+        body: donnees,
+        headers: {'X-Requested-With': 'XMLHttpRequest'},
+        credentials: 'same-origin'
+    }).then(function (response) {
+        return response.json();
+    }).then(function (reponse) {
+        if (!reponse.success) {
+            alert(reponse.message);
+            return;
+        }
+        icone.className = reponse.favori ? 'zmdi zmdi-favorite' : 'zmdi zmdi-favorite-outline';
+        icone.style.color = reponse.favori ? 'red' : '';
+    });
+});
@@ -1,9 +1,10 @@
 from django.contrib import admin
 
+from base.admin_performance import AdminPerformant
 import website.models as models
 
 
-class SiteInfoAdmin(admin.ModelAdmin):
+class SiteInfoAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -38,42 +39,10 @@ class SiteInfoAdmin(admin.ModelAdmin):
         'date_update',
         'status',
     )
-    list_filter = (
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'titre',
-        'slogan',
-        'description',
-        'horaire_description',
-        'text_pourquoi_nous_choisir',
-        'logo',
-        'icon',
-        'arriere_plan_appreciation',
-        'arriere_plan_appreciation_2',
-        'image_session_pourquoi_nous_choisir',
-        'image_page_contact',
-        'image_pied_de_page',
-        'couverture_page_contact',
-        'couverture_page_panier',
-        'couverture_page_paiement',
-        'couverture_page_shop',
-        'couverture_page_about',
-        'contact_1',
-        'contact_2',
-        'email',
-        'email_2',
-        'adresse',
-        'map_url',
-        'facebook_url',
-        'instagram_url',
-        'twitter_url',
-        'whatsapp',
-    )
+    list_filter = ('status', 'date_add')
 
 
-class BanniereAdmin(admin.ModelAdmin):
+class BanniereAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -84,18 +53,10 @@ class BanniereAdmin(admin.ModelAdmin):
         'date_update',
         'status',
     )
-    list_filter = (
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'titre',
-        'description',
-        'couverture',
-    )
+    list_filter = ('status', 'date_add')
 
 
-class AppreciationAdmin(admin.ModelAdmin):
+class AppreciationAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -107,19 +68,10 @@ class AppreciationAdmin(admin.ModelAdmin):
         'date_update',
         'status',
     )
-    list_filter = (
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'titre',
-        'description',
-        'auteur',
-        'role',
-    )
+    list_filter = ('status', 'date_add')
 
 
-class AboutAdmin(admin.ModelAdmin):
+class AboutAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -131,19 +83,10 @@ class AboutAdmin(admin.ModelAdmin):
         'date_update',
         'status',
     )
-    list_filter = (
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'titre',
-        'sous_titre',
-        'description',
-        'image',
-    )
+    list_filter = ('status', 'date_add')
 
 
-class WhyChooseUsAdmin(admin.ModelAdmin):
+class WhyChooseUsAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -154,18 +97,10 @@ class WhyChooseUsAdmin(admin.ModelAdmin):
         'date_update',
         'status',
     )
-    list_filter = (
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'titre',
-        'description',
-        'icon',
-    )
+    list_filter = ('status', 'date_add')
 
 
-class GalerieAdmin(admin.ModelAdmin):
+class GalerieAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -176,18 +111,10 @@ class GalerieAdmin(admin.ModelAdmin):
         'date_update',
         'status',
     )
-    list_filter = (
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'titre',
-        'description',
-        'image',
-    )
+    list_filter = ('status', 'date_add')
 
 
-class HoraireAdmin(admin.ModelAdmin):
+class HoraireAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -197,17 +124,10 @@ class HoraireAdmin(admin.ModelAdmin):
         'date_update',
         'status',
     )
-    list_filter = (
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'titre',
-        'description',
-    )
+    list_filter = ('status', 'date_add')
 
 
-class PartenaireAdmin(admin.ModelAdmin):
+class PartenaireAdmin(AdminPerformant):
 
     list_display = (
         'id',
@@ -218,15 +138,7 @@ class PartenaireAdmin(admin.ModelAdmin):
         'date_update',
         'status',
     )
-    list_filter = (
-        'date_add',
-        'date_update',
-        'status',
-        'id',
-        'nom',
-        'description',
-        'image',
-    )
+    list_filter = ('status', 'date_add')
 
 
 def _register(model, admin_class):
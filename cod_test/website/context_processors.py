@@ -1,8 +1,11 @@
 from shop import models
 from . import models as config_models
 from customer import models as customer_models
-from django.contrib.sessions.models import Session
+from customer import cart_storage
 from cities_light.models import City
+from functools import wraps
+from django.utils.functional import SimpleLazyObject
+from shop.favoris import favoris_ids
 
 
 def categories(request):
@@ -11,6 +14,22 @@ def categories(request):
     return {'cat':cat}
 
 
+def _une_fois_par_requete(attribut):
+    # Le thème d'admin (django_daisy) rend chaque filtre des listes avec la
+    # requête, ce qui rappelle tous les processeurs de contexte : le résultat
+    # est gardé sur la requête. À réserver aux données qui ne dépendent pas
+    # de request.user, qui peut changer en cours de requête (connexion)
+    def decorateur(processeur):
+        @wraps(processeur)
+        def wrapper(request):
+            if not hasattr(request, attribut):
+                setattr(request, attribut, processeur(request))
+            return getattr(request, attribut)
+        return wrapper
+    return decorateur
+
+
+@_une_fois_par_requete('_contexte_site_infos')
 def site_infos(request):
     try:
         infos = config_models.SiteInfo.objects.latest('date_add')
@@ -41,36 +60,23 @@ def horaires(request):
 def cart(request):
     carts = ""
     try:
-        if not request.session.exists(request.session.session_key):
-            request.session.create()
-        session_id = Session.objects.get(
-            session_key=request.session.session_key
-        )
         if request.user.is_authenticated:
-            try:
+            carts = customer_models.Panier.objects.filter(
+                customer__user=request.user
+            ).order_by('-id').first()
+            if carts is None:
                 customer = customer_models.Customer.objects.get(
                     user=request.user
                 )
-                carts = customer_models.Panier.objects.get(
-                    customer=customer, session_id=session_id
-                )
-            except Exception:
-                customer = customer_models.Customer.objects.get(
-                    user=request.user
-                )
-                carts = customer_models.Panier()
-                carts.session_id = session_id
-                carts.customer = customer
-                carts.save()
+                carts = customer_models.Panier.objects.create(customer=customer)
         else:
-            try:
-                carts = customer_models.Panier.objects.get(
-                    session_id=session_id
-                )
-            except Exception:
-                carts = customer_models.Panier()
-                carts.session_id = session_id
-                carts.save()
+            # Aucun accès base : le panier du visiteur est dans un cookie ou le cache
+            carts = cart_storage.get_anonymous_cart(request).as_panier()
     except Exception:
         pass
-    return {'cart': carts}
\ No newline at end of file
+    return {'cart': carts}
+
+
+def favoris(request):
+    # Paresseux : la requête n'a lieu que si la page affiche des favoris
+    return {'favoris': SimpleLazyObject(lambda: favoris_ids(request))}